@@ -12,6 +12,7 @@ from litex.soc.integration.builder import *
 from litex.soc.cores.uart import UARTWishboneBridge
 
 from transceiver.gtx_7series import GTXChannelPLL, GTX
+from transceiver.freq_meter import FrequencyMeter
 
 
 class BaseSoC(SoCCore):
@@ -31,6 +32,10 @@ class BaseSoC(SoCCore):
 
 
 class GTXTestSoC(SoCCore):
+    csr_map = {
+        "freq_meter": 20
+    }
+    csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform, medium="sfp"):
         BaseSoC.__init__(self, platform)
 
@@ -104,13 +109,7 @@ class GTXTestSoC(SoCCore):
             gtx.cd_tx.clk,
             gtx.cd_rx.clk)
 
-        tx_counter = Signal(32)
-        self.sync.tx += tx_counter.eq(tx_counter + 1)
-        self.comb += platform.request("user_led", 7).eq(tx_counter[26])
-
-        rx_counter = Signal(32)
-        self.sync.rx += rx_counter.eq(rx_counter + 1)
-        self.comb += platform.request("user_led", 6).eq(rx_counter[26])
+        self.submodules.freq_meter = FrequencyMeter(self.clk_freq, ["tx", "rx"])
 
 
 def main():
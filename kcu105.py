@@ -14,6 +14,7 @@ from litex.soc.cores.uart import UARTWishboneBridge
 
 from transceiver.gth_ultrascale import GTHChannelPLL, GTH, MultiGTH
 from transceiver.serdes_ultrascale import SERDESPLL, SERDES
+from transceiver.freq_meter import FrequencyMeter
 
 from litescope import LiteScopeAnalyzer
 
@@ -38,6 +39,10 @@ class BaseSoC(SoCCore):
 
 
 class GTHTestSoC(BaseSoC):
+    csr_map = {
+        "freq_meter": 20
+    }
+    csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform, medium="sfp0"):
         BaseSoC.__init__(self, platform)
 
@@ -112,13 +117,7 @@ class GTHTestSoC(BaseSoC):
             gth.cd_tx.clk,
             gth.cd_rx.clk)
 
-        tx_counter = Signal(32)
-        self.sync.tx += tx_counter.eq(tx_counter + 1)
-        self.comb += platform.request("user_led", 7).eq(tx_counter[26])
-
-        rx_counter = Signal(32)
-        self.sync.rx += rx_counter.eq(rx_counter + 1)
-        self.comb += platform.request("user_led", 6).eq(rx_counter[26])
+        self.submodules.freq_meter = FrequencyMeter(self.clk_freq, ["tx", "rx"])
 
 
 multigt_io = [
@@ -135,6 +134,10 @@ multigt_io = [
 
 
 class MultiGTHTestSoC(BaseSoC):
+    csr_map = {
+        "freq_meter": 20
+    }
+    csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform):
         BaseSoC.__init__(self, platform)
         platform.add_extension(multigt_io)
@@ -209,21 +212,8 @@ class MultiGTHTestSoC(BaseSoC):
                 gth.cd_tx.clk,
                 gth.cd_rx.clk)
 
-        tx_counter = Signal(32)
-        self.sync.gth0_tx += tx_counter.eq(tx_counter + 1)
-        self.comb += platform.request("user_led", 7).eq(tx_counter[26])
-
-        rx_counter0 = Signal(32)
-        rx_counter1 = Signal(32)
-        self.sync.gth0_rx += rx_counter0.eq(rx_counter0 + 1)
-        self.sync.gth1_rx += rx_counter0.eq(rx_counter1 + 1)
-        user_led = platform.request("user_led", 6)
-        self.comb += \
-            If(led_mode,
-                user_led.eq(rx_counter0[26])
-            ).Else(
-                user_led.eq(rx_counter1[26])
-            )
+        self.submodules.freq_meter = FrequencyMeter(self.clk_freq,
+            ["gth{}_{}".format(i, d) for i in range(mgth.nlanes) for d in ["tx", "rx"]])
 
 
 serdes_io = [
@@ -254,7 +244,8 @@ class SERDESTestSoC(BaseSoC):
     csr_map = {
         "master_serdes": 20,
         "slave_serdes": 21,
-        "analyzer": 22
+        "analyzer": 22,
+        "freq_meter": 23
     }
     csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform, analyzer=None):
@@ -289,22 +280,6 @@ class SERDESTestSoC(BaseSoC):
             master_serdes.encoder.d[1].eq(counter)
         ]
 
-        master_sys_counter = Signal(32)
-        self.sync.sys += master_sys_counter.eq(master_sys_counter + 1)
-        self.comb += platform.request("user_led", 0).eq(master_sys_counter[26])
-
-        master_serdes_counter = Signal(32)
-        self.sync.master_serdes_serdes += master_serdes_counter.eq(master_serdes_counter + 1)
-        self.comb += platform.request("user_led", 1).eq(master_serdes_counter[26])
-
-        master_serdes_2p5x_counter = Signal(32)
-        self.sync.master_serdes_serdes_2p5x += master_serdes_2p5x_counter.eq(master_serdes_2p5x_counter + 1)
-        self.comb += platform.request("user_led", 2).eq(master_serdes_2p5x_counter[26])
-
-        master_serdes_10x_counter = Signal(32)
-        self.sync.master_serdes_serdes_10x += master_serdes_10x_counter.eq(master_serdes_10x_counter + 1)
-        self.comb += platform.request("user_led", 3).eq(master_serdes_10x_counter[26])
-
 
         # slave
 
@@ -336,21 +311,14 @@ class SERDESTestSoC(BaseSoC):
             slave_serdes.encoder.d[1].eq(counter)
         ]
 
-        slave_sys_counter = Signal(32)
-        self.sync.sys += slave_sys_counter.eq(slave_sys_counter + 1)
-        self.comb += platform.request("user_led", 4).eq(slave_sys_counter[26])
-
-        slave_serdes_counter = Signal(32)
-        self.sync.slave_serdes_serdes += slave_serdes_counter.eq(slave_serdes_counter + 1)
-        self.comb += platform.request("user_led", 5).eq(slave_serdes_counter[26])
-
-        slave_serdes_2p5x_counter = Signal(32)
-        self.sync.slave_serdes_serdes_2p5x += slave_serdes_2p5x_counter.eq(slave_serdes_2p5x_counter + 1)
-        self.comb += platform.request("user_led", 6).eq(slave_serdes_2p5x_counter[26])
-
-        slave_serdes_10x_counter = Signal(32)
-        self.sync.slave_serdes_serdes_10x += slave_serdes_10x_counter.eq(slave_serdes_10x_counter + 1)
-        self.comb += platform.request("user_led", 7).eq(slave_serdes_10x_counter[26])
+        self.submodules.freq_meter = FrequencyMeter(self.clk_freq, [
+            "master_serdes_serdes",
+            "master_serdes_serdes_2p5x",
+            "master_serdes_serdes_10x",
+            "slave_serdes_serdes",
+            "slave_serdes_serdes_2p5x",
+            "slave_serdes_serdes_10x"
+        ])
 
         if analyzer == "master":
             analyzer_signals = [
@@ -12,6 +12,7 @@ from litex.soc.integration.builder import *
 from litex.soc.cores.uart import UARTWishboneBridge
 
 from transceiver.serdes_7series import SERDESPLL, SERDES
+from transceiver.freq_meter import FrequencyMeter
 
 from litescope import LiteScopeAnalyzer
 
@@ -136,7 +137,8 @@ class SERDESTestSoC(BaseSoC):
     csr_map = {
         "master_serdes": 20,
         "slave_serdes": 21,
-        "analyzer": 22
+        "analyzer": 22,
+        "freq_meter": 23
     }
     csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform, medium="hdmi", analyzer=None):
@@ -174,22 +176,6 @@ class SERDESTestSoC(BaseSoC):
             master_serdes.encoder.d[1].eq(counter)
         ]
 
-        master_sys_counter = Signal(32)
-        self.sync.sys += master_sys_counter.eq(master_sys_counter + 1)
-        self.comb += platform.request("user_led", 0).eq(master_sys_counter[26])
-
-        master_serdes_counter = Signal(32)
-        self.sync.master_serdes_serdes += master_serdes_counter.eq(master_serdes_counter + 1)
-        self.comb += platform.request("user_led", 1).eq(master_serdes_counter[26])
-
-        master_serdes_2p5x_counter = Signal(32)
-        self.sync.master_serdes_serdes_2p5x += master_serdes_2p5x_counter.eq(master_serdes_2p5x_counter + 1)
-        self.comb += platform.request("user_led", 2).eq(master_serdes_2p5x_counter[26])
-
-        master_serdes_10x_counter = Signal(32)
-        self.sync.master_serdes_serdes_10x += master_serdes_10x_counter.eq(master_serdes_10x_counter + 1)
-        self.comb += platform.request("user_led", 3).eq(master_serdes_10x_counter[26])
-
 
         # slave
 
@@ -225,21 +211,14 @@ class SERDESTestSoC(BaseSoC):
             slave_serdes.encoder.d[1].eq(counter)
         ]
 
-        slave_sys_counter = Signal(32)
-        self.sync.sys += slave_sys_counter.eq(slave_sys_counter + 1)
-        self.comb += platform.request("user_led", 4).eq(slave_sys_counter[26])
-
-        slave_serdes_counter = Signal(32)
-        self.sync.slave_serdes_serdes += slave_serdes_counter.eq(slave_serdes_counter + 1)
-        self.comb += platform.request("user_led", 5).eq(slave_serdes_counter[26])
-
-        slave_serdes_2p5x_counter = Signal(32)
-        self.sync.slave_serdes_serdes_2p5x += slave_serdes_2p5x_counter.eq(slave_serdes_2p5x_counter + 1)
-        self.comb += platform.request("user_led", 6).eq(slave_serdes_2p5x_counter[26])
-
-        slave_serdes_10x_counter = Signal(32)
-        self.sync.slave_serdes_serdes_10x += slave_serdes_10x_counter.eq(slave_serdes_10x_counter + 1)
-        self.comb += platform.request("user_led", 7).eq(slave_serdes_10x_counter[26])
+        self.submodules.freq_meter = FrequencyMeter(self.clk_freq, [
+            "master_serdes_serdes",
+            "master_serdes_serdes_2p5x",
+            "master_serdes_serdes_10x",
+            "slave_serdes_serdes",
+            "slave_serdes_serdes_2p5x",
+            "slave_serdes_serdes_10x"
+        ])
 
         if analyzer == "master":
             analyzer_signals = [
@@ -12,6 +12,7 @@ from litex.soc.integration.builder import *
 from litex.soc.cores.uart import UARTWishboneBridge
 
 from transceiver.gtp_7series import GTPQuadPLL, GTP
+from transceiver.freq_meter import FrequencyMeter
 
 from litescope import LiteScopeAnalyzer
 
@@ -80,7 +81,8 @@ class BaseSoC(SoCCore):
 
 class GTPTestSoC(BaseSoC):
     csr_map = {
-        "analyzer": 20
+        "analyzer": 20,
+        "freq_meter": 21
     }
     csr_map.update(BaseSoC.csr_map)
     def __init__(self, platform, medium="sfp0", loopback=False, with_analyzer=True):
@@ -152,18 +154,7 @@ class GTPTestSoC(BaseSoC):
             gtp.cd_tx.clk,
             gtp.cd_rx.clk)
 
-        tx_counter_led = Signal()
-        tx_counter = Signal(32)
-        self.sync.tx += tx_counter.eq(tx_counter + 1)
-        self.comb += tx_counter_led.eq(tx_counter[26])
-
-        rx_counter_led = Signal()
-        rx_counter = Signal(32)
-        self.sync.rx += rx_counter.eq(rx_counter + 1)
-        self.comb += rx_counter_led.eq(rx_counter[26])
-
-        self.comb += platform.request("user_led", 0).eq(tx_counter_led)
-        self.comb += platform.request("user_led", 1).eq(rx_counter_led)
+        self.submodules.freq_meter = FrequencyMeter(self.sys_clk_freq, ["tx", "rx"])
 
         if with_analyzer:
             analyzer_signals = [
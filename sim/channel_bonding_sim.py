@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import sys
+from functools import reduce
+from operator import or_
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.channel_bonding import ChannelBonding
+
+
+# ChannelBonding with each lane looped back through its own delay line
+# (in words). The same counter is sent on all the lanes, so the bonded
+# output is aligned when all its lane slices are equal.
+class DUT(Module):
+    def __init__(self, nlanes, marker_period, max_delay=16):
+        self.submodules.bonding = ChannelBonding(nlanes, marker_period)
+        self.delays = [Signal(max=max_delay + 1) for i in range(nlanes)]
+
+        self.words = Signal(32)
+        self.misaligned = Signal(32)
+        self.discontinuities = Signal(32)
+        self.clear = Signal()
+
+        # # #
+
+        self.comb += self.bonding.rx_ready.eq(1)
+
+        # lanes
+        for i in range(nlanes):
+            taps = [Signal(18) for j in range(max_delay + 1)]
+            sync = getattr(self.sync, "lane{}_rx".format(i))
+            sync += [taps[j+1].eq(taps[j]) for j in range(max_delay)]
+            self.comb += [
+                taps[0].eq(self.bonding.lanes_tx[i].raw_bits()),
+                self.bonding.lanes_rx[i].raw_bits().eq(Array(taps)[self.delays[i]])
+            ]
+
+        # generator
+        counter = Signal(16)
+        self.comb += [
+            self.bonding.sink.valid.eq(1),
+            self.bonding.sink.data.eq(Cat(*[counter for i in range(nlanes)]))
+        ]
+        self.sync.tx += \
+            If(self.bonding.sink.ready,
+                counter.eq(counter + 1)
+            )
+
+        # checker
+        source = self.bonding.source
+        slices = [source.data[16*i:16*(i+1)] for i in range(nlanes)]
+        last = Signal(16)
+        first = Signal(reset=1)
+        self.comb += source.ready.eq(1)
+        self.sync.rx += [
+            If(self.clear,
+                self.words.eq(0),
+                self.misaligned.eq(0),
+                self.discontinuities.eq(0),
+                first.eq(1)
+            ).Elif(source.valid,
+                self.words.eq(self.words + 1),
+                If(reduce(or_, [s != slices[0] for s in slices[1:]]),
+                    self.misaligned.eq(self.misaligned + 1)
+                ),
+                If(~first & (slices[0] != last + 1),
+                    self.discontinuities.eq(self.discontinuities + 1)
+                ),
+                last.eq(slices[0]),
+                first.eq(0)
+            )
+        ]
+
+
+def check_window(dut, cycles):
+    yield dut.clear.eq(1)
+    yield
+    yield dut.clear.eq(0)
+    for i in range(cycles):
+        yield
+    words = (yield dut.words)
+    misaligned = (yield dut.misaligned)
+    discontinuities = (yield dut.discontinuities)
+    aligned = (yield dut.bonding.aligned.status)
+    realignments = (yield dut.bonding.realignments.status)
+    skews = []
+    for i in range(len(dut.delays)):
+        skews.append((yield getattr(dut.bonding, "lane{}_skew".format(i)).status))
+    print("words: {} misaligned: {} discontinuities: {} aligned: {} realignments: {} skews: {}".format(
+        words, misaligned, discontinuities, aligned, realignments, skews))
+    return words, misaligned, discontinuities, aligned, realignments, skews
+
+
+def main_generator(dut, delays, new_delays, marker_period):
+    errors = 0
+
+    for i, delay in enumerate(delays):
+        yield dut.delays[i].eq(delay)
+    for i in range(4*marker_period):
+        yield
+
+    # lanes aligned, skews compensate the delays
+    print("delays: {}".format(delays))
+    words, misaligned, discontinuities, aligned, realignments, skews = \
+        (yield from check_window(dut, 8*marker_period))
+    if words == 0 or misaligned or discontinuities or not aligned or realignments:
+        errors += 1
+    for i in range(len(delays)):
+        if skews[i] - skews[0] != delays[0] - delays[i]:
+            errors += 1
+
+    # a lane delay change triggers a realignment (skews also count the
+    # words repeated/dropped by the change, not checked)
+    for i, delay in enumerate(new_delays):
+        yield dut.delays[i].eq(delay)
+    for i in range(4*marker_period):
+        yield
+
+    print("delays: {}".format(new_delays))
+    words, misaligned, discontinuities, aligned, realignments, skews = \
+        (yield from check_window(dut, 8*marker_period))
+    if words == 0 or misaligned or discontinuities or not aligned or realignments != 1:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    marker_period = 64
+    for delays, new_delays in [([0, 5, 11], [0, 9, 2]),
+                               ([7, 0, 3, 14], [7, 7, 7, 7])]:
+        nlanes = len(delays)
+        dut = DUT(nlanes, marker_period)
+        clocks = {"sys": 10, "tx": 10, "rx": 10}
+        for i in range(nlanes):
+            clocks["lane{}_tx".format(i)] = 10
+            clocks["lane{}_rx".format(i)] = 10
+        run_simulation(dut, main_generator(dut, delays, new_delays, marker_period),
+                       clocks=clocks)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import sys
+import random
+from math import ceil
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.gth_ultrascale_init import GTHInit
+from transceiver.gtx_7series_init import GTXInit
+from transceiver.clock_aligner import BruteforceClockAligner
+
+
+# Lock time model of a receiver using BruteforceClockAligner and the
+# restart path of its rx init, GTHInit (fast restart) or GTXInit (init_cls,
+# all times in tx cycles). The init timers are taken from the init class.
+#
+# Each reset of the receiver gives a random RX phase: the comma lands on the
+# LSBs with probability p_align, an aligned attempt still fails its
+# error-free window with probability p_error, and the init does not complete
+# (ready timer expires, full restart) with probability p_init_timeout.
+#
+# An attempt costs the receiver init time, then the comma check window and,
+# if the comma was seen, the error-free window. The first attempt and the
+# one following an init timeout go through a full restart of the init (PLL
+# reset, PLL lock in pll_lock_cycles), the other ones through a fast
+# restart. A multi-lane link (MultiGTH) is locked when its slowest lane is.
+class LockTimeModel:
+    def __init__(self, tx_clk_freq,
+                 check_period=6e-3, comma_check_period=None,
+                 p_align=1/20, p_error=0.0, p_init_timeout=0.0,
+                 resetdone_cycles=256, syncdone_cycles=64, init_cls=GTHInit,
+                 dlysresetdone_cycles=64, phaligndone_cycles=64,
+                 pll_lock_cycles=0):
+        self.tx_clk_freq = tx_clk_freq
+        self.p_align = p_align
+        self.p_error = p_error
+        self.p_init_timeout = p_init_timeout
+
+        # BruteforceClockAligner windows (+1 for the counter reload cycle)
+        self.check_cycles = ceil(check_period*tx_clk_freq) + 1
+        if comma_check_period is None:
+            self.comma_check_cycles = self.check_cycles
+        else:
+            self.comma_check_cycles = ceil(comma_check_period*tx_clk_freq) + 1
+
+        # rx init timings (transceiver outputs go through MultiRegs, 2
+        # cycles), in both inits RELEASE_GTX/GTH_RESET waits for resetdone
+        # and the CDR stable timer:
+        # - GTHInit: RESET_ALL waits for the PLL reset timer (full restart)
+        #   or the gtreset timer (fast restart), RELEASE_PLL_RESET for the
+        #   PLL lock (full restart), WAIT_ALIGN for syncdone.
+        # - GTXInit (full restarts only): RESET_ALL and RELEASE_PLL_RESET
+        #   wait for the startup timer and the PLL lock, WAIT_ALIGN waits
+        #   for dlysresetdone, then 2 rising edges of phaligndone
+        #   (phaligndone_cycles apart, the first one phaligndone_cycles
+        #   after dlysresetdone).
+        # The other states take 1 cycle each.
+        def ns_cycles(ns):
+            return ceil(ns*tx_clk_freq/1000000000)
+        cdr_stable_cycles = init_cls.cdr_stable_cycles
+        reset_done_cycles = max(cdr_stable_cycles, resetdone_cycles + 2)
+        if init_cls is GTHInit:
+            align_cycles = reset_done_cycles + syncdone_cycles + 2
+            self.init_cycles = 6 + ns_cycles(init_cls.gtreset_ns) + align_cycles
+            self.full_init_cycles = (6 + ns_cycles(init_cls.pll_reset_ns) +
+                                     pll_lock_cycles + 2 + align_cycles)
+        elif init_cls is GTXInit:
+            self.full_init_cycles = (5 +
+                max(ns_cycles(init_cls.startup_ns), pll_lock_cycles + 2) +
+                reset_done_cycles +
+                dlysresetdone_cycles + 2*phaligndone_cycles + 2)
+            self.init_cycles = self.full_init_cycles
+        else:
+            raise ValueError("Unsupported init " + init_cls.__name__)
+        self.init_timeout_cycles = int(init_cls.ready_ms*tx_clk_freq/1000)
+
+    def attempt(self, aligned, error, init_timeout, first=False):
+        cycles = 0
+        if init_timeout:
+            cycles += self.init_timeout_cycles
+        if first or init_timeout:
+            cycles += self.full_init_cycles
+        else:
+            cycles += self.init_cycles
+        cycles += self.comma_check_cycles
+        if aligned:
+            cycles += self.check_cycles
+        return cycles, aligned and not error
+
+    def lock_time(self, attempts):
+        cycles = 0
+        for resets, (aligned, error, init_timeout) in enumerate(attempts):
+            attempt_cycles, locked = self.attempt(aligned, error, init_timeout,
+                                                  first=resets == 0)
+            cycles += attempt_cycles
+            if locked:
+                return cycles, resets
+        raise ValueError("attempts exhausted before lock")
+
+    def random_attempts(self, rng):
+        while True:
+            yield (rng.random() < self.p_align,
+                   rng.random() < self.p_error,
+                   rng.random() < self.p_init_timeout)
+
+    def lock_time_distribution(self, nlanes, trials, seed=0):
+        rng = random.Random(seed)
+        r = []
+        for trial in range(trials):
+            lanes = [self.lock_time(self.random_attempts(rng))[0]
+                     for lane in range(nlanes)]
+            r.append(max(lanes))
+        return sorted(r)
+
+
+def print_distributions(model, lanes=[1, 2, 4, 8, 16], trials=10000):
+    def ms(cycles):
+        return 1e3*cycles/model.tx_clk_freq
+    print("lanes    mean     p50     p90     p99     max (ms)")
+    for nlanes in lanes:
+        d = model.lock_time_distribution(nlanes, trials)
+        mean = sum(d)/len(d)
+        print("{:5d} {:7.2f} {:7.2f} {:7.2f} {:7.2f} {:7.2f}".format(
+            nlanes, ms(mean),
+            ms(d[len(d)//2]), ms(d[(90*len(d))//100]), ms(d[(99*len(d))//100]),
+            ms(d[-1])))
+
+
+# Simulation cross-check: the real rx init and aligner are driven by
+# a transceiver stand-in. Each attempt (started by a GTRXRESET, except the
+# one after an init timeout) gives a new RX phase, errors once the comma
+# is seen (error) or no resetdone (init_timeout). The PLL relocks
+# pll_lock_cycles after its reset.
+
+class _CrossCheckDUT(Module):
+    def __init__(self, init_cls, tx_clk_freq, check_period, comma_check_period):
+        self.submodules.rx_init = rx_init = ClockDomainsRenamer("tx")(
+            init_cls(tx_clk_freq, True))
+        self.submodules.aligner = aligner = BruteforceClockAligner(
+            0b0101111100, tx_clk_freq, check_period, comma_check_period)
+        self.comb += [
+            aligner.rx_init_done.eq(rx_init.done),
+            # GTXInit has no fast restart
+            getattr(rx_init, "fast_restart", rx_init.restart).eq(aligner.restart)
+        ]
+
+
+def _rxdata(aligned, error):
+    # K28.5 + D21.5 (balanced), shifted by 1 bit when not aligned, an
+    # all-zeros word (disparity error) on errors
+    if error:
+        return 0
+    word = 0b0101111100 | (0b1010101010 << 10)
+    if not aligned:
+        word = ((word << 1) | (word >> 19)) & (2**20-1)
+    return word
+
+
+def crosscheck_one(init_cls, tx_clk_freq, check_period, comma_check_period,
+                   attempts, resetdone_cycles=256, syncdone_cycles=64,
+                   dlysresetdone_cycles=64, phaligndone_cycles=64,
+                   pll_lock_cycles=0):
+    dut = _CrossCheckDUT(init_cls, tx_clk_freq, check_period, comma_check_period)
+    state = {"aligned": False, "error": False, "attempt": 0, "lock": None}
+
+    # transceiver alignment outputs, as a function of the cycles elapsed
+    # since Xxdlysreset
+    if init_cls is GTHInit:
+        def align_outputs(t):
+            yield dut.rx_init.Xxsyncdone.eq(t is not None and t >= syncdone_cycles)
+    else:
+        def align_outputs(t):
+            t = None if t is None else t - dlysresetdone_cycles
+            yield dut.rx_init.Xxdlysresetdone.eq(t is not None and t >= 0)
+            yield dut.rx_init.Xxphaligndone.eq(t is not None and
+                (t == phaligndone_cycles or t >= 2*phaligndone_cycles))
+
+    def transceiver():
+        gtrxreset_r = 0
+        init_timeout = False
+        pll_lock_timer = 0
+        resetdone_timer = None
+        align_time = None
+        cycle = 0
+        while state["lock"] is None:
+            if (yield dut.rx_init.pllreset):
+                pll_lock_timer = pll_lock_cycles
+            elif pll_lock_timer:
+                pll_lock_timer -= 1
+            yield dut.rx_init.plllock.eq(pll_lock_timer == 0)
+            gtrxreset = (yield dut.rx_init.gtXxreset)
+            if gtrxreset:
+                if not gtrxreset_r:
+                    if init_timeout:
+                        # full restart of the init after its timeout
+                        init_timeout = False
+                    else:
+                        aligned, error, init_timeout = attempts[state["attempt"]]
+                        state["aligned"] = aligned
+                        state["error"] = error
+                        state["attempt"] += 1
+                resetdone_timer = None
+                align_time = None
+                yield dut.rx_init.Xxresetdone.eq(0)
+            elif resetdone_timer is None and not init_timeout:
+                resetdone_timer = resetdone_cycles
+            if resetdone_timer is not None:
+                if resetdone_timer == 0:
+                    yield dut.rx_init.Xxresetdone.eq(1)
+                else:
+                    resetdone_timer -= 1
+            if (yield dut.rx_init.Xxdlysreset):
+                align_time = 0
+            elif align_time is not None:
+                align_time += 1
+            yield from align_outputs(align_time)
+            if (yield dut.aligner.ready):
+                state["lock"] = cycle
+            gtrxreset_r = gtrxreset
+            cycle += 1
+            yield
+
+    @passive
+    def receiver():
+        cycle = 0
+        while True:
+            error = state["error"] and cycle % 16 == 0
+            yield dut.aligner.rxdata.eq(_rxdata(state["aligned"], error))
+            cycle += 1
+            yield
+
+    run_simulation(dut, {"tx": transceiver(), "rx": receiver()},
+                   clocks={"sys": 10, "tx": 10, "rx": 10})
+    return state["lock"], state["attempt"] - 1
+
+
+def crosscheck(trials=4, seed=0):
+    # scaled down timings to keep the simulation short, the ready timer
+    # (1ms) must stay longer than the 1024 cycles CDR stable timer. GTXInit
+    # runs faster so that its startup timer (500ns) spans several cycles.
+    rng = random.Random(seed)
+    pll_lock_cycles = 20
+    for init_cls, tx_clk_freq in [(GTHInit, 2e6), (GTXInit, 20e6)]:
+        for check_period, comma_check_period in [(100e-6, None), (100e-6, 10e-6)]:
+            model = LockTimeModel(tx_clk_freq, check_period, comma_check_period,
+                                  p_align=0.3, p_error=0.3, p_init_timeout=0.2,
+                                  init_cls=init_cls,
+                                  pll_lock_cycles=pll_lock_cycles)
+            for trial in range(trials):
+                attempts = [next(model.random_attempts(rng)) for i in range(32)]
+                attempts[8] = (True, False, False)
+                sim_cycles, sim_resets = crosscheck_one(init_cls, tx_clk_freq,
+                    check_period, comma_check_period, attempts,
+                    pll_lock_cycles=pll_lock_cycles)
+                model_cycles, model_resets = model.lock_time(attempts)
+                print("{}: check: {:3.0f}us, comma check: {}, resets: {:2d}/{:2d}, "
+                      "errors: {}, init timeouts: {}, "
+                      "lock: sim {:6d} / model {:6d} cycles ({:+.2f}%)".format(
+                    init_cls.__name__,
+                    check_period*1e6,
+                    "{:3.0f}us".format(comma_check_period*1e6) if comma_check_period else "  -  ",
+                    sim_resets, model_resets,
+                    sum(a and e for a, e, t in attempts[:model_resets + 1]),
+                    sum(t for a, e, t in attempts[:model_resets + 1]),
+                    sim_cycles, model_cycles,
+                    100*(model_cycles - sim_cycles)/sim_cycles))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "crosscheck":
+        crosscheck()
+    else:
+        tx_clk_freq = 62.5e6
+        print("BruteforceClockAligner @ {:3.2f}MHz tx clock".format(tx_clk_freq/1e6))
+        print("\nfixed 6ms check period:")
+        print_distributions(LockTimeModel(tx_clk_freq, check_period=6e-3))
+        print("\nadaptive: 100us comma check, 6ms error-free check:")
+        print_distributions(LockTimeModel(tx_clk_freq, check_period=6e-3,
+                                          comma_check_period=100e-6))
+
+if __name__ == "__main__":
+    main()
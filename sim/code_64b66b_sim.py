@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import sys
+import random
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.code_64b66b import Encoder, Decoder
+
+
+# Encoder looped back to the Decoder through a bit level channel (in the
+# generators): the channel delays the stream by a number of bits (block
+# boundary unknown to the Decoder) and can invalidate the sync header of
+# chosen blocks.
+class DUT(Module):
+    def __init__(self, dw=20):
+        self.dw = dw
+        self.submodules.encoder = Encoder(dw)
+        self.submodules.decoder = Decoder(dw)
+
+
+def block(n):
+    # unique data, k on every 5th block
+    return (n*0x9e3779b97f4a7c15 & (2**64-1)) ^ n, n % 5 == 0
+
+
+def channel(dut, offset, bad_headers, state):
+    rng = random.Random(offset)
+    bits = [rng.randrange(2) for i in range(offset)]
+    stream_bits = 0
+    blocks = 0
+    while True:
+        # source
+        if (yield dut.encoder.ready):
+            d, k = block(blocks)
+            yield dut.encoder.d.eq(d)
+            yield dut.encoder.k.eq(k)
+            blocks += 1
+        output = (yield dut.encoder.output)
+        for i in range(dut.dw):
+            bit = (output >> i) & 1
+            # bits 0/1 of each block are its sync header: 0b10 -> 0b11
+            # and 0b01 -> 0b00
+            n, position = divmod(stream_bits, 66)
+            if position == 0 and n in bad_headers:
+                bit ^= 1
+            bits.append(bit)
+            stream_bits += 1
+        # sink
+        word = 0
+        for i in range(dut.dw):
+            word |= bits.pop(0) << i
+        yield dut.decoder.input.eq(word)
+        # the bad headers are relative to the current block
+        state["block"] = stream_bits//66
+        yield
+
+
+def receiver(dut, state):
+    while True:
+        if (yield dut.decoder.valid):
+            state["received"].append(((yield dut.decoder.d), (yield dut.decoder.k)))
+        state["lock"] = (yield dut.decoder.block_lock)
+        yield
+
+
+def check_received(received):
+    # the received blocks must be consecutive sent blocks
+    if not received:
+        return False
+    for n in range(100000):
+        if block(n) == received[0]:
+            break
+    else:
+        return False
+    return all(block(n + i) == r for i, r in enumerate(received))
+
+
+def main_generator(dut, state, bad_headers):
+    errors = 0
+
+    # lock from an arbitrary slip offset, no header error counted
+    for cycle in range(2000):
+        if state["lock"]:
+            break
+        yield
+    lock_cycles = cycle
+    header_errors = (yield dut.decoder.header_errors)
+    state["received"].clear()
+    for i in range(200):
+        yield
+    data_ok = check_received(state["received"])
+    print("lock: {} cycles, header errors: {}, data: {}".format(
+        lock_cycles, header_errors, "ok" if data_ok else "ERROR"))
+    if not state["lock"] or header_errors or not data_ok:
+        errors += 1
+
+    # 15 bad headers spread over several windows: lock kept
+    start = state["block"] + 10
+    bad_headers.update(start + 8*i for i in range(15))
+    lost = False
+    for i in range(8*15*66//dut.dw + 100):
+        lost |= not state["lock"]
+        yield
+    header_errors = (yield dut.decoder.header_errors)
+    print("15 bad headers: lock {}, header errors: {}".format(
+        "lost" if lost else "kept", header_errors))
+    if lost or header_errors != 15:
+        errors += 1
+
+    # 32 consecutive bad headers (at least 16 in a window): lock lost,
+    # then acquired again
+    start = state["block"] + 10
+    bad_headers.update(start + i for i in range(32))
+    lost = False
+    for i in range(42*66//dut.dw + 10):
+        lost |= not state["lock"]
+        yield
+    for cycle in range(2000):
+        if state["lock"]:
+            break
+        yield
+    state["received"].clear()
+    for i in range(200):
+        yield
+    data_ok = check_received(state["received"])
+    print("32 bad headers: lock {}, relock: {}, data: {}".format(
+        "lost" if lost else "kept", "yes" if state["lock"] else "no",
+        "ok" if data_ok else "ERROR"))
+    if not lost or not state["lock"] or not data_ok:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    for offset in [0, 1, 7, 19, 33, 65]:
+        print("offset: {} bits".format(offset))
+        dut = DUT()
+        state = {"received": [], "lock": 0, "block": 0}
+        bad_headers = set()
+        run_simulation(dut, [
+            main_generator(dut, state, bad_headers),
+            passive(channel)(dut, offset, bad_headers, state),
+            passive(receiver)(dut, state)
+        ])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.ddmtd import DDMTD
+
+
+# DDMTD with nbits=5 (N=32): ref and clk (period of 32 "fine" cycles) are
+# generated in the fine domain, the helper clock runs at 32/33 of their
+# frequency. One helper cycle of phase is one fine cycle, so clk delayed by
+# d fine cycles has a phase of d.
+#
+# Jitter is added by delaying clk by d or d + jitter on alternate beat
+# periods: the measurements alternate between d and d + jitter, their
+# average is d + jitter/2 and their peak-to-peak deviation is jitter.
+nbits = 5
+avg_bits = 2
+period = 2**nbits
+beat = period*(period + 1)
+
+
+class DUT(Module):
+    def __init__(self):
+        self.submodules.ddmtd = DDMTD(nbits, avg_bits)
+
+
+def clocks_generator(dut, phase, jitter):
+    t = 0
+    while True:
+        # change the delay between two edges of the clk beat signal
+        d = phase + jitter*(((t - (period + 1)*phase - beat//2)//beat) % 2)
+        yield dut.ddmtd.ref.eq((t % period) < period//2)
+        yield dut.ddmtd.clk.eq(((t - d) % period) < period//2)
+        t += 1
+        yield
+
+
+def main_generator(dut, phase, jitter):
+    errors = 0
+
+    # skip the first windows (no ref edge tagged yet)
+    while (yield dut.ddmtd.measurements.status) < 3:
+        yield
+    phase_avg = (yield dut.ddmtd.phase_avg.status)
+    measured_jitter = (yield dut.ddmtd.jitter.status)
+
+    expected_avg = round((phase + jitter/2)*2**avg_bits) % 2**(nbits + avg_bits)
+    print("phase: {:2d} jitter: {} -> phase_avg: {:6.2f} (expected {:6.2f}) jitter: {}".format(
+        phase, jitter, phase_avg/2**avg_bits, expected_avg/2**avg_bits,
+        measured_jitter))
+    if phase_avg != expected_avg or measured_jitter != jitter:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    # (phase, jitter), the last one averages across the 0/N wrap
+    for phase, jitter in [(5, 0), (12, 3), (20, 1), (31, 2)]:
+        dut = DUT()
+        run_simulation(dut, {
+                "sys": main_generator(dut, phase, jitter),
+                "fine": passive(clocks_generator)(dut, phase, jitter)
+            },
+            clocks={"sys": 20, "fine": 2, "helper": (2*(period + 1), 1)})
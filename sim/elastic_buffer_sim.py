@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.elastic_buffer import SkipInserter, ElasticBuffer, SKIP_K, SKIP_D
+
+
+# SkipInserter (remote, rx domain) sending counter data to the ElasticBuffer
+# and a checker of the words read in the local (tx) domain: the data words
+# must be consecutive, only skip words can be deleted or inserted.
+class DUT(Module):
+    def __init__(self, depth, **kwargs):
+        self.depth = depth
+        inserter = ClockDomainsRenamer({"tx": "rx"})(SkipInserter(**kwargs))
+        self.submodules.inserter = inserter
+        self.submodules.buffer = ElasticBuffer(depth)
+
+        counter = Signal(16)
+        self.comb += [
+            inserter.sink.valid.eq(1),
+            inserter.sink.d.eq(counter),
+            self.buffer.sink.eq(inserter.source)
+        ]
+        self.sync.rx += If(inserter.sink.ready, counter.eq(counter + 1))
+
+        self.data_words = Signal(32)
+        self.skip_words = Signal(32)
+        self.errors = Signal(32)
+
+        source = self.buffer.source
+        first = Signal(reset=1)
+        last = Signal(16)
+        self.sync.tx += \
+            If((source.k == SKIP_K) & (source.d == SKIP_D),
+                self.skip_words.eq(self.skip_words + 1)
+            ).Else(
+                first.eq(0),
+                last.eq(source.d),
+                If((source.k != 0) | (~first & (source.d != last + 1)),
+                    self.errors.eq(self.errors + 1)
+                ),
+                self.data_words.eq(self.data_words + 1)
+            )
+
+
+# runs in the tx domain
+def main_generator(dut, cycles, rx_period, tx_period):
+    errors = 0
+
+    for i in range(cycles):
+        yield
+    # let the status go through the synchronizers
+    for i in range(64):
+        yield
+    status = {}
+    for name in ["deletes", "inserts", "underflows", "overflows"]:
+        status[name] = (yield getattr(dut.buffer, name).status)
+    data_words = (yield dut.data_words)
+    skip_words = (yield dut.skip_words)
+    data_errors = (yield dut.errors)
+    print("data: {} skips: {} data errors: {} ".format(
+        data_words, skip_words, data_errors) +
+        " ".join("{}: {}".format(k, v) for k, v in status.items()))
+
+    if data_errors or status["underflows"] or status["overflows"]:
+        errors += 1
+    # no stall: at least half of the words carry data
+    if data_words < cycles//2:
+        errors += 1
+    # the skips deleted (rx faster) or inserted (rx slower) follow the
+    # words of drift, a few are deleted while the buffer starts
+    drift = cycles*(tx_period - rx_period)//rx_period
+    corrections = status["deletes"] - status["inserts"]
+    if (abs(corrections - drift) > dut.depth//4 or
+        min(status["deletes"], status["inserts"]) > 4):
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    # +-10%: skip every 4 words
+    for rx_period, tx_period in [(20, 22), (20, 18), (20, 20)]:
+        print("rx period: {} tx period: {}".format(rx_period, tx_period))
+        dut = DUT(32, skip_period=4)
+        run_simulation(dut, {"tx": main_generator(dut, 20000, rx_period, tx_period)},
+                       clocks={"sys": 10, "rx": rx_period, "tx": tx_period})
+    # +-2000ppm with the default period (clock periods must be even)
+    for rx_period, tx_period in [(1000, 1002), (1000, 998)]:
+        print("rx period: {} tx period: {}".format(rx_period, tx_period))
+        dut = DUT(32, ppm=2000)
+        run_simulation(dut, {"tx": main_generator(dut, 20000, rx_period, tx_period)},
+                       clocks={"sys": 500, "rx": rx_period, "tx": tx_period})
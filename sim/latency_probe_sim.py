@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.latency_probe import LatencyProbe, LatencyReflector
+
+
+class _DelayLine(Module):
+    def __init__(self, cd, max_delay):
+        self.delay = Signal(max=max_delay + 1)
+        self.i = Signal(18)
+        self.o = Signal(18)
+
+        # # #
+
+        sync = getattr(self.sync, cd)
+        taps = [self.i]
+        for i in range(max_delay):
+            tap = Signal(18)
+            sync += tap.eq(taps[-1])
+            taps.append(tap)
+        self.comb += self.o.eq(Array(taps)[self.delay])
+
+
+# LatencyProbe linked to a LatencyReflector through a delay line (words) in
+# each direction, or looped back to itself through the first one.
+class DUT(Module):
+    def __init__(self, max_delay=64):
+        self.submodules.probe = LatencyProbe(hist_bins=4)
+        self.submodules.reflector = ClockDomainsRenamer(
+            {"tx": "remote_tx", "rx": "remote_rx"})(LatencyReflector())
+        self.submodules.forward = _DelayLine("tx", max_delay)
+        self.submodules.backward = _DelayLine("remote_tx", max_delay)
+        self.loopback = Signal()
+
+        self.comb += [
+            self.forward.i.eq(self.probe.source.raw_bits()),
+            self.reflector.rx.raw_bits().eq(self.forward.o),
+            self.backward.i.eq(self.reflector.source.raw_bits()),
+            If(self.loopback,
+                self.probe.rx.raw_bits().eq(self.forward.o)
+            ).Else(
+                self.probe.rx.raw_bits().eq(self.backward.o)
+            )
+        ]
+
+
+def measure(dut):
+    measurements = (yield dut.probe.measurements.status)
+    yield dut.probe.probe.re.eq(1)
+    yield
+    yield dut.probe.probe.re.eq(0)
+    for i in range(1024):
+        yield
+        if (yield dut.probe.measurements.status) != measurements:
+            break
+    for i in range(8):
+        yield
+    return (yield dut.probe.latency.status), (yield dut.probe.latency_ui.status)
+
+
+def read_histogram(dut, hist_bins=4):
+    counts = []
+    for i in range(hist_bins):
+        yield dut.probe.hist_index.storage.eq(i)
+        for j in range(16):
+            yield
+        counts.append((yield dut.probe.hist_count.status))
+    return ((yield dut.probe.hist_underflows.status), counts,
+            (yield dut.probe.hist_overflows.status))
+
+
+def main_generator(dut):
+    errors = 0
+
+    # the round trip follows the delays, the UI adds the slides
+    yield dut.probe.slides.eq(7)
+    results = {}
+    for loopback, forward, backward in [(0, 0, 0), (0, 10, 0), (0, 10, 25),
+                                        (1, 0, 0), (1, 10, 0)]:
+        yield dut.loopback.eq(loopback)
+        yield dut.forward.delay.eq(forward)
+        yield dut.backward.delay.eq(backward)
+        latency, latency_ui = (yield from measure(dut))
+        print("loopback: {} delays: {:2d}/{:2d} latency: {} cycles, {} UI".format(
+            loopback, forward, backward, latency, latency_ui))
+        results[(loopback, forward, backward)] = latency
+        if latency_ui != latency*20 + 7:
+            errors += 1
+    if (results[(0, 10, 0)] - results[(0, 0, 0)] != 10 or
+        results[(0, 10, 25)] - results[(0, 0, 0)] != 35 or
+        results[(1, 10, 0)] - results[(1, 0, 0)] != 10 or
+        # the reflector adds its own synchronization and insertion
+        results[(0, 0, 0)] <= results[(1, 0, 0)]):
+        errors += 1
+
+    # histogram: bins of latencies base..base+3, the other ones counted
+    # apart
+    base = results[(1, 0, 0)] + 2
+    yield dut.probe.hist_base.storage.eq(base)
+    yield dut.probe.hist_clear.re.eq(1)
+    yield
+    yield dut.probe.hist_clear.re.eq(0)
+    yield dut.loopback.eq(1)
+    expected = [0, [0]*4, 0]
+    for delay in [0, 1, 2, 3, 3, 5, 6, 9]:
+        yield dut.forward.delay.eq(delay)
+        yield from measure(dut)
+        offset = delay - 2
+        if offset < 0:
+            expected[0] += 1
+        elif offset >= 4:
+            expected[2] += 1
+        else:
+            expected[1][offset] += 1
+    underflows, counts, overflows = (yield from read_histogram(dut))
+    print("histogram: underflows: {} bins: {} overflows: {}".format(
+        underflows, counts, overflows))
+    if [underflows, counts, overflows] != expected:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    dut = DUT()
+    run_simulation(dut, main_generator(dut),
+                   clocks={"sys": 10, "tx": 10, "rx": 10,
+                           "remote_tx": 10, "remote_rx": 10})
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append("../")
+
+from migen import *
+
+from transceiver.clock_aligner import SlideClockAligner
+
+
+# SlideClockAligner driven by a transceiver stand-in: rxdata is a 20-bit
+# word (K28.5 + D21.5) rotated by the RX phase plus the number of RXSLIDE
+# pulses (each one taking effect slide_latency cycles later, as in the PCS).
+# A restart gives a new RX phase and resets the slides. Without comma the
+# stand-in sends all-zeros words (disparity errors).
+comma = 0b0101111100
+word = comma | (0b1010101010 << 10)
+tx_clk_freq = 1e6
+check_period = 64e-6
+check_cycles = 64
+slide_wait = 32
+slide_latency = 4
+
+
+class DUT(Module):
+    def __init__(self):
+        self.submodules.aligner = SlideClockAligner(comma, tx_clk_freq,
+            check_period, slide_wait)
+
+
+def rotate(w, n):
+    n %= 20
+    return ((w >> n) | (w << (20 - n))) & (2**20-1)
+
+
+def transceiver(dut, state):
+    pending = []
+    cycle = 0
+    while True:
+        if state["restart_phase"] is not None:
+            state["phase"] = state["restart_phase"]
+            state["restart_phase"] = None
+            state["slides_before_restart"] = state["slides"]
+            state["slides"] = 0
+            pending = []
+        if (yield dut.aligner.rxslide):
+            pending.append(cycle + slide_latency)
+            state["slides"] += 1
+            state["slide_cycles"].append(cycle)
+        while pending and pending[0] == cycle:
+            pending.pop(0)
+            state["phase"] += 1
+        if state["comma"]:
+            yield dut.aligner.rxdata.eq(rotate(word, state["phase"]))
+        else:
+            yield dut.aligner.rxdata.eq(0)
+        cycle += 1
+        state["cycle"] = cycle
+        yield
+
+
+def restarts(dut, state):
+    while True:
+        if (yield dut.aligner.restart):
+            state["restarts"] += 1
+            state["restart_phase"] = state["phases"].pop(0)
+        yield
+
+
+def wait_ready(dut, state, timeout=21*(check_cycles + slide_wait + 8)):
+    for i in range(timeout):
+        if (yield dut.aligner.ready):
+            return True
+        yield
+    return False
+
+
+def check_aligned(dut, state, name):
+    errors = 0
+    ready = (yield from wait_ready(dut, state))
+    slides = (yield dut.aligner.slides)
+    aligned = state["phase"] % 20 == 0
+    # slides is the latency added by the alignment: the slides since the
+    # last restart, modulo 20
+    expected = state["slides"] % 20
+    print("{}: ready: {} aligned: {} slides: {} (expected {})".format(
+        name, ready, aligned, slides, expected))
+    if not ready or not aligned or slides != expected:
+        errors += 1
+    return errors
+
+
+def main_generator(dut, state):
+    errors = 0
+
+    # initial alignment from phase 7: 13 slides
+    errors += (yield from check_aligned(dut, state, "phase 7"))
+    if state["slides"] != 13:
+        errors += 1
+
+    # the RX phase moves by 3 bits once ready: errors, realigned by
+    # sliding 17 more times
+    state["comma"] = False
+    for i in range(8):
+        yield
+    state["phase"] += 3
+    state["comma"] = True
+    errors += (yield from check_aligned(dut, state, "realign"))
+    if state["slides"] != 30:
+        errors += 1
+
+    # no comma on any phase: restart after a full turn (20 slides), the
+    # first slide after the restart comes after a full comma window of the
+    # new phase (two windows after the 20th slide)
+    state["comma"] = False
+    slides = state["slides"]
+    state["slide_cycles"] = []
+    for i in range(22*(check_cycles + slide_wait + 8)):
+        if state["restarts"]:
+            break
+        yield
+    for i in range(4*(check_cycles + slide_wait)):
+        yield
+    nslides = state["slides_before_restart"] - slides
+    cycles = state["slide_cycles"]
+    restart_interval = cycles[20] - cycles[19] if len(cycles) > 20 else 0
+    print("no comma: restarts: {} after {} slides, slide interval across the restart: {} cycles".format(
+        state["restarts"], nslides, restart_interval))
+    if state["restarts"] != 1 or nslides != 20 or restart_interval < 2*check_cycles:
+        errors += 1
+
+    # new phase after the restart
+    state["comma"] = True
+    errors += (yield from check_aligned(dut, state, "restart"))
+
+    print("errors: {}".format(errors))
+
+
+if __name__ == "__main__":
+    dut = DUT()
+    state = {"phase": 7, "slides": 0, "comma": True, "cycle": 0,
+             "slide_cycles": [], "slides_before_restart": 0, "restarts": 0,
+             "restart_phase": None, "phases": [13, 5]}
+    run_simulation(dut, {
+            "rx": [main_generator(dut, state),
+                   passive(transceiver)(dut, state)],
+            "tx": passive(restarts)(dut, state)
+        },
+        clocks={"sys": 10, "rx": 10, "tx": 10})
@@ -28,6 +28,13 @@ for i in range(30):
 print(identifier)
 
 
+# clocks
+for name in ["master_serdes_serdes", "master_serdes_serdes_2p5x", "master_serdes_serdes_10x",
+             "slave_serdes_serdes", "slave_serdes_serdes_2p5x", "slave_serdes_serdes_10x"]:
+    freq = getattr(wb.regs, "freq_meter_" + name + "_freq").read()
+    print("{}: {:.3f}MHz".format(name, freq/1e6))
+
+
 # configure master
 wb.regs.master_serdes_control_rx_bitslip_value.write(master_serdes_rx_bitslip)
 
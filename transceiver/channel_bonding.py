@@ -0,0 +1,192 @@
+from functools import reduce
+from operator import and_, or_
+
+from migen import *
+from migen.genlib.cdc import MultiReg, BusSynchronizer
+from migen.genlib.fifo import AsyncFIFO
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.csr import *
+
+
+# Each lane carries 2 characters per word:
+# - idle:   K28.5 K28.5
+# - marker: K28.5 K28.3 (inserted on all lanes at the same time)
+# - data:   D     D
+# The comma stays on the first character, as expected by the clock aligners.
+K28_5 = (5 << 5) | 28
+K28_3 = (3 << 5) | 28
+
+
+def bonding_description(nlanes):
+    return [("data", 16*nlanes)]
+
+
+# Channel bonding for multi-lane links.
+#
+# TX: words of the sink are split across the lanes in the common tx domain
+# and alignment markers are inserted on all the lanes every marker_period
+# words. Each lane is then moved to its own laneN_tx domain with an async
+# FIFO.
+#
+# RX: each lane keeps the data and marker words (idles are dropped) and
+# moves them to the common rx domain with an async FIFO. Lanes are deskewed
+# by holding the ones presenting a marker until all the lanes present it,
+# then lanes are read in lockstep. The number of words each lane was held
+# (skew) is reported, and a marker not seen on all lanes at the same time
+# triggers a realignment.
+#
+# Domains: tx/rx (common), laneN_tx/laneN_rx (per lane). Common and lane
+# domains must run at the same frequency. fifo_depth must be larger than the
+# maximum lane to lane skew (in words). source must always be ready, the
+# link has no backpressure.
+class ChannelBonding(Module, AutoCSR):
+    def __init__(self, nlanes, marker_period=1024, fifo_depth=32):
+        self.sink = stream.Endpoint(bonding_description(nlanes))
+        self.source = stream.Endpoint(bonding_description(nlanes))
+
+        self.lanes_tx = [Record([("k", 2), ("d", 16)]) for i in range(nlanes)]
+        self.lanes_rx = [Record([("k", 2), ("d", 16)]) for i in range(nlanes)]
+        self.rx_ready = Signal()
+
+        self.aligned = CSRStatus()
+        self.realignments = CSRStatus(32)
+        for i in range(nlanes):
+            name = "lane{}_skew".format(i)
+            setattr(self, name, CSRStatus(bits_for(fifo_depth), name=name))
+
+        # # #
+
+        # tx
+        marker_counter = Signal(max=marker_period)
+        marker = Signal()
+        self.comb += marker.eq(marker_counter == 0)
+
+        tx_fifos = []
+        for i in range(nlanes):
+            fifo = ClockDomainsRenamer({"write": "tx", "read": "lane{}_tx".format(i)})(
+                AsyncFIFO(18, 8))
+            self.submodules += fifo
+            tx_fifos.append(fifo)
+        writable = reduce(and_, [fifo.writable for fifo in tx_fifos])
+
+        self.sync.tx += \
+            If(writable,
+                If(marker_counter == marker_period - 1,
+                    marker_counter.eq(0)
+                ).Else(
+                    marker_counter.eq(marker_counter + 1)
+                )
+            )
+        self.comb += self.sink.ready.eq(writable & ~marker)
+
+        for i, fifo in enumerate(tx_fifos):
+            word = Record([("k", 2), ("d", 16)])
+            self.comb += [
+                If(marker,
+                    word.k.eq(0b11),
+                    word.d.eq((K28_3 << 8) | K28_5)
+                ).Elif(self.sink.valid,
+                    word.k.eq(0b00),
+                    word.d.eq(self.sink.data[16*i:16*(i+1)])
+                ).Else(
+                    word.k.eq(0b11),
+                    word.d.eq((K28_5 << 8) | K28_5)
+                ),
+                fifo.we.eq(writable),
+                fifo.din.eq(word.raw_bits()),
+                fifo.re.eq(1),
+                If(fifo.readable,
+                    self.lanes_tx[i].raw_bits().eq(fifo.dout)
+                ).Else(
+                    self.lanes_tx[i].k.eq(0b11),
+                    self.lanes_tx[i].d.eq((K28_5 << 8) | K28_5)
+                )
+            ]
+
+        # rx
+        rx_fifos = []
+        heads_marker = []
+        heads_data = []
+        for i in range(nlanes):
+            lane_rx = "lane{}_rx".format(i)
+            fifo = ClockDomainsRenamer({"write": lane_rx, "read": "rx"})(
+                AsyncFIFO(17, fifo_depth))
+            self.submodules += fifo
+            rx_fifos.append(fifo)
+
+            lane = self.lanes_rx[i]
+            is_marker = Signal()
+            is_data = Signal()
+            self.comb += [
+                is_marker.eq((lane.k == 0b11) & (lane.d == ((K28_3 << 8) | K28_5))),
+                is_data.eq(lane.k == 0b00),
+                fifo.we.eq(is_marker | is_data),
+                fifo.din.eq(Cat(lane.d, is_marker))
+            ]
+            heads_marker.append(fifo.readable & fifo.dout[16])
+            heads_data.append(fifo.readable & ~fifo.dout[16])
+
+        all_readable = reduce(and_, [fifo.readable for fifo in rx_fifos])
+        all_marker = reduce(and_, heads_marker)
+        any_marker = reduce(or_, heads_marker)
+
+        rx_ready = Signal()
+        self.specials += MultiReg(self.rx_ready, rx_ready, "rx")
+
+        aligned = Signal()
+        realignments = Signal(32)
+        skews = [Signal(bits_for(fifo_depth)) for i in range(nlanes)]
+
+        fsm = ClockDomainsRenamer("rx")(ResetInserter()(FSM(reset_state="ALIGN")))
+        self.submodules += fsm
+        self.comb += fsm.reset.eq(~rx_ready)
+
+        # discard words until all the lanes present a marker
+        fsm.act("ALIGN",
+            If(all_marker,
+                [fifo.re.eq(1) for fifo in rx_fifos],
+                NextState("ALIGNED")
+            ).Else(
+                [fifo.re.eq(heads_data[i]) for i, fifo in enumerate(rx_fifos)]
+            )
+        )
+        # skew: number of words each lane was held on its marker
+        for i in range(nlanes):
+            self.sync.rx += \
+                If(fsm.ongoing("ALIGN") & ~all_marker,
+                    If(heads_marker[i],
+                        skews[i].eq(skews[i] + 1)
+                    ).Elif(~any_marker,
+                        skews[i].eq(0)
+                    )
+                )
+        fsm.act("ALIGNED",
+            aligned.eq(1),
+            If(all_readable,
+                If(all_marker,
+                    [fifo.re.eq(1) for fifo in rx_fifos]
+                ).Elif(any_marker,
+                    NextValue(realignments, realignments + 1),
+                    [NextValue(skew, 0) for skew in skews],
+                    NextState("ALIGN")
+                ).Else(
+                    self.source.valid.eq(1),
+                    [fifo.re.eq(self.source.ready) for fifo in rx_fifos]
+                )
+            )
+        )
+        self.comb += self.source.data.eq(Cat(*[fifo.dout[:16] for fifo in rx_fifos]))
+
+        # status
+        self.specials += MultiReg(aligned, self.aligned.status, "sys")
+        statuses = [(realignments, self.realignments)]
+        for i in range(nlanes):
+            statuses.append((skews[i], getattr(self, "lane{}_skew".format(i))))
+        for value, csr in statuses:
+            synchronizer = BusSynchronizer(len(value), "rx", "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
@@ -3,7 +3,10 @@ from functools import reduce
 from operator import add
 
 from migen import *
-from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.genlib.cdc import MultiReg, PulseSynchronizer, BusSynchronizer
+from migen.genlib.misc import WaitTimer
+
+from litex.soc.interconnect.csr import *
 
 
 # Changes the phase of the transceiver RX clock to align the comma to
@@ -20,27 +23,66 @@ from migen.genlib.cdc import MultiReg, PulseSynchronizer
 # Those design flaws make RXSLIDE_MODE=PMA yet another broken and useless
 # transceiver "feature".
 #
+# When comma_check_period is given, the aligner is adaptive: the presence of
+# the comma is checked over this (short) period after each reset, and the
+# check_period error-free window is only run once a comma has been seen.
+# Check periods only start once rx_init_done is set, so that the time the
+# transceiver takes to come out of reset is not counted in the windows.
+#
+# restart is meant for the fast restart of the rx init (fast_restart of
+# GTHInit and GTPRXInit), which does not reset the PLL. The PLL is only
+# reset by the TX init (pllreset of the RX inits is left unconnected), so on
+# GTH a fast restart only skips the PLL reset timer (gtXxreset is still held
+# 500ns) and on GTP it skips the receiver power-down cycle. An rx init not
+# coming up before its ready timer expires falls back to a full restart.
+# GTXInit has no fast restart: its startup timer is both the minimum reset
+# width and the wait before the PLL lock, there is nothing to skip.
+#
+# Lock statistics are available as CSRs: number of resets of the current
+# lock acquisition, time to lock (in tx cycles) and loss of lock events.
+#
 # Warning: Xilinx transceivers are LSB first, and comma needs to be flipped
 # compared to the usual 8b10b binary representation.
-class BruteforceClockAligner(Module):
-    def __init__(self, comma, tx_clk_freq, check_period=6e-3):
+class BruteforceClockAligner(Module, AutoCSR):
+    def __init__(self, comma, tx_clk_freq, check_period=6e-3,
+                 comma_check_period=None):
         self.rxdata = Signal(20)
         self.restart = Signal()
+        self.rx_init_done = Signal(reset=1)
 
         self.ready = Signal()
 
+        self.attempts = CSRStatus(32)
+        self.time_to_lock = CSRStatus(32)
+        self.loss_of_lock = CSRStatus(32)
+
+        # # #
+
         check_max_val = ceil(check_period*tx_clk_freq)
-        check_counter = Signal(max=check_max_val+1)
+        if comma_check_period is None:
+            comma_check_max_val = check_max_val
+        else:
+            comma_check_max_val = ceil(comma_check_period*tx_clk_freq)
+        check_counter = Signal(max=max(check_max_val, comma_check_max_val)+1)
         check = Signal()
         reset_check_counter = Signal()
+        # next period is the error-free one
+        check_noerror = Signal()
+        check_reload = Signal.like(check_counter)
+        self.comb += \
+            If(check_noerror,
+                check_reload.eq(check_max_val)
+            ).Else(
+                check_reload.eq(comma_check_max_val)
+            )
         self.sync.tx += [
             check.eq(0),
-            If(reset_check_counter,
-                check_counter.eq(check_max_val)
+            If(reset_check_counter | ~self.rx_init_done | check_noerror,
+                check_counter.eq(check_reload)
             ).Else(
                 If(check_counter == 0,
                     check.eq(1),
-                    check_counter.eq(check_max_val)
+                    check_counter.eq(check_reload)
                 ).Else(
                     check_counter.eq(check_counter-1)
                 )
@@ -84,6 +126,7 @@ class BruteforceClockAligner(Module):
                 # Errors are still OK at this stage, as the transceiver
                 # has just been reset and may output garbage data.
                 If(comma_seen,
+                    check_noerror.eq(1),
                     NextState("WAIT_NOERROR")
                 ).Else(
                     self.restart.eq(1)
@@ -111,3 +154,139 @@ class BruteforceClockAligner(Module):
                 NextState("WAIT_COMMA")
             )
         )
+
+        # lock statistics
+        attempts = Signal(32)
+        time_to_lock = Signal(32)
+        loss_of_lock = Signal(32)
+        self.sync.tx += \
+            If(self.ready,
+                If(self.restart,
+                    attempts.eq(1),
+                    time_to_lock.eq(0),
+                    loss_of_lock.eq(loss_of_lock + 1)
+                )
+            ).Else(
+                time_to_lock.eq(time_to_lock + 1),
+                If(self.restart,
+                    attempts.eq(attempts + 1)
+                )
+            )
+        for value, csr in [(attempts, self.attempts),
+                           (time_to_lock, self.time_to_lock),
+                           (loss_of_lock, self.loss_of_lock)]:
+            synchronizer = BusSynchronizer(len(value), "tx", "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
+
+
+# Aligns the comma to the LSBs of RXDATA with RXSLIDE in PCS mode.
+#
+# Each RXSLIDE pulse shifts the parallel RX data by one bit inside the PCS,
+# so instead of resetting the transceiver until the phase is right, the comma
+# is slid into place in at most 19 steps. The lock time is bounded to about
+# 20*(check_period + slide_wait) and the number of slides (slides, in the rx
+# domain) is the latency in UI added by the alignment, to be compensated by
+# the user.
+#
+# Alignment is redone by sliding when errors are seen once ready. The
+# transceiver is only restarted when no comma could be aligned after
+# a full turn.
+#
+# Requires RXSLIDE_MODE=PCS on the transceiver, rxslide is in the rx domain.
+class SlideClockAligner(Module):
+    def __init__(self, comma, tx_clk_freq, check_period=10e-6, slide_wait=32):
+        self.rxdata = Signal(20)
+        self.rxslide = Signal()
+        self.restart = Signal()
+
+        self.ready = Signal()
+        self.slides = Signal(max=20)
+
+        # # #
+
+        # separate comma and error-free timers, so that each check starts
+        # a full window
+        comma_timer = ClockDomainsRenamer("rx")(
+            WaitTimer(ceil(check_period*tx_clk_freq)))
+        noerror_timer = ClockDomainsRenamer("rx")(
+            WaitTimer(ceil(check_period*tx_clk_freq)))
+        slide_timer = ClockDomainsRenamer("rx")(WaitTimer(slide_wait))
+        self.submodules += comma_timer, noerror_timer, slide_timer
+
+        rxdata = Signal(20)
+        self.sync.rx += rxdata.eq(self.rxdata)
+
+        comma_n = ~comma & 0b1111111111
+        comma_aligned = Signal()
+        self.comb += comma_aligned.eq((rxdata[:10] == comma) | (rxdata[:10] == comma_n))
+
+        rx1cnt = Signal(max=11)
+        error = Signal()
+        self.sync.rx += rx1cnt.eq(reduce(add, [rxdata[i] for i in range(10)]))
+        self.comb += error.eq((rx1cnt != 4) & (rx1cnt != 5) & (rx1cnt != 6))
+
+        restart = PulseSynchronizer("rx", "tx")
+        self.submodules += restart
+        self.comb += self.restart.eq(restart.o)
+
+        ready = Signal()
+        self.specials += MultiReg(ready, self.ready, "tx")
+
+        attempts = Signal(max=21)
+
+        fsm = ClockDomainsRenamer("rx")(FSM(reset_state="WAIT_COMMA"))
+        self.submodules += fsm
+
+        fsm.act("WAIT_COMMA",
+            comma_timer.wait.eq(1),
+            If(comma_aligned,
+                NextState("WAIT_NOERROR")
+            ).Elif(comma_timer.done,
+                If(attempts == 20,
+                    # the transceiver reset also clears the PCS slides,
+                    # and the new phase gets a full comma window
+                    restart.i.eq(1),
+                    NextValue(attempts, 0),
+                    NextValue(self.slides, 0),
+                    NextState("WAIT_SLIDE")
+                ).Else(
+                    NextState("SLIDE")
+                )
+            )
+        )
+        fsm.act("SLIDE",
+            self.rxslide.eq(1),
+            NextValue(attempts, attempts + 1),
+            If(self.slides == 19,
+                NextValue(self.slides, 0)
+            ).Else(
+                NextValue(self.slides, self.slides + 1)
+            ),
+            NextState("WAIT_SLIDE")
+        )
+        # wait for the new alignment to propagate through the PCS
+        fsm.act("WAIT_SLIDE",
+            slide_timer.wait.eq(1),
+            If(slide_timer.done,
+                NextState("WAIT_COMMA")
+            )
+        )
+        fsm.act("WAIT_NOERROR",
+            noerror_timer.wait.eq(1),
+            If(error,
+                NextState("WAIT_COMMA")
+            ).Elif(noerror_timer.done,
+                NextValue(attempts, 0),
+                NextState("READY")
+            )
+        )
+        fsm.act("READY",
+            ready.eq(1),
+            If(error,
+                NextState("WAIT_COMMA")
+            )
+        )
@@ -0,0 +1,218 @@
+from migen import *
+
+
+# 64b/66b line coding (IEEE 802.3 clause 49 sync headers, scrambler and block
+# lock), as an alternative to 8b10b for links not needing the commas.
+#
+# A block is a 2-bit sync header followed by a 64-bit scrambled payload,
+# transmitted LSB first: header 0b10 (bits 0, 1) for data blocks and 0b01
+# (bits 1, 0) for control blocks. The payload of a control block is user
+# defined (e.g. idle or framing), the coding only carries the block type (k).
+#
+# Blocks are moved to/from the W-bit transceiver data with a fabric gearbox,
+# which makes the encoder pull blocks (ready) and the decoder push them
+# (valid) at an average of W/66 blocks per cycle.
+DATA_HEADER = 0b10
+CONTROL_HEADER = 0b01
+
+
+# Self-synchronous scrambler, x^58 + x^39 + 1
+class Scrambler(Module):
+    def __init__(self, n=64):
+        self.ce = Signal()
+        self.i = Signal(n)
+        self.o = Signal(n)
+
+        # # #
+
+        state = Signal(58, reset=2**58-1)
+        history = [state[j] for j in range(58)]
+        for j in range(n):
+            o = Signal()
+            self.comb += o.eq(self.i[j] ^ history[-39] ^ history[-58])
+            history.append(o)
+        self.comb += self.o.eq(Cat(*history[58:]))
+        self.sync += If(self.ce, state.eq(Cat(*history[-58:])))
+
+
+class Descrambler(Module):
+    def __init__(self, n=64):
+        self.ce = Signal()
+        self.i = Signal(n)
+        self.o = Signal(n)
+
+        # # #
+
+        state = Signal(58)
+        history = [state[j] for j in range(58)] + [self.i[j] for j in range(n)]
+        self.comb += self.o.eq(Cat(*[self.i[j] ^ history[58+j-39] ^ history[j]
+                                     for j in range(n)]))
+        self.sync += If(self.ce, state.eq(Cat(*history[-58:])))
+
+
+# Serializes 66-bit blocks to the W-bit transceiver data, a new block is
+# taken when ready is set.
+class TXGearbox(Module):
+    def __init__(self, dw):
+        self.i = Signal(66)
+        self.ready = Signal()
+        self.o = Signal(dw)
+
+        # # #
+
+        buf = Signal(66 + dw)
+        level = Signal(max=66 + dw + 1)
+        merged = Signal(66 + dw)
+        self.comb += [
+            self.ready.eq(level < dw),
+            If(self.ready,
+                merged.eq(buf | (self.i << level))
+            ).Else(
+                merged.eq(buf)
+            ),
+            self.o.eq(merged[:dw])
+        ]
+        self.sync += [
+            buf.eq(merged[dw:]),
+            If(self.ready,
+                level.eq(level + 66 - dw)
+            ).Else(
+                level.eq(level - dw)
+            )
+        ]
+
+
+# Deserializes the W-bit transceiver data to 66-bit blocks (valid).
+# A slip pulse drops one bit, moving the block boundary.
+class RXGearbox(Module):
+    def __init__(self, dw):
+        self.i = Signal(dw)
+        self.slip = Signal()
+        self.o = Signal(66)
+        self.valid = Signal()
+
+        # # #
+
+        buf = Signal(66 + dw)
+        level = Signal(max=66 + dw)
+        merged = Signal(66 + dw)
+        merged_level = Signal(max=66 + dw)
+        self.comb += [
+            If(self.slip,
+                merged.eq((buf | (self.i << level)) >> 1),
+                merged_level.eq(level + dw - 1)
+            ).Else(
+                merged.eq(buf | (self.i << level)),
+                merged_level.eq(level + dw)
+            ),
+            self.valid.eq(merged_level >= 66),
+            self.o.eq(merged[:66])
+        ]
+        self.sync += \
+            If(self.valid,
+                buf.eq(merged[66:]),
+                level.eq(merged_level - 66)
+            ).Else(
+                buf.eq(merged),
+                level.eq(merged_level)
+            )
+
+
+# d/k are taken when ready is set, output goes to the transceiver.
+class Encoder(Module):
+    def __init__(self, dw=20):
+        self.d = Signal(64)
+        self.k = Signal()
+        self.ready = Signal()
+        self.output = Signal(dw)
+
+        # # #
+
+        scrambler = Scrambler()
+        gearbox = TXGearbox(dw)
+        self.submodules += scrambler, gearbox
+        self.comb += [
+            self.ready.eq(gearbox.ready),
+            scrambler.ce.eq(gearbox.ready),
+            scrambler.i.eq(self.d),
+            gearbox.i.eq(Cat(Mux(self.k, CONTROL_HEADER, DATA_HEADER), scrambler.o)),
+            self.output.eq(gearbox.o)
+        ]
+
+
+# input comes from the transceiver, d/k are valid for one cycle when valid
+# is set.
+#
+# Block lock (from IEEE 802.3 figure 49-14): lock is acquired after 64
+# consecutive valid sync headers, slipping by one bit on each invalid one,
+# and lost when 16 invalid sync headers are seen in a window of 64.
+# header_errors counts the invalid sync headers while locked, for BER
+# monitoring.
+class Decoder(Module):
+    def __init__(self, dw=20):
+        self.input = Signal(dw)
+        self.d = Signal(64)
+        self.k = Signal()
+        self.valid = Signal()
+
+        self.block_lock = Signal()
+        self.header_errors = Signal(32)
+
+        # # #
+
+        gearbox = RXGearbox(dw)
+        descrambler = Descrambler()
+        self.submodules += gearbox, descrambler
+
+        header = Signal(2)
+        header_valid = Signal()
+        self.comb += [
+            gearbox.i.eq(self.input),
+            header.eq(gearbox.o[:2]),
+            header_valid.eq((header == DATA_HEADER) | (header == CONTROL_HEADER)),
+            descrambler.ce.eq(gearbox.valid),
+            descrambler.i.eq(gearbox.o[2:])
+        ]
+        self.sync += [
+            self.valid.eq(gearbox.valid & self.block_lock),
+            self.d.eq(descrambler.o),
+            self.k.eq(header == CONTROL_HEADER)
+        ]
+
+        # block lock
+        sh_cnt = Signal(max=64)
+        sh_invld_cnt = Signal(max=16)
+        slip = Signal()
+        self.sync += [
+            gearbox.slip.eq(slip),
+            If(gearbox.valid & ~header_valid & self.block_lock,
+                self.header_errors.eq(self.header_errors + 1)
+            )
+        ]
+        # an invalid header slips when hunting or when it is the 16th of the
+        # window (including the 64th header)
+        self.comb += \
+            If(gearbox.valid & ~header_valid & ~gearbox.slip,
+                If(~self.block_lock | (sh_invld_cnt == 15),
+                    slip.eq(1)
+                )
+            )
+        self.sync += \
+            If(gearbox.valid & ~gearbox.slip,
+                If(slip,
+                    self.block_lock.eq(0),
+                    sh_cnt.eq(0),
+                    sh_invld_cnt.eq(0)
+                ).Elif(sh_cnt == 63,
+                    If(header_valid & (sh_invld_cnt == 0),
+                        self.block_lock.eq(1)
+                    ),
+                    sh_cnt.eq(0),
+                    sh_invld_cnt.eq(0)
+                ).Else(
+                    sh_cnt.eq(sh_cnt + 1),
+                    If(~header_valid,
+                        sh_invld_cnt.eq(sh_invld_cnt + 1)
+                    )
+                )
+            )
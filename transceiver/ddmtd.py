@@ -0,0 +1,137 @@
+from migen import *
+from migen.genlib.cdc import MultiReg, BusSynchronizer
+
+from litex.soc.interconnect.csr import *
+
+
+# Digital dual-mixer time difference (DDMTD) phase measurement.
+#
+# Both clocks (e.g. the reference and the rx/tx clock of a PHY, same nominal
+# frequency f) are sampled as data by a helper clock at f*N/(N+1), with
+# N = 2**nbits, provided by the design in the "helper" clock domain (helper
+# PLL/MMCM or external oscillator). The sampled clocks are beat signals of
+# period N helper cycles, their time difference is the phase of the clocks
+# magnified N+1 times: one helper cycle is 1/(f*N) seconds of phase, e.g.
+# 0.49ps with f=125MHz and nbits=14.
+#
+# To verify the phase of a PHY after each reset, connect e.g. the tx clock
+# (txoutclk) as ref and the rx clock (rxoutclk) as clk, or each of them
+# against the transceiver reference clock.
+
+
+# Tags the rising edges of a sampled beat signal with the helper counter.
+# Sampling near a clock edge produces glitches, so only the first 1 after
+# at least deglitch consecutive 0s is tagged.
+class _EdgeTagger(Module):
+    def __init__(self, counter, deglitch):
+        self.i = Signal()
+        self.tag = Signal(len(counter))
+        self.stb = Signal()
+
+        # # #
+
+        sampled = Signal()
+        self.specials += MultiReg(self.i, sampled, "helper")
+
+        low = Signal(max=deglitch + 1)
+        self.sync.helper += [
+            self.stb.eq(0),
+            If(~sampled,
+                If(low != deglitch,
+                    low.eq(low + 1)
+                )
+            ).Else(
+                low.eq(0),
+                If(low == deglitch,
+                    self.stb.eq(1),
+                    self.tag.eq(counter)
+                )
+            )
+        ]
+
+
+# Measures the phase of clk relative to ref, in helper cycles (modulo N).
+#
+# A measurement is made on each beat period. The measurements are averaged
+# over windows of 2**avg_bits measurements, phase_avg keeps avg_bits
+# fractional bits. jitter is the peak-to-peak deviation of the phase over
+# the window. Averaging is done around the first measurement of the window,
+# so a phase close to 0/N does not wrap the average.
+class DDMTD(Module, AutoCSR):
+    def __init__(self, nbits=14, avg_bits=8, deglitch=None):
+        assert avg_bits >= 1
+        if deglitch is None:
+            deglitch = 2**nbits//4
+        self.ref = Signal()
+        self.clk = Signal()
+
+        self.phase = CSRStatus(nbits)
+        self.phase_avg = CSRStatus(nbits + avg_bits)
+        self.jitter = CSRStatus(nbits)
+        self.measurements = CSRStatus(32)
+
+        # # #
+
+        counter = Signal(nbits)
+        self.sync.helper += counter.eq(counter + 1)
+
+        ref_tagger = _EdgeTagger(counter, deglitch)
+        clk_tagger = _EdgeTagger(counter, deglitch)
+        self.submodules += ref_tagger, clk_tagger
+        self.comb += [
+            ref_tagger.i.eq(self.ref),
+            clk_tagger.i.eq(self.clk)
+        ]
+
+        phase = Signal(nbits)
+        new = Signal()
+        self.sync.helper += [
+            new.eq(clk_tagger.stb),
+            If(clk_tagger.stb,
+                phase.eq(clk_tagger.tag - ref_tagger.tag)
+            )
+        ]
+
+        # averaging / jitter
+        count = Signal(avg_bits)
+        first = Signal(nbits)
+        delta = Signal((nbits, True))
+        delta_sum = Signal((nbits + avg_bits, True))
+        delta_min = Signal((nbits, True))
+        delta_max = Signal((nbits, True))
+        self.comb += delta.eq(phase - Mux(count == 0, phase, first))
+
+        phase_avg = Signal(nbits + avg_bits)
+        jitter = Signal(nbits)
+        measurements = Signal(32)
+        self.sync.helper += \
+            If(new,
+                count.eq(count + 1),
+                If(count == 0,
+                    first.eq(phase),
+                    delta_sum.eq(0),
+                    delta_min.eq(0),
+                    delta_max.eq(0)
+                ).Else(
+                    delta_sum.eq(delta_sum + delta),
+                    If(delta < delta_min, delta_min.eq(delta)),
+                    If(delta > delta_max, delta_max.eq(delta))
+                ),
+                If(count == 2**avg_bits - 1,
+                    phase_avg.eq((first << avg_bits) + delta_sum + delta),
+                    jitter.eq(Mux(delta > delta_max, delta, delta_max) -
+                              Mux(delta < delta_min, delta, delta_min)),
+                    measurements.eq(measurements + 1)
+                )
+            )
+
+        for value, csr in [(phase, self.phase),
+                           (phase_avg, self.phase_avg),
+                           (jitter, self.jitter),
+                           (measurements, self.measurements)]:
+            synchronizer = BusSynchronizer(len(value), "helper", "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
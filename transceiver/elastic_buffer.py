@@ -0,0 +1,197 @@
+from math import floor
+
+from migen import *
+from migen.genlib.cdc import MultiReg, GrayCounter, GrayDecoder, BusSynchronizer
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.csr import *
+
+
+# Clock correction in the fabric for links between plesiochronous clocks
+# (independent oscillators), since the transceivers bypass their RX buffer
+# and do not use CLK_CORRECT_USE.
+#
+# Words are 2 characters (k: 2 bits, d: 16 bits). A skip word (K28.5 K28.0)
+# keeps the comma on the first character, as expected by the clock aligners.
+K28_5 = (5 << 5) | 28
+K28_0 = (0 << 5) | 28
+SKIP_K = 0b11
+SKIP_D = (K28_0 << 8) | K28_5
+
+
+def word_description():
+    return [("k", 2), ("d", 16)]
+
+
+# Sends a skip word at least every skip_period words, and when the sink has
+# no data. The default period allows +-ppm on each side of the link with
+# a 2x margin: clocks drift by one word every 1e6/(2*ppm) words.
+#
+# source is the word given to the encoders, in the tx domain.
+class SkipInserter(Module):
+    def __init__(self, ppm=200, skip_period=None):
+        if skip_period is None:
+            skip_period = floor(1e6/(4*ppm))
+        self.sink = stream.Endpoint(word_description())
+        self.source = Record(word_description())
+
+        # # #
+
+        counter = Signal(max=skip_period)
+        skip = Signal()
+        self.comb += skip.eq(counter == 0)
+        self.sync.tx += \
+            If(skip | ~self.sink.valid,
+                counter.eq(skip_period - 1)
+            ).Else(
+                counter.eq(counter - 1)
+            )
+
+        self.comb += [
+            self.sink.ready.eq(~skip),
+            If(skip | ~self.sink.valid,
+                self.source.k.eq(SKIP_K),
+                self.source.d.eq(SKIP_D)
+            ).Else(
+                self.source.k.eq(self.sink.k),
+                self.source.d.eq(self.sink.d)
+            )
+        ]
+
+
+# Moves received words from the rx domain to the tx domain, compensating
+# the frequency offset between the remote (rx) and local (tx) clocks with
+# the skip words sent by the remote SkipInserter:
+# - when the buffer fills above its center (+ margin), received skip words
+#   are deleted (rx faster than tx).
+# - when the buffer empties below its center (- margin), skip words are
+#   repeated (rx slower than tx).
+#
+# Reading starts once the buffer is half full and restarts the same way on
+# underflow. Fill level (tx domain), skip deletes/inserts, underflows and
+# overflows are reported as CSRs.
+class ElasticBuffer(Module, AutoCSR):
+    def __init__(self, depth=32):
+        self.sink = Record(word_description())
+        self.source = Record(word_description())
+
+        self.level = CSRStatus(bits_for(depth))
+        self.deletes = CSRStatus(32)
+        self.inserts = CSRStatus(32)
+        self.underflows = CSRStatus(32)
+        self.overflows = CSRStatus(32)
+
+        # # #
+
+        depth_bits = log2_int(depth, True)
+        center = depth//2
+        # hysteresis: each side sees the pointer of the other one about
+        # 4 cycles late (synchronization and gray decoding)
+        margin = 4
+
+        produce = ClockDomainsRenamer("rx")(GrayCounter(depth_bits+1))
+        consume = ClockDomainsRenamer("tx")(GrayCounter(depth_bits+1))
+        self.submodules += produce, consume
+
+        produce_txclk = Signal(depth_bits+1)
+        produce.q.attr.add("no_retiming")
+        self.specials += MultiReg(produce.q, produce_txclk, "tx")
+        consume_rxclk = Signal(depth_bits+1)
+        consume.q.attr.add("no_retiming")
+        self.specials += MultiReg(consume.q, consume_rxclk, "rx")
+
+        produce_decoder = ClockDomainsRenamer("tx")(GrayDecoder(depth_bits+1))
+        consume_decoder = ClockDomainsRenamer("rx")(GrayDecoder(depth_bits+1))
+        self.submodules += produce_decoder, consume_decoder
+        self.comb += [
+            produce_decoder.i.eq(produce_txclk),
+            consume_decoder.i.eq(consume_rxclk)
+        ]
+
+        storage = Memory(len(self.sink), depth)
+        self.specials += storage
+
+        # write (rx)
+        level_rxclk = Signal(depth_bits+1)
+        self.comb += level_rxclk.eq(produce.q_binary - consume_decoder.o)
+
+        sink_skip = Signal()
+        delete = Signal()
+        overflow = Signal()
+        self.comb += [
+            sink_skip.eq((self.sink.k == SKIP_K) & (self.sink.d == SKIP_D)),
+            delete.eq(sink_skip & (level_rxclk > center + margin)),
+            overflow.eq(~delete & (level_rxclk >= depth - 1)),
+            produce.ce.eq(~delete & ~overflow)
+        ]
+
+        wrport = storage.get_port(write_capable=True, clock_domain="rx")
+        self.specials += wrport
+        self.comb += [
+            wrport.adr.eq(produce.q_binary[:-1]),
+            wrport.dat_w.eq(self.sink.raw_bits()),
+            wrport.we.eq(produce.ce)
+        ]
+
+        # read (tx)
+        level = Signal(depth_bits+1)
+        self.comb += level.eq(produce_decoder.o - consume.q_binary)
+
+        rdport = storage.get_port(clock_domain="tx")
+        self.specials += rdport
+        self.comb += rdport.adr.eq(consume.q_next_binary[:-1])
+
+        head = Record(word_description())
+        head_skip = Signal()
+        self.comb += [
+            head.raw_bits().eq(rdport.dat_r),
+            head_skip.eq((head.k == SKIP_K) & (head.d == SKIP_D))
+        ]
+
+        started = Signal()
+        insert = Signal()
+        underflow = Signal()
+        self.comb += [
+            underflow.eq(started & (level == 0)),
+            insert.eq(started & ~underflow & head_skip & (level < center - margin)),
+            consume.ce.eq(started & ~underflow & ~insert)
+        ]
+        self.sync.tx += \
+            If(underflow,
+                started.eq(0)
+            ).Elif(level >= center,
+                started.eq(1)
+            )
+
+        self.comb += \
+            If(started & ~underflow,
+                self.source.raw_bits().eq(head.raw_bits())
+            ).Else(
+                self.source.k.eq(SKIP_K),
+                self.source.d.eq(SKIP_D)
+            )
+
+        # status
+        deletes = Signal(32)
+        overflows = Signal(32)
+        self.sync.rx += [
+            If(delete, deletes.eq(deletes + 1)),
+            If(overflow, overflows.eq(overflows + 1))
+        ]
+        inserts = Signal(32)
+        underflows = Signal(32)
+        self.sync.tx += [
+            If(insert, inserts.eq(inserts + 1)),
+            If(underflow, underflows.eq(underflows + 1))
+        ]
+        for value, csr, cd in [(level, self.level, "tx"),
+                               (deletes, self.deletes, "rx"),
+                               (overflows, self.overflows, "rx"),
+                               (inserts, self.inserts, "tx"),
+                               (underflows, self.underflows, "tx")]:
+            synchronizer = BusSynchronizer(len(value), cd, "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
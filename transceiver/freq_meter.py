@@ -0,0 +1,140 @@
+from migen import *
+from migen.genlib.cdc import MultiReg, GrayCounter, GrayDecoder, BusSynchronizer
+
+from litex.soc.interconnect.csr import *
+
+
+# Counts the cycles of a clock domain, seen from sys.
+#
+# A small gray counter runs in the measured domain and is sampled in sys,
+# the increments since the previous sample are accumulated. The counter
+# must not wrap between two sys cycles: 2**width must be larger than the
+# ratio between the measured and the sys clock frequencies.
+class _CycleCounter(Module):
+    def __init__(self, cd, width=8):
+        self.latch = Signal()
+        self.count = Signal(32)
+
+        # # #
+
+        gray_counter = ClockDomainsRenamer(cd)(GrayCounter(width))
+        gray_decoder = GrayDecoder(width)
+        self.submodules += gray_counter, gray_decoder
+
+        gray_counter.q.attr.add("no_retiming")
+        self.specials += MultiReg(gray_counter.q, gray_decoder.i)
+        self.comb += gray_counter.ce.eq(1)
+
+        value = Signal(width)
+        value_d = Signal(width)
+        increment = Signal(width)
+        self.sync += value_d.eq(value)
+        self.comb += [
+            value.eq(gray_decoder.o),
+            increment.eq(value - value_d)
+        ]
+        self.sync += \
+            If(self.latch,
+                self.count.eq(increment)
+            ).Else(
+                self.count.eq(self.count + increment)
+            )
+
+
+# Measures the frequency of clock domains against sys_clk.
+#
+# The cycles of each domain are counted over a gate of gate_time seconds
+# (an integer number of sys cycles, and of gates per second) and published
+# in Hz in a <domain>_freq CSR, updated at the end of each gate. The
+# resolution is 1/gate_time Hz and the error +-1 cycle per gate, plus the
+# error of sys_clk itself. updates counts the gates so that a script can
+# wait for a fresh value.
+class FrequencyMeter(Module, AutoCSR):
+    def __init__(self, sys_clk_freq, domains, gate_time=1e-3, width=8):
+        gate_cycles = round(sys_clk_freq*gate_time)
+        gates_per_second = round(1/gate_time)
+        assert abs(gate_cycles - sys_clk_freq*gate_time) < 1e-6
+        assert abs(gates_per_second - 1/gate_time) < 1e-6
+
+        self.updates = CSRStatus(32)
+
+        # # #
+
+        gate = Signal(max=gate_cycles)
+        latch = Signal()
+        self.comb += latch.eq(gate == 0)
+        self.sync += \
+            If(latch,
+                gate.eq(gate_cycles - 1),
+                self.updates.status.eq(self.updates.status + 1)
+            ).Else(
+                gate.eq(gate - 1)
+            )
+
+        for cd in domains:
+            counter = _CycleCounter(cd, width)
+            self.submodules += counter
+            name = cd + "_freq"
+            csr = CSRStatus(32, name=name)
+            setattr(self, name, csr)
+            self.comb += counter.latch.eq(latch)
+            self.sync += \
+                If(latch,
+                    csr.status.eq(counter.count*gates_per_second)
+                )
+
+
+# Measures the frequency offset of the recovered rx clock against the local
+# tx clock, i.e. between the oscillators of the two ends of a link.
+#
+# rx cycles are counted over a gate of gate_cycles tx cycles, offset is the
+# difference in ppb (two's complement), with a resolution of 1e9/gate_cycles
+# ppb: 100ppb with the default gate (80ms at 125MHz). drift is the change of
+# the offset between the last two gates, in ppb per gate. measurements
+# counts the gates.
+#
+# The first measurements after a restart of the rx domain are meaningless.
+class FrequencyOffsetMeter(Module, AutoCSR):
+    def __init__(self, gate_cycles=10**7, width=8):
+        ppb_per_cycle = 10**9//gate_cycles
+        assert ppb_per_cycle*gate_cycles == 10**9
+
+        self.offset = CSRStatus(32)
+        self.drift = CSRStatus(32)
+        self.measurements = CSRStatus(32)
+
+        # # #
+
+        counter = ClockDomainsRenamer({"sys": "tx"})(_CycleCounter("rx", width))
+        self.submodules += counter
+
+        gate = Signal(max=gate_cycles)
+        self.comb += counter.latch.eq(gate == 0)
+        self.sync.tx += \
+            If(counter.latch,
+                gate.eq(gate_cycles - 1)
+            ).Else(
+                gate.eq(gate - 1)
+            )
+
+        offset = Signal((32, True))
+        drift = Signal((32, True))
+        measurements = Signal(32)
+        new_offset = Signal((32, True))
+        self.comb += new_offset.eq((counter.count - gate_cycles)*ppb_per_cycle)
+        self.sync.tx += \
+            If(counter.latch,
+                offset.eq(new_offset),
+                drift.eq(new_offset - offset),
+                measurements.eq(measurements + 1)
+            )
+
+        for value, csr in [(offset, self.offset),
+                           (drift, self.drift),
+                           (measurements, self.measurements)]:
+            synchronizer = BusSynchronizer(len(value), "tx", "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
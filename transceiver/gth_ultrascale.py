@@ -1,13 +1,17 @@
 from migen import *
 from migen.genlib.resetsync import AsyncResetSynchronizer
+from migen.genlib.cdc import BusSynchronizer
 
 from litex.soc.interconnect.csr import *
 from litex.soc.cores.code_8b10b import Encoder, Decoder
 
-from transceiver.gth_ultrascale_init import GTHInit
-from transceiver.clock_aligner import BruteforceClockAligner
+from transceiver.gth_ultrascale_init import GTHInit, GTHMultiLaneTXAlign
+from transceiver.init_monitor import InitMonitorCSR
+from transceiver.clock_aligner import BruteforceClockAligner, SlideClockAligner
+from transceiver.multilane import MultiLane
 
 from transceiver.prbs import *
+from transceiver import code_64b66b
 
 
 class GTHChannelPLL(Module):
@@ -201,7 +205,10 @@ CLKIN +----> /M  +-->       Charge Pump         | +------------+->/2+--> CLKOUT
 class GTH(Module, AutoCSR):
     def __init__(self, pll, tx_pads, rx_pads, sys_clk_freq,
                  clock_aligner=True, internal_loopback=False,
-                 tx_polarity=0, rx_polarity=0):
+                 tx_polarity=0, rx_polarity=0,
+                 init_monitor=False, clock_aligner_mode="bruteforce",
+                 clock_aligner_comma_check_period=None, tx_multilane=None,
+                 line_coding="8b10b"):
         self.tx_produce_square_wave = CSRStorage()
         self.tx_prbs_config = CSRStorage(2)
 
@@ -217,11 +224,22 @@ class GTH(Module, AutoCSR):
         use_qpll0 = isinstance(pll, GTHQuadPLL) and pll.config["qpll"] == "qpll0"
         use_qpll1 = isinstance(pll, GTHQuadPLL) and pll.config["qpll"] == "qpll1"
 
-        self.submodules.encoder = ClockDomainsRenamer("tx")(
-            Encoder(2, True))
-        self.decoders = [ClockDomainsRenamer("rx")(
-            Decoder(True)) for _ in range(2)]
-        self.submodules += self.decoders
+        if line_coding not in ["8b10b", "64b66b"]:
+            raise ValueError("Invalid line coding " + line_coding)
+        if line_coding == "8b10b":
+            self.submodules.encoder = ClockDomainsRenamer("tx")(
+                Encoder(2, True))
+            self.decoders = [ClockDomainsRenamer("rx")(
+                Decoder(True)) for _ in range(2)]
+            self.submodules += self.decoders
+        else:
+            # 64b/66b: no commas, block lock replaces the clock aligner
+            self.submodules.encoder = ClockDomainsRenamer("tx")(
+                code_64b66b.Encoder(20))
+            self.submodules.decoder = ClockDomainsRenamer("rx")(
+                code_64b66b.Decoder(20))
+            self.rx_block_lock = CSRStatus()
+            self.rx_header_errors = CSRStatus(32)
 
         self.tx_ready = Signal()
         self.rx_ready = Signal()
@@ -254,15 +272,28 @@ class GTH(Module, AutoCSR):
         # # #
 
         # TX generates RTIO clock, init must be in system domain
-        tx_init = GTHInit(sys_clk_freq, False)
-        self.comb += [
-            tx_init.restart.eq(self.restart.re),
-            self.tx_ready.eq(tx_init.done)
-        ]
+        if tx_multilane not in [None, "master", "slave"]:
+            raise ValueError("Invalid TX multilane mode " + tx_multilane)
+        tx_init = GTHInit(sys_clk_freq, False, tx_multilane is not None)
+        self.comb += self.tx_ready.eq(tx_init.done)
+        if tx_multilane is None:
+            self.comb += tx_init.restart.eq(self.restart.re)
+        else:
+            # restarts and alignment driven by GTHMultiLaneTXAlign, the tx
+            # clock of a slave is driven by the master.
+            self.tx_init = tx_init
+            self.txsyncin = Signal()
+            self.txsyncout = Signal()
+            self.txsyncallin = Signal()
+            self.txsyncdone = Signal()
+            self.txphaligndone = tx_init.Xxphaligndone
         # RX receives restart commands from RTIO domain
         rx_init = ClockDomainsRenamer("tx")(
             GTHInit(self.tx_clk_freq, True))
         self.submodules += tx_init, rx_init
+        if init_monitor:
+            self.submodules.tx_init_monitor = InitMonitorCSR(tx_init.monitor, "sys")
+            self.submodules.rx_init_monitor = InitMonitorCSR(rx_init.monitor, "tx")
         self.comb += [
             tx_init.plllock.eq(pll.lock),
             rx_init.plllock.eq(pll.lock),
@@ -271,8 +302,23 @@ class GTH(Module, AutoCSR):
                                      self.rx_ready))
         ]
 
+        if clock_aligner_mode not in ["bruteforce", "rxslide"]:
+            raise ValueError("Invalid clock aligner mode " + clock_aligner_mode)
+        use_rxslide = clock_aligner and clock_aligner_mode == "rxslide"
+
+        tx_multilane_ports = dict()
+        if tx_multilane is not None:
+            tx_multilane_ports = dict(
+                p_TXSYNC_MULTILANE=1,
+                i_TXSYNCALLIN=self.txsyncallin,
+                i_TXSYNCIN=self.txsyncin,
+                o_TXSYNCOUT=self.txsyncout,
+                o_TXSYNCDONE=self.txsyncdone
+            )
+
         txdata = Signal(20)
         rxdata = Signal(20)
+        rxslide = Signal()
         rxphaligndone = Signal()
         self.specials += \
             Instance("GTHE3_CHANNEL",
@@ -331,7 +377,7 @@ class GTH(Module, AutoCSR):
                 o_TXDLYSRESETDONE=tx_init.Xxdlysresetdone,
                 o_TXPHALIGNDONE=tx_init.Xxphaligndone,
                 i_TXUSERRDY=tx_init.Xxuserrdy,
-                i_TXSYNCMODE=1,
+                i_TXSYNCMODE=0 if tx_multilane == "slave" else 1,
 
                 # TX data
                 p_TX_DATA_WIDTH=20,
@@ -395,6 +441,10 @@ class GTH(Module, AutoCSR):
                 o_RXCTRL1=Cat(rxdata[9], rxdata[19]),
                 o_RXDATA=Cat(rxdata[:8], rxdata[10:18]),
 
+                # RX slide (PCS mode: deterministic 1 UI steps)
+                p_RXSLIDE_MODE="PCS" if use_rxslide else "OFF",
+                i_RXSLIDE=rxslide,
+
                 # RX electrical
                 i_RXPD=0b00,
                 p_RX_CLKMUX_EN=1,
@@ -408,7 +458,10 @@ class GTH(Module, AutoCSR):
                 i_GTHRXP=rx_pads.p,
                 i_GTHRXN=rx_pads.n,
                 o_GTHTXP=tx_pads.p,
-                o_GTHTXN=tx_pads.n
+                o_GTHTXN=tx_pads.n,
+
+                # TX multi-lane alignment
+                **tx_multilane_ports
             )
 
         # tx clocking
@@ -418,11 +471,10 @@ class GTH(Module, AutoCSR):
         self.clock_domains.cd_tx = ClockDomain()
         tx_bufg_div = pll.config["clkin"]/self.tx_clk_freq
         assert tx_bufg_div == int(tx_bufg_div)
-        self.specials += [
-            Instance("BUFG_GT", i_I=self.txoutclk, o_O=self.cd_tx.clk,
-                i_DIV=int(tx_bufg_div)-1),
-            AsyncResetSynchronizer(self.cd_tx, tx_reset_deglitched)
-        ]
+        if tx_multilane != "slave":
+            self.specials += Instance("BUFG_GT", i_I=self.txoutclk, o_O=self.cd_tx.clk,
+                i_DIV=int(tx_bufg_div)-1)
+        self.specials += AsyncResetSynchronizer(self.cd_tx, tx_reset_deglitched)
 
         # rx clocking
         rx_reset_deglitched = Signal()
@@ -437,8 +489,11 @@ class GTH(Module, AutoCSR):
         # tx data and prbs
         self.submodules.tx_prbs = ClockDomainsRenamer("tx")(PRBSTX(20, True))
         self.comb += self.tx_prbs.config.eq(tx_prbs_config)
+        if line_coding == "8b10b":
+            self.comb += self.tx_prbs.i.eq(Cat(*[self.encoder.output[i] for i in range(2)]))
+        else:
+            self.comb += self.tx_prbs.i.eq(self.encoder.output)
         self.comb += [
-            self.tx_prbs.i.eq(Cat(*[self.encoder.output[i] for i in range(2)])),
             If(tx_produce_square_wave,
                 # square wave @ linerate/20 for scope observation
                 txdata.eq(0b11111111110000000000)
@@ -453,61 +508,86 @@ class GTH(Module, AutoCSR):
             self.rx_prbs.config.eq(rx_prbs_config),
             rx_prbs_errors.eq(self.rx_prbs.errors)
         ]
-        self.comb += [
-            self.decoders[0].input.eq(rxdata[:10]),
-            self.decoders[1].input.eq(rxdata[10:]),
-            self.rx_prbs.i.eq(rxdata)
-        ]
+        self.comb += self.rx_prbs.i.eq(rxdata)
+        if line_coding == "8b10b":
+            self.comb += [
+                self.decoders[0].input.eq(rxdata[:10]),
+                self.decoders[1].input.eq(rxdata[10:])
+            ]
+        else:
+            self.comb += self.decoder.input.eq(rxdata)
 
         # clock alignment
-        if clock_aligner:
-            clock_aligner = BruteforceClockAligner(0b0101111100, self.tx_clk_freq)
-            self.submodules += clock_aligner
+        if line_coding == "64b66b":
+            block_lock = Signal()
+            self.specials += [
+                MultiReg(self.decoder.block_lock, block_lock, "tx"),
+                MultiReg(self.decoder.block_lock, self.rx_block_lock.status, "sys")
+            ]
+            header_errors = BusSynchronizer(32, "rx", "sys")
+            self.submodules += header_errors
+            self.comb += [
+                header_errors.i.eq(self.decoder.header_errors),
+                self.rx_header_errors.status.eq(header_errors.o),
+                self.rx_ready.eq(rx_init.done & block_lock)
+            ]
+        elif clock_aligner:
+            if use_rxslide:
+                clock_aligner = SlideClockAligner(0b0101111100, self.tx_clk_freq)
+                self.comb += rxslide.eq(clock_aligner.rxslide)
+                # latency (in UI) added by the alignment
+                self.rx_slides = CSRStatus(5)
+                self.specials += MultiReg(clock_aligner.slides, self.rx_slides.status, "sys")
+            else:
+                clock_aligner = BruteforceClockAligner(0b0101111100, self.tx_clk_freq,
+                    comma_check_period=clock_aligner_comma_check_period)
+                self.comb += clock_aligner.rx_init_done.eq(rx_init.done)
+            self.submodules.clock_aligner = clock_aligner
             self.comb += [
                 clock_aligner.rxdata.eq(rxdata),
-                rx_init.restart.eq(clock_aligner.restart),
+                rx_init.fast_restart.eq(clock_aligner.restart),
                 self.rx_ready.eq(clock_aligner.ready)
             ]
         else:
             self.comb += self.rx_ready.eq(rx_init.done)
 
 
-class MultiGTH(Module, AutoCSR):
-    def __init__(self, plls, tx_pads, rx_pads, sys_clk_freq, **kwargs):
-        self.nlanes = nlanes = len(tx_pads.p)
-
-        class EncoderExposer:
-            def __init__(self):
-                self.k = Signal()
-                self.d = Signal(8)
-
-        self.gths = [None for i in range(nlanes)]
-        self.encoders = [EncoderExposer() for i in range(2*nlanes)]
-        self.decoders = [None for i in range(2*nlanes)]
-        self.rx_ready = Signal()
+# Lanes can share a PLL (see PLLAllocator), a shared PLL is reset through
+# SharedPLLReset.
+#
+# With tx_phase_align, the TX phase of all the lanes is aligned to the master
+# lane (gth0) by GTHMultiLaneTXAlign: all the tx domains run from the gth0 tx
+# clock and the lanes start with minimal skew. TX restarts apply to all the
+# lanes.
+#
+# See MultiLane for the lanes, their domains and the bonding option.
+class MultiGTH(MultiLane):
+    def __init__(self, plls, tx_pads, rx_pads, sys_clk_freq,
+                 tx_phase_align=False, **kwargs):
+        def lane_kwargs(i):
+            if tx_phase_align:
+                return {"tx_multilane": "master" if i == 0 else "slave"}
+            return dict()
+        MultiLane.__init__(self, "gth", GTH, plls, tx_pads, rx_pads,
+                           sys_clk_freq, lane_kwargs, **kwargs)
+        self.gths = self.lanes
 
         # # #
 
-        def get_pads(pads, i):
-            class GTHPads:
-                def __init__(self, p, n):
-                    self.p = p
-                    self.n = n
-            return GTHPads(pads.p[i], pads.n[i])
-
-        rx_ready = Signal(reset=1)
-        for i in range(nlanes):
-            gth = GTH(plls[i], get_pads(tx_pads, i), get_pads(rx_pads, i), sys_clk_freq, **kwargs)
-            self.gths[i] = gth
-            setattr(self.submodules, "gth"+str(i), gth)
-            for j in range(2):
+        if tx_phase_align:
+            master = self.gths[0]
+            self.submodules.tx_align = GTHMultiLaneTXAlign(
+                [gth.tx_init for gth in self.gths])
+            self.comb += [
+                self.tx_align.txsyncout.eq(master.txsyncout),
+                self.tx_align.txsyncdone.eq(master.txsyncdone)
+            ]
+            for i, gth in enumerate(self.gths):
                 self.comb += [
-                    gth.encoder.k[j].eq(self.encoders[2*i + j].k),
-                    gth.encoder.d[j].eq(self.encoders[2*i + j].d)
+                    self.tx_align.restarts[i].eq(gth.restart.re),
+                    self.tx_align.txphaligndones[i].eq(gth.txphaligndone),
+                    gth.txsyncin.eq(self.tx_align.txsyncin),
+                    gth.txsyncallin.eq(self.tx_align.txsyncallin)
                 ]
-                self.decoders[2*i + j] = gth.decoders[j]
-            new_rx_ready = Signal()
-            self.comb += new_rx_ready.eq(rx_ready & gth.rx_ready)
-            rx_ready = new_rx_ready
-
-        self.comb += self.rx_ready.eq(rx_ready)
+                if i:
+                    self.comb += gth.cd_tx.clk.eq(master.cd_tx.clk)
@@ -1,14 +1,34 @@
 from math import ceil
+from functools import reduce
+from operator import and_, or_
 
 from migen import *
 from migen.genlib.cdc import MultiReg
 from migen.genlib.misc import WaitTimer
 
+from transceiver.init_monitor import InitMonitor
 
+
+# With multilane (TX only), the lanes start the alignment at the same time
+# (align_start once all the lanes have set align_ready) and the alignment
+# ends with the TXSYNCDONE of the master lane given on Xxsyncdone, see
+# GTHMultiLaneTXAlign.
 class GTHInit(Module):
-    def __init__(self, sys_clk_freq, rx):
+    # timings (also used by sim/clock_aligner_model.py)
+    pll_reset_ns = 2000
+    gtreset_ns = 500
+    ready_ms = 1
+    cdr_stable_cycles = 1024
+
+    def __init__(self, sys_clk_freq, rx, multilane=False):
+        assert not (rx and multilane)
         self.done = Signal()
         self.restart = Signal()
+        # restart skipping the PLL reset (2us) and its timer, see
+        # transceiver/clock_aligner.py
+        self.fast_restart = Signal()
+        self.align_ready = Signal()
+        self.align_start = Signal(reset=1)
 
         # GTH signals
         self.plllock = Signal()
@@ -48,22 +68,35 @@ class GTHInit(Module):
         ]
 
         # PLL reset must be at least 2us
-        pll_reset_cycles = ceil(2000*sys_clk_freq/1000000000)
+        pll_reset_cycles = ceil(self.pll_reset_ns*sys_clk_freq/1000000000)
         pll_reset_timer = WaitTimer(pll_reset_cycles)
         self.submodules += pll_reset_timer
+        # gtXxreset is held by the PLL reset timer on a full restart, and by
+        # this one on a fast restart (no minimum width otherwise)
+        gtreset_cycles = ceil(self.gtreset_ns*sys_clk_freq/1000000000)
+        gtreset_timer = WaitTimer(gtreset_cycles)
+        self.submodules += gtreset_timer
 
         startup_fsm = ResetInserter()(FSM(reset_state="RESET_ALL"))
         self.submodules += startup_fsm
 
-        ready_timer = WaitTimer(int(sys_clk_freq/1000))
+        ready_timer = WaitTimer(int(self.ready_ms*sys_clk_freq/1000))
         self.submodules += ready_timer
         self.comb += [
             ready_timer.wait.eq(~self.done & ~startup_fsm.reset),
-            startup_fsm.reset.eq(self.restart | ready_timer.done)
+            startup_fsm.reset.eq(self.restart | self.fast_restart | ready_timer.done)
         ]
 
+        fast = Signal()
+        self.sync += \
+            If(self.restart | ready_timer.done,
+                fast.eq(0)
+            ).Elif(self.fast_restart,
+                fast.eq(1)
+            )
+
         if rx:
-            cdr_stable_timer = WaitTimer(1024)
+            cdr_stable_timer = WaitTimer(self.cdr_stable_cycles)
             self.submodules += cdr_stable_timer
 
         Xxphaligndone_r = Signal(reset=1)
@@ -73,10 +106,17 @@ class GTHInit(Module):
 
         startup_fsm.act("RESET_ALL",
             gtXxreset.eq(1),
-            self.pllreset.eq(1),
-            pll_reset_timer.wait.eq(1),
-            If(pll_reset_timer.done,
-                NextState("RELEASE_PLL_RESET")
+            If(fast,
+                gtreset_timer.wait.eq(1),
+                If(gtreset_timer.done,
+                    NextState("RELEASE_PLL_RESET")
+                )
+            ).Else(
+                self.pllreset.eq(1),
+                pll_reset_timer.wait.eq(1),
+                If(pll_reset_timer.done,
+                    NextState("RELEASE_PLL_RESET")
+                )
             )
         )
         startup_fsm.act("RELEASE_PLL_RESET",
@@ -95,7 +135,14 @@ class GTHInit(Module):
         else:
             startup_fsm.act("RELEASE_GTH_RESET",
                 Xxuserrdy.eq(1),
-                If(Xxresetdone, NextState("ALIGN"))
+                If(Xxresetdone,
+                    NextState("WAIT_ALIGN_START" if multilane else "ALIGN"))
+            )
+        if multilane:
+            startup_fsm.act("WAIT_ALIGN_START",
+                Xxuserrdy.eq(1),
+                self.align_ready.eq(1),
+                If(self.align_start, NextState("ALIGN"))
             )
         # Start delay alignment (pulse)
         startup_fsm.act("ALIGN",
@@ -103,7 +150,7 @@ class GTHInit(Module):
             Xxdlysreset.eq(1),
             NextState("WAIT_ALIGN")
         )
-        if rx:
+        if rx or multilane:
             # Wait for delay alignment
             startup_fsm.act("WAIT_ALIGN",
                 Xxuserrdy.eq(1),
@@ -135,3 +182,51 @@ class GTHInit(Module):
             self.done.eq(1),
             If(self.restart, NextState("RESET_ALL"))
         )
+
+        # bring-up statistics
+        self.submodules.monitor = InitMonitor(startup_fsm,
+            self.done, self.restart | self.fast_restart, ready_timer.done)
+
+
+# Multi-lane TX buffer bypass alignment
+# (from UG576 in TX Buffer Bypass in Multi-Lane Auto Mode).
+#
+# All the lanes run from the TXUSRCLK of the master lane (TXSYNCMODE=1, the
+# others being slaves with TXSYNCMODE=0). The alignment is started on all the
+# lanes at the same time, TXSYNCIN of all the lanes gets the TXSYNCOUT of the
+# master, TXSYNCALLIN the AND of all the TXPHALIGNDONE, and the TXSYNCDONE of
+# the master ends the alignment of all the lanes.
+#
+# The lanes are always restarted together: a restart request on any lane
+# restarts all of them, and so does a lane waiting to align while others are
+# done (e.g. after the ready timer of a single lane expired).
+class GTHMultiLaneTXAlign(Module):
+    def __init__(self, tx_inits):
+        nlanes = len(tx_inits)
+        self.restarts = Signal(nlanes)
+
+        # GTH signals
+        self.txsyncout = Signal()
+        self.txsyncin = Signal()
+        self.txphaligndones = Signal(nlanes)
+        self.txsyncallin = Signal()
+        self.txsyncdone = Signal()
+
+        # # #
+
+        self.comb += [
+            self.txsyncin.eq(self.txsyncout),
+            self.txsyncallin.eq(self.txphaligndones == 2**nlanes-1)
+        ]
+
+        align_start = reduce(and_, [tx_init.align_ready for tx_init in tx_inits])
+        desync = (reduce(or_, [tx_init.align_ready for tx_init in tx_inits]) &
+                  reduce(or_, [tx_init.done for tx_init in tx_inits]))
+        restart = Signal()
+        self.comb += restart.eq((self.restarts != 0) | desync)
+        for tx_init in tx_inits:
+            self.comb += [
+                tx_init.restart.eq(restart),
+                tx_init.align_start.eq(align_start),
+                tx_init.Xxsyncdone.eq(self.txsyncdone)
+            ]
@@ -4,14 +4,25 @@ from migen import *
 from migen.genlib.cdc import MultiReg, PulseSynchronizer
 from migen.genlib.misc import WaitTimer
 
+from transceiver.init_monitor import InitMonitor
+
 
 __all__ = ["GTPTXInit", "GTPRXInit"]
 
 
+# With multilane, the delay and phase alignment is sequenced on all the
+# lanes by MultiLaneTXAlign: the lanes wait for align_start once reset
+# (align_ready) and are ready on align_done.
 class GTPTXInit(Module):
-    def __init__(self, sys_clk_freq):
+    def __init__(self, sys_clk_freq, multilane=False):
         self.done = Signal()
         self.restart = Signal()
+        # restart skipping the PLL reset (500ns) and its timer, see
+        # transceiver/clock_aligner.py
+        self.fast_restart = Signal()
+        self.align_ready = Signal()
+        self.align_start = Signal(reset=1)
+        self.align_done = Signal()
 
         # GTP signals
         self.plllock = Signal()
@@ -71,19 +82,31 @@ class GTPTXInit(Module):
         self.submodules += ready_timer
         self.comb += [
             ready_timer.wait.eq(~self.done & ~startup_fsm.reset),
-            startup_fsm.reset.eq(self.restart | ready_timer.done)
+            startup_fsm.reset.eq(self.restart | self.fast_restart | ready_timer.done)
         ]
 
+        fast = Signal()
+        self.sync += \
+            If(self.restart | ready_timer.done,
+                fast.eq(0)
+            ).Elif(self.fast_restart,
+                fast.eq(1)
+            )
+
         txphaligndone_r = Signal(reset=1)
         txphaligndone_rising = Signal()
         self.sync += txphaligndone_r.eq(txphaligndone)
         self.comb += txphaligndone_rising.eq(txphaligndone & ~txphaligndone_r)
 
         startup_fsm.act("PLL_RESET",
-            self.pllreset.eq(1),
-            pll_reset_timer.wait.eq(1),
-            If(pll_reset_timer.done,
+            If(fast,
                 NextState("GTP_RESET")
+            ).Else(
+                self.pllreset.eq(1),
+                pll_reset_timer.wait.eq(1),
+                If(pll_reset_timer.done,
+                    NextState("GTP_RESET")
+                )
             )
         )
         startup_fsm.act("GTP_RESET",
@@ -97,8 +120,19 @@ class GTPTXInit(Module):
         # of gttxreset)
         startup_fsm.act("WAIT_GTP_RESET_DONE",
             txuserrdy.eq(1),
-            If(txresetdone, NextState("ALIGN"))
+            If(txresetdone,
+                NextState("WAIT_ALIGN_START" if multilane else "ALIGN"))
         )
+        if multilane:
+            startup_fsm.act("WAIT_ALIGN_START",
+                txuserrdy.eq(1),
+                self.align_ready.eq(1),
+                If(self.align_start, NextState("WAIT_MULTILANE_ALIGN"))
+            )
+            startup_fsm.act("WAIT_MULTILANE_ALIGN",
+                txuserrdy.eq(1),
+                If(self.align_done, NextState("READY"))
+            )
         # Start delay alignment
         startup_fsm.act("ALIGN",
             txuserrdy.eq(1),
@@ -137,11 +171,18 @@ class GTPTXInit(Module):
             If(self.restart, NextState("PLL_RESET"))
         )
 
+        # bring-up statistics
+        self.submodules.monitor = InitMonitor(startup_fsm,
+            self.done, self.restart | self.fast_restart, ready_timer.done)
+
 
 class GTPRXInit(Module):
     def __init__(self, sys_clk_freq):
         self.done = Signal()
         self.restart = Signal()
+        # restart skipping the receiver power-down cycle, see
+        # transceiver/clock_aligner.py
+        self.fast_restart = Signal()
 
         # GTP signals
         self.plllock = Signal()
@@ -222,15 +263,23 @@ class GTPRXInit(Module):
         self.submodules += ready_timer
         self.comb += [
             ready_timer.wait.eq(~self.done & ~startup_fsm.reset),
-            startup_fsm.reset.eq(self.restart | ready_timer.done)
+            startup_fsm.reset.eq(self.restart | self.fast_restart | ready_timer.done)
         ]
 
+        fast = Signal()
+        self.sync += \
+            If(self.restart | ready_timer.done,
+                fast.eq(0)
+            ).Elif(self.fast_restart,
+                fast.eq(1)
+            )
+
         cdr_stable_timer = WaitTimer(1024)
         self.submodules += cdr_stable_timer
 
         startup_fsm.act("GTP_PD",
             gtrxreset.eq(1),
-            gtrxpd.eq(1),
+            gtrxpd.eq(~fast),
             NextState("GTP_RESET")
         )
         startup_fsm.act("GTP_RESET",
@@ -311,3 +360,7 @@ class GTPRXInit(Module):
             If(self.restart, NextState("GTP_PD")
             )
         )
+
+        # bring-up statistics
+        self.submodules.monitor = InitMonitor(startup_fsm,
+            self.done, self.restart | self.fast_restart, ready_timer.done)
@@ -1,13 +1,18 @@
 from migen import *
 from migen.genlib.resetsync import AsyncResetSynchronizer
+from migen.genlib.cdc import BusSynchronizer
 
 from litex.soc.interconnect.csr import *
 from litex.soc.cores.code_8b10b import Encoder, Decoder
 
 from transceiver.gtx_7series_init import GTXInit
+from transceiver.tx_align_7series import tx_align_layout, MultiLaneTXAlign
+from transceiver.init_monitor import InitMonitorCSR
 from transceiver.clock_aligner import BruteforceClockAligner
+from transceiver.multilane import MultiLane
 
 from transceiver.prbs import *
+from transceiver import code_64b66b
 
 
 class GTXChannelPLL(Module):
@@ -75,7 +80,9 @@ CLKIN +----> /M  +-->       Charge Pump         +-> VCO +---> CLKOUT
 class GTX(Module, AutoCSR):
     def __init__(self, cpll, tx_pads, rx_pads, sys_clk_freq,
                  clock_aligner=True, internal_loopback=False,
-                 tx_polarity=0, rx_polarity=0):
+                 tx_polarity=0, rx_polarity=0,
+                 init_monitor=False, clock_aligner_comma_check_period=None,
+                 line_coding="8b10b", tx_multilane=None):
         self.tx_produce_square_wave = CSRStorage()
         self.tx_prbs_config = CSRStorage(2)
 
@@ -84,11 +91,22 @@ class GTX(Module, AutoCSR):
 
         # # #
 
-        self.submodules.encoder = ClockDomainsRenamer("tx")(
-            Encoder(2, True))
-        self.decoders = [ClockDomainsRenamer("rx")(
-            Decoder(True)) for _ in range(2)]
-        self.submodules += self.decoders
+        if line_coding not in ["8b10b", "64b66b"]:
+            raise ValueError("Invalid line coding " + line_coding)
+        if line_coding == "8b10b":
+            self.submodules.encoder = ClockDomainsRenamer("tx")(
+                Encoder(2, True))
+            self.decoders = [ClockDomainsRenamer("rx")(
+                Decoder(True)) for _ in range(2)]
+            self.submodules += self.decoders
+        else:
+            # 64b/66b: no commas, block lock replaces the clock aligner
+            self.submodules.encoder = ClockDomainsRenamer("tx")(
+                code_64b66b.Encoder(20))
+            self.submodules.decoder = ClockDomainsRenamer("rx")(
+                code_64b66b.Decoder(20))
+            self.rx_block_lock = CSRStatus()
+            self.rx_header_errors = CSRStatus(32)
 
         self.rx_ready = Signal()
 
@@ -120,11 +138,39 @@ class GTX(Module, AutoCSR):
         # # #
 
         # TX generates RTIO clock, init must be in system domain
-        tx_init = GTXInit(sys_clk_freq, False)
+        if tx_multilane not in [None, "master", "slave"]:
+            raise ValueError("Invalid TX multilane mode " + tx_multilane)
+        tx_init = GTXInit(sys_clk_freq, False, tx_multilane is not None)
+        if tx_multilane is None:
+            tx_align_ports = dict(
+                i_TXDLYSRESET=tx_init.Xxdlysreset,
+                o_TXDLYSRESETDONE=tx_init.Xxdlysresetdone,
+                o_TXPHALIGNDONE=tx_init.Xxphaligndone
+            )
+        else:
+            # restarts and alignment (manual mode) driven by
+            # MultiLaneTXAlign, the tx clock of a slave is driven by the
+            # master.
+            self.tx_init = tx_init
+            self.tx_align = Record(tx_align_layout)
+            tx_align_ports = dict(
+                i_TXPHALIGNEN=1,
+                i_TXPHDLYRESET=self.tx_align.txphdlyreset,
+                i_TXDLYSRESET=self.tx_align.txdlysreset,
+                o_TXDLYSRESETDONE=self.tx_align.txdlysresetdone,
+                i_TXPHINIT=self.tx_align.txphinit,
+                o_TXPHINITDONE=self.tx_align.txphinitdone,
+                i_TXPHALIGN=self.tx_align.txphalign,
+                o_TXPHALIGNDONE=self.tx_align.txphaligndone,
+                i_TXDLYEN=self.tx_align.txdlyen
+            )
         # RX receives restart commands from RTIO domain
         rx_init = ClockDomainsRenamer("tx")(
             GTXInit(self.tx_clk_freq, True))
         self.submodules += tx_init, rx_init
+        if init_monitor:
+            self.submodules.tx_init_monitor = InitMonitorCSR(tx_init.monitor, "sys")
+            self.submodules.rx_init_monitor = InitMonitorCSR(rx_init.monitor, "tx")
         self.comb += [
             tx_init.plllock.eq(cpll.lock),
             rx_init.plllock.eq(cpll.lock),
@@ -182,10 +228,8 @@ class GTX(Module, AutoCSR):
                 # TX Startup/Reset
                 i_GTTXRESET=tx_init.gtXxreset,
                 o_TXRESETDONE=tx_init.Xxresetdone,
-                i_TXDLYSRESET=tx_init.Xxdlysreset,
-                o_TXDLYSRESETDONE=tx_init.Xxdlysresetdone,
-                o_TXPHALIGNDONE=tx_init.Xxphaligndone,
                 i_TXUSERRDY=tx_init.Xxuserrdy,
+                **tx_align_ports,
 
                 # TX data
                 p_TX_DATA_WIDTH=20,
@@ -271,14 +315,15 @@ class GTX(Module, AutoCSR):
         txoutclk_bufr = Signal()
         tx_bufr_div = cpll.config["clkin"]/self.tx_clk_freq
         assert tx_bufr_div == int(tx_bufr_div)
-        self.specials += [
-            Instance("BUFG", i_I=self.txoutclk, o_O=txoutclk_bufg),
-            # TODO: use MMCM instead?
-            Instance("BUFR", i_I=txoutclk_bufg, o_O=txoutclk_bufr,
-                i_CE=1, p_BUFR_DIVIDE=str(int(tx_bufr_div))),
-            Instance("BUFG", i_I=txoutclk_bufr, o_O=self.cd_tx.clk),
-            AsyncResetSynchronizer(self.cd_tx, tx_reset_deglitched)
-        ]
+        if tx_multilane != "slave":
+            self.specials += [
+                Instance("BUFG", i_I=self.txoutclk, o_O=txoutclk_bufg),
+                # TODO: use MMCM instead?
+                Instance("BUFR", i_I=txoutclk_bufg, o_O=txoutclk_bufr,
+                    i_CE=1, p_BUFR_DIVIDE=str(int(tx_bufr_div))),
+                Instance("BUFG", i_I=txoutclk_bufr, o_O=self.cd_tx.clk)
+            ]
+        self.specials += AsyncResetSynchronizer(self.cd_tx, tx_reset_deglitched)
 
         # rx clocking
         rx_reset_deglitched = Signal()
@@ -293,8 +338,11 @@ class GTX(Module, AutoCSR):
         # tx data and prbs
         self.submodules.tx_prbs = ClockDomainsRenamer("tx")(PRBSTX(20, True))
         self.comb += self.tx_prbs.config.eq(tx_prbs_config)
+        if line_coding == "8b10b":
+            self.comb += self.tx_prbs.i.eq(Cat(*[self.encoder.output[i] for i in range(2)]))
+        else:
+            self.comb += self.tx_prbs.i.eq(self.encoder.output)
         self.comb += [
-            self.tx_prbs.i.eq(Cat(*[self.encoder.output[i] for i in range(2)])),
             If(tx_produce_square_wave,
                 # square wave @ linerate/20 for scope observation
                 txdata.eq(0b11111111110000000000)
@@ -309,20 +357,70 @@ class GTX(Module, AutoCSR):
             self.rx_prbs.config.eq(rx_prbs_config),
             rx_prbs_errors.eq(self.rx_prbs.errors)
         ]
-        self.comb += [
-            self.decoders[0].input.eq(rxdata[:10]),
-            self.decoders[1].input.eq(rxdata[10:]),
-            self.rx_prbs.i.eq(rxdata)
-        ]
+        self.comb += self.rx_prbs.i.eq(rxdata)
+        if line_coding == "8b10b":
+            self.comb += [
+                self.decoders[0].input.eq(rxdata[:10]),
+                self.decoders[1].input.eq(rxdata[10:])
+            ]
+        else:
+            self.comb += self.decoder.input.eq(rxdata)
 
         # clock alignment
-        if clock_aligner:
-            clock_aligner = BruteforceClockAligner(0b0101111100, self.tx_clk_freq)
-            self.submodules += clock_aligner
+        if line_coding == "64b66b":
+            block_lock = Signal()
+            self.specials += [
+                MultiReg(self.decoder.block_lock, block_lock, "tx"),
+                MultiReg(self.decoder.block_lock, self.rx_block_lock.status, "sys")
+            ]
+            header_errors = BusSynchronizer(32, "rx", "sys")
+            self.submodules += header_errors
+            self.comb += [
+                header_errors.i.eq(self.decoder.header_errors),
+                self.rx_header_errors.status.eq(header_errors.o),
+                self.rx_ready.eq(rx_init.done & block_lock)
+            ]
+        elif clock_aligner:
+            clock_aligner = BruteforceClockAligner(0b0101111100, self.tx_clk_freq,
+                comma_check_period=clock_aligner_comma_check_period)
+            self.submodules.clock_aligner = clock_aligner
             self.comb += [
+                clock_aligner.rx_init_done.eq(rx_init.done),
                 clock_aligner.rxdata.eq(rxdata),
                 rx_init.restart.eq(clock_aligner.restart),
                 self.rx_ready.eq(clock_aligner.ready)
             ]
         else:
             self.comb += self.rx_ready.eq(rx_init.done)
+
+
+# GTX only supports the CPLL: each lane needs its own (PLLAllocator with
+# GTXChannelPLL as channel_pll_cls).
+#
+# With tx_phase_align, the TX phase of all the lanes is aligned to the master
+# lane (gtx0) by MultiLaneTXAlign: all the tx domains run from the gtx0 tx
+# clock and the lanes start with minimal skew. TX restarts apply to all the
+# lanes.
+#
+# See MultiLane for the lanes, their domains and the bonding option.
+class MultiGTX(MultiLane):
+    def __init__(self, cplls, tx_pads, rx_pads, sys_clk_freq,
+                 tx_phase_align=False, **kwargs):
+        def lane_kwargs(i):
+            if tx_phase_align:
+                return {"tx_multilane": "master" if i == 0 else "slave"}
+            return dict()
+        MultiLane.__init__(self, "gtx", GTX, cplls, tx_pads, rx_pads,
+                           sys_clk_freq, lane_kwargs, **kwargs)
+        self.gtxs = self.lanes
+
+        # # #
+
+        if tx_phase_align:
+            master = self.gtxs[0]
+            self.submodules.tx_align = MultiLaneTXAlign(
+                [gtx.tx_init for gtx in self.gtxs])
+            for i, gtx in enumerate(self.gtxs):
+                self.comb += self.tx_align.lanes[i].connect(gtx.tx_align)
+                if i:
+                    self.comb += gtx.cd_tx.clk.eq(master.cd_tx.clk)
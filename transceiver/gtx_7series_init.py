@@ -4,11 +4,25 @@ from migen import *
 from migen.genlib.cdc import MultiReg, PulseSynchronizer
 from migen.genlib.misc import WaitTimer
 
+from transceiver.init_monitor import InitMonitor
 
+
+# With multilane (TX only), the delay and phase alignment is sequenced on all
+# the lanes by MultiLaneTXAlign: the lanes wait for align_start once reset
+# (align_ready) and are ready on align_done.
 class GTXInit(Module):
-    def __init__(self, sys_clk_freq, rx):
+    # timings (also used by sim/clock_aligner_model.py)
+    startup_ns = 500
+    ready_ms = 1
+    cdr_stable_cycles = 1024
+
+    def __init__(self, sys_clk_freq, rx, multilane=False):
+        assert not (rx and multilane)
         self.done = Signal()
         self.restart = Signal()
+        self.align_ready = Signal()
+        self.align_start = Signal(reset=1)
+        self.align_done = Signal()
 
         # GTX signals
         self.plllock = Signal()
@@ -46,14 +60,14 @@ class GTXInit(Module):
 
         # After configuration, transceiver resets have to stay low for
         # at least 500ns (see AR43482)
-        startup_cycles = ceil(500*sys_clk_freq/1000000000)
+        startup_cycles = ceil(self.startup_ns*sys_clk_freq/1000000000)
         startup_timer = WaitTimer(startup_cycles)
         self.submodules += startup_timer
 
         startup_fsm = ResetInserter()(FSM(reset_state="RESET_ALL"))
         self.submodules += startup_fsm
 
-        ready_timer = WaitTimer(int(sys_clk_freq/1000))
+        ready_timer = WaitTimer(int(self.ready_ms*sys_clk_freq/1000))
         self.submodules += ready_timer
         self.comb += [
             ready_timer.wait.eq(~self.done & ~startup_fsm.reset),
@@ -61,7 +75,7 @@ class GTXInit(Module):
         ]
 
         if rx:
-            cdr_stable_timer = WaitTimer(1024)
+            cdr_stable_timer = WaitTimer(self.cdr_stable_cycles)
             self.submodules += cdr_stable_timer
 
         Xxphaligndone_r = Signal(reset=1)
@@ -92,7 +106,18 @@ class GTXInit(Module):
         else:
             startup_fsm.act("RELEASE_GTX_RESET",
                 Xxuserrdy.eq(1),
-                If(Xxresetdone, NextState("ALIGN"))
+                If(Xxresetdone,
+                    NextState("WAIT_ALIGN_START" if multilane else "ALIGN"))
+            )
+        if multilane:
+            startup_fsm.act("WAIT_ALIGN_START",
+                Xxuserrdy.eq(1),
+                self.align_ready.eq(1),
+                If(self.align_start, NextState("WAIT_MULTILANE_ALIGN"))
+            )
+            startup_fsm.act("WAIT_MULTILANE_ALIGN",
+                Xxuserrdy.eq(1),
+                If(self.align_done, NextState("READY"))
             )
         # Start delay alignment (pulse)
         startup_fsm.act("ALIGN",
@@ -122,3 +147,7 @@ class GTXInit(Module):
             self.done.eq(1),
             If(self.restart, NextState("RESET_ALL"))
         )
+
+        # bring-up statistics
+        self.submodules.monitor = InitMonitor(startup_fsm,
+            self.done, self.restart, ready_timer.done)
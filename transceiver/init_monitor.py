@@ -0,0 +1,78 @@
+from migen import *
+from migen.genlib.cdc import BusSynchronizer
+
+from litex.soc.interconnect.csr import *
+
+
+# Bring-up statistics of a transceiver init FSM.
+#
+# A bring-up starts on each external restart request and ends when the init
+# reports done. Since the start of the bring-up, the cycles spent in each FSM
+# state and the number of silent restarts caused by the ready timer expiring
+# (timeouts) are accumulated: the sum of the state counters before the READY
+# state equals time_to_ready, and the READY counter gives the uptime. The
+# restarts counter counts bring-ups since configuration.
+#
+# Must be created after all the states of the FSM have been declared.
+class InitMonitor(Module):
+    def __init__(self, fsm, done, restart, timeout, width=32):
+        self.states = list(fsm.actions.keys())
+        self.state_cycles = [Signal(width) for state in self.states]
+        self.time_to_ready = Signal(width)
+        self.timeouts = Signal(width)
+        self.restarts = Signal(width)
+
+        # # #
+
+        self.sync += [
+            If(restart,
+                self.restarts.eq(self.restarts + 1),
+                self.timeouts.eq(0),
+                self.time_to_ready.eq(0)
+            ).Elif(~done,
+                self.time_to_ready.eq(self.time_to_ready + 1),
+                If(timeout,
+                    self.timeouts.eq(self.timeouts + 1)
+                )
+            )
+        ]
+        for state, cycles in zip(self.states, self.state_cycles):
+            self.sync += \
+                If(restart,
+                    cycles.eq(0)
+                ).Elif(fsm.ongoing(state),
+                    cycles.eq(cycles + 1)
+                )
+
+
+# Exposes an InitMonitor running in clock domain cd as sys CSRs.
+# Must not be a submodule of the (possibly renamed) init module.
+class InitMonitorCSR(Module, AutoCSR):
+    def __init__(self, monitor, cd="sys"):
+        self.time_to_ready = CSRStatus(len(monitor.time_to_ready))
+        self.timeouts = CSRStatus(len(monitor.timeouts))
+        self.restarts = CSRStatus(len(monitor.restarts))
+
+        # # #
+
+        statuses = [
+            (monitor.time_to_ready, self.time_to_ready),
+            (monitor.timeouts, self.timeouts),
+            (monitor.restarts, self.restarts)
+        ]
+        for state, cycles in zip(monitor.states, monitor.state_cycles):
+            name = state.lower() + "_cycles"
+            csr = CSRStatus(len(cycles), name=name)
+            setattr(self, name, csr)
+            statuses.append((cycles, csr))
+
+        for value, csr in statuses:
+            if cd == "sys":
+                self.comb += csr.status.eq(value)
+            else:
+                synchronizer = BusSynchronizer(len(value), cd, "sys")
+                self.submodules += synchronizer
+                self.comb += [
+                    synchronizer.i.eq(value),
+                    csr.status.eq(synchronizer.o)
+                ]
@@ -0,0 +1,211 @@
+from migen import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer, BusSynchronizer
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.csr import *
+
+
+# Latency measurement with markers inserted in the TX stream.
+#
+# Words are 2 characters (k: 2 bits, d: 16 bits), markers keep the comma on
+# the first character:
+# - ping: K28.5 K28.2, sent by LatencyProbe.
+# - pong: K28.5 K28.4, sent back by a LatencyReflector on the far end.
+# With a physical (or PMA) loopback the ping itself comes back.
+K28_5 = (5 << 5) | 28
+K28_2 = (2 << 5) | 28
+K28_4 = (4 << 5) | 28
+PING_D = (K28_2 << 8) | K28_5
+PONG_D = (K28_4 << 8) | K28_5
+
+
+def word_description():
+    return [("k", 2), ("d", 16)]
+
+
+# Inserts a marker word in the tx stream on each pulse of send (tx domain).
+class _MarkerInserter(Module):
+    def __init__(self, marker):
+        self.send = Signal()
+        self.sink = stream.Endpoint(word_description())
+        self.source = Record(word_description())
+        self.sent = Signal()
+
+        # # #
+
+        pending = Signal()
+        self.sync.tx += \
+            If(self.send,
+                pending.eq(1)
+            ).Elif(self.sent,
+                pending.eq(0)
+            )
+        self.comb += [
+            self.sent.eq(pending),
+            self.sink.ready.eq(~pending),
+            If(pending,
+                self.source.k.eq(0b11),
+                self.source.d.eq(marker)
+            ).Elif(self.sink.valid,
+                self.source.k.eq(self.sink.k),
+                self.source.d.eq(self.sink.d)
+            ).Else(
+                # idle
+                self.source.k.eq(0b11),
+                self.source.d.eq((K28_5 << 8) | K28_5)
+            )
+        ]
+
+
+# Far end of the measurement: answers each ping with a pong.
+class LatencyReflector(Module):
+    def __init__(self):
+        self.sink = stream.Endpoint(word_description())
+        self.source = Record(word_description())
+        self.rx = Record(word_description())
+
+        # # #
+
+        inserter = _MarkerInserter(PONG_D)
+        ping = PulseSynchronizer("rx", "tx")
+        self.submodules += inserter, ping
+        self.comb += [
+            self.sink.connect(inserter.sink),
+            self.source.eq(inserter.source),
+            ping.i.eq((self.rx.k == 0b11) & (self.rx.d == PING_D)),
+            inserter.send.eq(ping.o)
+        ]
+
+
+# Measures the round-trip latency (tx cycles) from the ping sent to the
+# ping/pong received, including the synchronization of the received marker
+# to the tx domain. The result is also given in UI, adding the slides of
+# the clock aligner (SlideClockAligner.slides, 0 with the bruteforce
+# aligner) so that a latency change caused by the word alignment is seen.
+#
+# A histogram of the latencies (hist_bins bins of one cycle starting at
+# hist_base cycles) is kept over all the measurements, e.g. one after each
+# restart of the link, to verify that the latency is the same after each
+# reset. Latencies below/above the bins are counted apart (hist_underflows,
+# hist_overflows).
+class LatencyProbe(Module, AutoCSR):
+    def __init__(self, ui_per_cycle=20, hist_bins=16, timeout=2**16-1):
+        self.sink = stream.Endpoint(word_description())
+        self.source = Record(word_description())
+        self.rx = Record(word_description())
+        self.slides = Signal(5)
+
+        self.probe = CSR()
+        self.latency = CSRStatus(16)
+        self.latency_ui = CSRStatus(24)
+        self.measurements = CSRStatus(32)
+        self.timeouts = CSRStatus(32)
+        self.hist_base = CSRStorage(16)
+        self.hist_index = CSRStorage(bits_for(hist_bins - 1))
+        self.hist_count = CSRStatus(32)
+        self.hist_underflows = CSRStatus(32)
+        self.hist_overflows = CSRStatus(32)
+        self.hist_clear = CSR()
+
+        # # #
+
+        inserter = _MarkerInserter(PING_D)
+        self.submodules += inserter
+        self.comb += [
+            self.sink.connect(inserter.sink),
+            self.source.eq(inserter.source)
+        ]
+
+        probe = PulseSynchronizer("sys", "tx")
+        hist_clear = PulseSynchronizer("sys", "tx")
+        received = PulseSynchronizer("rx", "tx")
+        self.submodules += probe, hist_clear, received
+        self.comb += [
+            probe.i.eq(self.probe.re),
+            hist_clear.i.eq(self.hist_clear.re),
+            received.i.eq((self.rx.k == 0b11) &
+                          ((self.rx.d == PING_D) | (self.rx.d == PONG_D)))
+        ]
+
+        slides = Signal(5)
+        hist_base = Signal(16)
+        hist_index = Signal(bits_for(hist_bins - 1))
+        self.specials += [
+            MultiReg(self.slides, slides, "tx"),
+            MultiReg(self.hist_base.storage, hist_base, "tx"),
+            MultiReg(self.hist_index.storage, hist_index, "tx")
+        ]
+
+        # measurement (tx)
+        counter = Signal(16)
+        latency = Signal(16)
+        latency_ui = Signal(24)
+        measurements = Signal(32)
+        timeouts = Signal(32)
+        done = Signal()
+
+        fsm = ClockDomainsRenamer("tx")(FSM(reset_state="IDLE"))
+        self.submodules += fsm
+
+        fsm.act("IDLE",
+            If(probe.o,
+                inserter.send.eq(1),
+                NextState("WAIT_SENT")
+            )
+        )
+        fsm.act("WAIT_SENT",
+            If(inserter.sent,
+                NextValue(counter, 0),
+                NextState("WAIT_RECEIVED")
+            )
+        )
+        fsm.act("WAIT_RECEIVED",
+            NextValue(counter, counter + 1),
+            If(received.o,
+                done.eq(1),
+                NextValue(latency, counter),
+                NextValue(latency_ui, counter*ui_per_cycle + slides),
+                NextValue(measurements, measurements + 1),
+                NextState("IDLE")
+            ).Elif(counter == timeout,
+                NextValue(timeouts, timeouts + 1),
+                NextState("IDLE")
+            )
+        )
+
+        # histogram (tx)
+        bins = Array(Signal(32) for i in range(hist_bins))
+        hist_underflows = Signal(32)
+        hist_overflows = Signal(32)
+        offset = Signal(17)
+        self.comb += offset.eq(counter - hist_base)
+        self.sync.tx += \
+            If(hist_clear.o,
+                [b.eq(0) for b in bins],
+                hist_underflows.eq(0),
+                hist_overflows.eq(0)
+            ).Elif(done,
+                If(counter < hist_base,
+                    hist_underflows.eq(hist_underflows + 1)
+                ).Elif(offset >= hist_bins,
+                    hist_overflows.eq(hist_overflows + 1)
+                ).Else(
+                    bins[offset].eq(bins[offset] + 1)
+                )
+            )
+        hist_count = Signal(32)
+        self.comb += hist_count.eq(bins[hist_index])
+
+        for value, csr in [(latency, self.latency),
+                           (latency_ui, self.latency_ui),
+                           (measurements, self.measurements),
+                           (timeouts, self.timeouts),
+                           (hist_count, self.hist_count),
+                           (hist_underflows, self.hist_underflows),
+                           (hist_overflows, self.hist_overflows)]:
+            synchronizer = BusSynchronizer(len(value), "tx", "sys")
+            self.submodules += synchronizer
+            self.comb += [
+                synchronizer.i.eq(value),
+                csr.status.eq(synchronizer.o)
+            ]
@@ -0,0 +1,87 @@
+from migen import *
+
+from litex.soc.interconnect.csr import *
+
+from transceiver.channel_bonding import ChannelBonding
+from transceiver.pll_allocator import SharedPLLReset
+
+
+# Common part of the MultiGTH/MultiGTX/MultiGTP wrappers.
+#
+# One transceiver (lane_cls) is instantiated per lane, with its PLL view from
+# SharedPLLReset, lane_kwargs(i) added to kwargs. The tx/rx domains of lane i
+# are renamed <prefix><i>_tx/<prefix><i>_rx. The encoders/decoders of all the
+# lanes are exposed (2 per lane) and rx_ready is set when all the lanes are
+# ready. With bonding, the lanes are driven by a ChannelBonding (sink/source
+# in the domains of lane 0). Only the 8b10b line coding is supported.
+class MultiLane(Module, AutoCSR):
+    def __init__(self, prefix, lane_cls, plls, tx_pads, rx_pads, sys_clk_freq,
+                 lane_kwargs=lambda i: dict(),
+                 bonding=False, bonding_marker_period=1024, **kwargs):
+        line_coding = kwargs.get("line_coding", "8b10b")
+        if line_coding != "8b10b":
+            raise ValueError("Multi-lane transceivers only support 8b10b, not " +
+                             line_coding)
+        self.nlanes = nlanes = len(tx_pads.p)
+
+        class EncoderExposer:
+            def __init__(self):
+                self.k = Signal()
+                self.d = Signal(8)
+
+        self.lanes = [None for i in range(nlanes)]
+        self.encoders = [EncoderExposer() for i in range(2*nlanes)]
+        self.decoders = [None for i in range(2*nlanes)]
+        self.rx_ready = Signal()
+
+        # # #
+
+        def get_pads(pads, i):
+            class Pads:
+                def __init__(self, p, n):
+                    self.p = p
+                    self.n = n
+            return Pads(pads.p[i], pads.n[i])
+
+        self.submodules.pll_reset = SharedPLLReset(plls)
+
+        rx_ready = Signal(reset=1)
+        for i in range(nlanes):
+            lane_name = prefix + str(i)
+            lane = lane_cls(self.pll_reset.lane_plls[i],
+                            get_pads(tx_pads, i), get_pads(rx_pads, i),
+                            sys_clk_freq, **kwargs, **lane_kwargs(i))
+            lane = ClockDomainsRenamer({"tx": lane_name + "_tx",
+                                        "rx": lane_name + "_rx"})(lane)
+            self.lanes[i] = lane
+            setattr(self.submodules, lane_name, lane)
+            for j in range(2):
+                self.comb += [
+                    lane.encoder.k[j].eq(self.encoders[2*i + j].k),
+                    lane.encoder.d[j].eq(self.encoders[2*i + j].d)
+                ]
+                self.decoders[2*i + j] = lane.decoders[j]
+            new_rx_ready = Signal()
+            self.comb += new_rx_ready.eq(rx_ready & lane.rx_ready)
+            rx_ready = new_rx_ready
+
+        self.comb += self.rx_ready.eq(rx_ready)
+
+        if bonding:
+            cd_remapping = {"tx": prefix + "0_tx", "rx": prefix + "0_rx"}
+            for i in range(nlanes):
+                cd_remapping["lane{}_tx".format(i)] = "{}{}_tx".format(prefix, i)
+                cd_remapping["lane{}_rx".format(i)] = "{}{}_rx".format(prefix, i)
+            self.submodules.bonding = ClockDomainsRenamer(cd_remapping)(
+                ChannelBonding(nlanes, bonding_marker_period))
+            self.sink = self.bonding.sink
+            self.source = self.bonding.source
+            self.comb += self.bonding.rx_ready.eq(self.rx_ready)
+            for i in range(nlanes):
+                for j in range(2):
+                    self.comb += [
+                        self.encoders[2*i + j].k.eq(self.bonding.lanes_tx[i].k[j]),
+                        self.encoders[2*i + j].d.eq(self.bonding.lanes_tx[i].d[8*j:8*(j+1)]),
+                        self.bonding.lanes_rx[i].k[j].eq(self.decoders[2*i + j].k),
+                        self.bonding.lanes_rx[i].d[8*j:8*(j+1)].eq(self.decoders[2*i + j].d)
+                    ]
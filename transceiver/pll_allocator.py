@@ -0,0 +1,65 @@
+from math import ceil
+from copy import copy
+from functools import reduce
+from operator import and_
+
+from migen import *
+
+
+# Allocates the PLLs of a multi-lane link.
+#
+# Lanes are grouped by quads (lane i is in quad i//lanes_per_quad) and all the
+# lanes of a quad share one quad PLL (quad_pll_cls) when it supports the
+# linerate. Channel PLLs (channel_pll_cls, one per lane) are only used as
+# a fallback, or when the family has no quad PLL.
+#
+# lane_plls gives the PLL of each lane (the same object for lanes sharing
+# a PLL) and is meant to be given to the Multi* wrappers. All the lanes must
+# be in quads reachable by refclk.
+class PLLAllocator(Module):
+    def __init__(self, refclk, refclk_freq, linerate, nlanes,
+                 quad_pll_cls=None, channel_pll_cls=None, lanes_per_quad=4):
+        self.plls = []
+        self.lane_plls = []
+
+        # # #
+
+        for quad in range(ceil(nlanes/lanes_per_quad)):
+            quad_nlanes = min(lanes_per_quad, nlanes - quad*lanes_per_quad)
+            pll = None
+            if quad_pll_cls is not None:
+                try:
+                    pll = quad_pll_cls(refclk, refclk_freq, linerate)
+                except ValueError:
+                    if channel_pll_cls is None:
+                        raise
+            if pll is not None:
+                self.plls.append(pll)
+                self.lane_plls += [pll]*quad_nlanes
+            else:
+                for i in range(quad_nlanes):
+                    pll = channel_pll_cls(refclk, refclk_freq, linerate)
+                    self.plls.append(pll)
+                    self.lane_plls.append(pll)
+        self.submodules += self.plls
+
+
+# Gives each lane its own view of its PLL, with a private reset.
+#
+# A PLL shared by several lanes is only reset when all of its lanes request
+# it (i.e. at startup): the restart of a single lane then waits for the lock
+# of the running PLL instead of disturbing the other lanes.
+class SharedPLLReset(Module):
+    def __init__(self, lane_plls):
+        self.lane_plls = []
+
+        # # #
+
+        resets = dict()
+        for pll in lane_plls:
+            view = copy(pll)
+            view.reset = Signal()
+            self.lane_plls.append(view)
+            resets.setdefault(id(pll), (pll, []))[1].append(view.reset)
+        for pll, lane_resets in resets.values():
+            self.comb += pll.reset.eq(reduce(and_, lane_resets))
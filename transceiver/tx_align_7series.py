@@ -0,0 +1,156 @@
+from functools import reduce
+from operator import and_, or_
+
+from migen import *
+from migen.genlib.cdc import MultiReg
+from migen.genlib.record import DIR_M_TO_S, DIR_S_TO_M
+
+
+# TX phase alignment ports of a GTX/GTP lane in manual mode
+tx_align_layout = [
+    ("txphdlyreset",    1, DIR_M_TO_S),
+    ("txdlysreset",     1, DIR_M_TO_S),
+    ("txphinit",        1, DIR_M_TO_S),
+    ("txphalign",       1, DIR_M_TO_S),
+    ("txdlyen",         1, DIR_M_TO_S),
+    ("txdlysresetdone", 1, DIR_S_TO_M),
+    ("txphinitdone",    1, DIR_S_TO_M),
+    ("txphaligndone",   1, DIR_S_TO_M)
+]
+
+
+# Multi-lane TX buffer bypass alignment for GTX/GTP
+# (from UG476/UG482 in TX Buffer Bypass in Multi-Lane Manual Mode).
+#
+# 7 series transceivers have no TXSYNC ports, the alignment is sequenced
+# here on all the lanes (lane 0 is the master, the others are slaves and run
+# from the TXUSRCLK of the master):
+# - TXPHDLYRESET pulse, then TXDLYSRESET on each lane until its
+#   TXDLYSRESETDONE,
+# - TXPHINIT on each lane until its TXPHINITDONE,
+# - TXPHALIGN then TXDLYEN on the master, each until a rising edge of its
+#   TXPHALIGNDONE,
+# - TXPHALIGN on each slave until a rising edge of its TXPHALIGNDONE,
+# - TXDLYEN on the master until a rising edge of its TXPHALIGNDONE.
+#
+# The sequence starts when all the tx_inits wait for it (align_ready) and
+# sets their align_done when it ends. As with GTHMultiLaneTXAlign, a lane
+# waiting to align while others are done restarts all the lanes.
+class MultiLaneTXAlign(Module):
+    def __init__(self, tx_inits):
+        nlanes = len(tx_inits)
+        self.lanes = [Record(tx_align_layout) for i in range(nlanes)]
+
+        # # #
+
+        # Double-latch transceiver asynch outputs
+        txdlysresetdone = Signal(nlanes)
+        txphinitdone = Signal(nlanes)
+        txphaligndone = Signal(nlanes)
+        for i, lane in enumerate(self.lanes):
+            self.specials += [
+                MultiReg(lane.txdlysresetdone, txdlysresetdone[i]),
+                MultiReg(lane.txphinitdone, txphinitdone[i]),
+                MultiReg(lane.txphaligndone, txphaligndone[i])
+            ]
+        txphinitdone_r = Signal(nlanes)
+        txphaligndone_r = Signal(nlanes, reset=2**nlanes-1)
+        txphinitdone_rising = Signal(nlanes)
+        txphaligndone_rising = Signal(nlanes)
+        self.sync += [
+            txphinitdone_r.eq(txphinitdone),
+            txphaligndone_r.eq(txphaligndone)
+        ]
+        self.comb += [
+            txphinitdone_rising.eq(txphinitdone & ~txphinitdone_r),
+            txphaligndone_rising.eq(txphaligndone & ~txphaligndone_r)
+        ]
+
+        # Deglitch FSM outputs driving transceiver asynch inputs
+        txphdlyreset = Signal(nlanes)
+        txdlysreset = Signal(nlanes)
+        txphinit = Signal(nlanes)
+        txphalign = Signal(nlanes)
+        txdlyen = Signal(nlanes)
+        for i, lane in enumerate(self.lanes):
+            self.sync += [
+                lane.txphdlyreset.eq(txphdlyreset[i]),
+                lane.txdlysreset.eq(txdlysreset[i]),
+                lane.txphinit.eq(txphinit[i]),
+                lane.txphalign.eq(txphalign[i]),
+                lane.txdlyen.eq(txdlyen[i])
+            ]
+
+        align_start = reduce(and_, [tx_init.align_ready for tx_init in tx_inits])
+        desync = (reduce(or_, [tx_init.align_ready for tx_init in tx_inits]) &
+                  reduce(or_, [tx_init.done for tx_init in tx_inits]))
+        align_done = Signal()
+        for tx_init in tx_inits:
+            self.comb += [
+                tx_init.restart.eq(desync),
+                tx_init.align_start.eq(align_start),
+                tx_init.align_done.eq(align_done)
+            ]
+
+        # lanes done with the current step
+        done = Signal(nlanes)
+
+        # the sequence also restarts when all the lanes wait for it again
+        # (e.g. their ready timers expired during the alignment)
+        fsm = ResetInserter()(FSM(reset_state="WAIT_ALIGN_START"))
+        self.submodules += fsm
+        self.comb += fsm.reset.eq(desync |
+            (align_start & ~fsm.ongoing("WAIT_ALIGN_START")))
+
+        fsm.act("WAIT_ALIGN_START",
+            NextValue(done, 0),
+            If(align_start, NextState("PHDLYRESET"))
+        )
+        fsm.act("PHDLYRESET",
+            txphdlyreset.eq(2**nlanes-1),
+            NextState("DLYSRESET")
+        )
+        fsm.act("DLYSRESET",
+            txdlysreset.eq(~done),
+            NextValue(done, done | txdlysresetdone),
+            If(done == 2**nlanes-1,
+                NextValue(done, 0),
+                NextState("PHINIT")
+            )
+        )
+        fsm.act("PHINIT",
+            txphinit.eq(~done),
+            NextValue(done, done | txphinitdone_rising),
+            If(done == 2**nlanes-1,
+                NextState("MASTER_PHALIGN")
+            )
+        )
+        fsm.act("MASTER_PHALIGN",
+            txphalign.eq(1),
+            If(txphaligndone_rising[0],
+                NextState("MASTER_DLYEN")
+            )
+        )
+        fsm.act("MASTER_DLYEN",
+            txdlyen.eq(1),
+            If(txphaligndone_rising[0],
+                NextValue(done, 1),
+                NextState("SLAVES_PHALIGN")
+            )
+        )
+        fsm.act("SLAVES_PHALIGN",
+            txphalign.eq(~done),
+            NextValue(done, done | txphaligndone_rising),
+            If(done == 2**nlanes-1,
+                NextState("MASTER_DLYEN_FINAL")
+            )
+        )
+        fsm.act("MASTER_DLYEN_FINAL",
+            txdlyen.eq(1),
+            If(txphaligndone_rising[0],
+                NextState("READY")
+            )
+        )
+        fsm.act("READY",
+            align_done.eq(1)
+        )
@@ -7,7 +7,6 @@ and introduces some limitations:
 - no probing (pf/pr)
 - no address spaces (rca/bca/wca/wff)
 - 32bits data and address
-- 1 record per frame
 
 TODO:
 - report error status?
@@ -18,6 +17,7 @@ from migen import *
 
 from litex.soc.interconnect import stream
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
 
 from wishbone.packet import *
 
@@ -370,6 +370,47 @@ class EtherboneRecordDepacketizer(Depacketizer):
             etherbone_record_header)
 
 
+# Splits the records of a frame: last is asserted at the end of each record
+# (computed from its wcount/rcount) so that the record depacketizer and the
+# receiver handle them one at a time.
+class EtherboneRecordSplitter(Module):
+    def __init__(self):
+        self.sink = sink = stream.Endpoint(etherbone_packet_user_description(32))
+        self.source = source = stream.Endpoint(etherbone_packet_user_description(32))
+
+        # # #
+
+        header = Record(etherbone_record_header.get_layout())
+        self.comb += etherbone_record_header.decode(sink.data, header)
+
+        first = Signal(reset=1)
+        length = Signal(10)
+        remaining = Signal(10)
+        self.comb += [
+            sink.connect(source, omit={"last"}),
+            length.eq((header.wcount != 0) + header.wcount +
+                      (header.rcount != 0) + header.rcount),
+            If(first,
+                source.last.eq(sink.last | (length == 0))
+            ).Else(
+                source.last.eq(sink.last | (remaining == 1))
+            )
+        ]
+        self.sync += \
+            If(sink.valid & sink.ready,
+                first.eq(source.last),
+                If(first,
+                    remaining.eq(length)
+                ).Else(
+                    remaining.eq(remaining - 1)
+                )
+            )
+
+
+# Records are decoded as their words arrive, buffer_depth only sets the
+# buffer in front of the decoder: 0 for cut-through, a few words for a skid
+# buffer in distributed RAM, deeper (block RAM) to absorb the frames received
+# while the bus is busy.
 class EtherboneRecordReceiver(Module):
     def __init__(self, buffer_depth=256):
         self.sink = sink = stream.Endpoint(etherbone_record_description(32))
@@ -378,7 +419,7 @@ class EtherboneRecordReceiver(Module):
         # # #
 
         fifo = stream.SyncFIFO(etherbone_record_description(32), buffer_depth,
-                               buffered=True)
+                               buffered=buffer_depth > 16)
         self.submodules += fifo
         self.comb += sink.connect(fifo.sink)
 
@@ -431,6 +472,7 @@ class EtherboneRecordReceiver(Module):
             )
         )
         fsm.act("RECEIVE_BASE_RET_ADDR",
+            fifo.source.ready.eq(1),
             counter_reset.eq(1),
             If(fifo.source.valid,
                 base_addr_update.eq(1),
@@ -453,22 +495,58 @@ class EtherboneRecordReceiver(Module):
         )
 
 
+# Records queued in the buffer are grouped in frames of up to
+# max_frame_length bytes (a larger record is sent alone): frame_length is the
+# length of the current frame and frame_last is set during its last record.
+# Only the records already started in the buffer are grouped, a frame never
+# waits for more records. buffer_depth must be at least 1.
 class EtherboneRecordSender(Module):
-    def __init__(self, buffer_depth=256):
+    def __init__(self, buffer_depth=256, max_frame_length=1024):
+        assert buffer_depth >= 1
         self.sink = sink = stream.Endpoint(etherbone_mmap_description(32))
         self.source = source = stream.Endpoint(etherbone_record_description(32))
+        self.frame_length = Signal(32)
+        self.frame_last = Signal()
 
         # # #
 
         pbuffer = stream.SyncFIFO(etherbone_mmap_description(32), buffer_depth)
-        self.submodules += pbuffer
-        self.comb += sink.connect(pbuffer.sink)
+        records = stream.SyncFIFO([("length", 16)], buffer_depth)
+        self.submodules += pbuffer, records
+
+        # record length (header, base address and data) queued on the first
+        # word of each record
+        first = Signal(reset=1)
+        self.comb += [
+            sink.connect(pbuffer.sink, omit={"valid", "ready"}),
+            pbuffer.sink.valid.eq(sink.valid & records.sink.ready),
+            records.sink.valid.eq(sink.valid & first & pbuffer.sink.ready),
+            records.sink.length.eq(etherbone_record_header.length +
+                                   4 + sink.count*4),
+            sink.ready.eq(pbuffer.sink.ready & records.sink.ready)
+        ]
+        self.sync += If(sink.valid & sink.ready, first.eq(sink.last))
+
+        frame_records = Signal(16)
+        self.comb += self.frame_last.eq(frame_records == 1)
 
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
-            pbuffer.source.ready.eq(1),
-            If(pbuffer.source.valid,
-                pbuffer.source.ready.eq(0),
+            If(records.source.valid,
+                records.source.ready.eq(1),
+                NextValue(self.frame_length, records.source.length),
+                NextValue(frame_records, 1),
+                NextState("GROUP")
+            )
+        )
+        fsm.act("GROUP",
+            If(records.source.valid &
+               (self.frame_length + records.source.length <= max_frame_length),
+                records.source.ready.eq(1),
+                NextValue(self.frame_length,
+                          self.frame_length + records.source.length),
+                NextValue(frame_records, frame_records + 1)
+            ).Else(
                 NextState("SEND_BASE_ADDRESS")
             )
         )
@@ -485,7 +563,7 @@ class EtherboneRecordSender(Module):
             source.valid.eq(pbuffer.source.valid),
             source.last.eq(0),
             source.data.eq(pbuffer.source.base_addr),
-            If(source.ready,
+            If(source.valid & source.ready,
                 NextState("SEND_DATA")
             )
         )
@@ -496,38 +574,44 @@ class EtherboneRecordSender(Module):
             If(source.valid & source.ready,
                 pbuffer.source.ready.eq(1),
                 If(source.last,
-                    NextState("IDLE")
+                    NextValue(frame_records, frame_records - 1),
+                    If(self.frame_last,
+                        NextState("IDLE")
+                    ).Else(
+                        NextState("SEND_BASE_ADDRESS")
+                    )
                 )
             )
         )
 
 
 class EtherboneRecord(Module):
-    def __init__(self, endianness="big"):
+    def __init__(self, endianness="big", rx_buffer_depth=256, tx_buffer_depth=256):
         self.sink = sink = stream.Endpoint(etherbone_packet_user_description(32))
         self.source = source = stream.Endpoint(etherbone_packet_user_description(32))
 
         # # #
 
-        # receive record, decode it and generate mmap stream
+        # receive records, decode them and generate mmap stream
+        self.submodules.splitter = splitter = EtherboneRecordSplitter()
         self.submodules.depacketizer = depacketizer = EtherboneRecordDepacketizer()
-        self.submodules.receiver = receiver = EtherboneRecordReceiver()
+        self.submodules.receiver = receiver = EtherboneRecordReceiver(rx_buffer_depth)
         self.comb += [
-            sink.connect(depacketizer.sink),
+            sink.connect(splitter.sink),
+            splitter.source.connect(depacketizer.sink),
             depacketizer.source.connect(receiver.sink)
         ]
         if endianness is "big":
             self.comb += receiver.sink.data.eq(reverse_bytes(depacketizer.source.data))
 
-        # receive mmap stream, encode it and send records
-        self.submodules.sender = sender = EtherboneRecordSender()
+        # receive mmap stream, encode it and send records, several per frame
+        self.submodules.sender = sender = EtherboneRecordSender(tx_buffer_depth)
         self.submodules.packetizer = packetizer = EtherboneRecordPacketizer()
         self.comb += [
             sender.source.connect(packetizer.sink),
-            packetizer.source.connect(source),
-            source.length.eq(etherbone_record_header.length +
-            	             (sender.source.wcount != 0)*4 + sender.source.wcount*4 +
-            	             (sender.source.rcount != 0)*4 + sender.source.rcount*4)
+            packetizer.source.connect(source, omit={"last"}),
+            source.last.eq(packetizer.source.last & sender.frame_last),
+            source.length.eq(sender.frame_length)
         ]
         if endianness is "big":
             self.comb += packetizer.sink.data.eq(reverse_bytes(sender.source.data))
@@ -536,24 +620,83 @@ class EtherboneRecord(Module):
 
 # etherbone wishbone
 
+# Reads are pipelined: the result of each read goes to a small response FIFO
+# from which it is sent, while the next read is already issued on the bus.
+#
+# Accesses to incrementing addresses use Wishbone registered feedback burst
+# cycles (CTI=010, linear BTE): a one word lookahead on the sink tells if
+# the next access continues the burst, so that a burst capable slave can ack
+# one word per cycle. Other slaves see classic cycles.
 class EtherboneWishboneMaster(Module):
-    def __init__(self):
+    def __init__(self, response_depth=4):
         self.sink = sink = stream.Endpoint(etherbone_mmap_description(32))
         self.source = source = stream.Endpoint(etherbone_mmap_description(32))
         self.bus = bus = wishbone.Interface()
 
         # # #
 
-        data = Signal(32)
-        data_update = Signal()
-        self.sync += If(data_update, data.eq(bus.dat_r))
+        # lookahead
+        current = stream.Endpoint(etherbone_mmap_description(32))
+        self.comb += sink.ready.eq(~current.valid | current.ready)
+        self.sync += \
+            If(sink.ready,
+                current.valid.eq(sink.valid),
+                current.last.eq(sink.last),
+                current.payload.raw_bits().eq(sink.payload.raw_bits())
+            )
+
+        # read responses
+        response_fifo = stream.SyncFIFO(etherbone_mmap_description(32), response_depth)
+        self.submodules += response_fifo
+        self.comb += [
+            response_fifo.source.connect(source),
+            response_fifo.sink.last.eq(current.last),
+            response_fifo.sink.base_addr.eq(current.base_addr),
+            response_fifo.sink.addr.eq(current.addr),
+            response_fifo.sink.count.eq(current.count),
+            response_fifo.sink.be.eq(current.be),
+            response_fifo.sink.we.eq(1),
+            response_fifo.sink.data.eq(bus.dat_r)
+        ]
+
+        # burst (cti is decided when an access starts and held until ack)
+        burst = Signal()
+        burst_next = Signal()
+        cti = Signal(3)
+        cti_next = Signal(3)
+        pending = Signal()
+        self.comb += [
+            burst_next.eq(~current.last &
+                          sink.valid &
+                          (sink.we == current.we) &
+                          (sink.addr == current.addr + 1) &
+                          (current.we | (response_fifo.level < response_depth - 1))),
+            If(burst_next,
+                cti_next.eq(0b010) # incrementing burst
+            ).Elif(burst,
+                cti_next.eq(0b111) # end of burst
+            ).Else(
+                cti_next.eq(0b000) # classic
+            ),
+            bus.cti.eq(Mux(pending, cti, cti_next)),
+            bus.bte.eq(0b00) # linear
+        ]
+        self.sync += [
+            If(bus.stb & ~bus.ack,
+                pending.eq(1),
+                cti.eq(bus.cti)
+            ).Else(
+                pending.eq(0)
+            ),
+            If(bus.stb & bus.ack,
+                burst.eq(bus.cti == 0b010)
+            )
+        ]
 
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
-            sink.ready.eq(1),
-            If(sink.valid,
-                sink.ready.eq(0),
-                If(sink.we,
+            If(current.valid,
+                If(current.we,
                     NextState("WRITE_DATA")
                 ).Else(
                     NextState("READ_DATA")
@@ -561,118 +704,537 @@ class EtherboneWishboneMaster(Module):
             )
         )
         fsm.act("WRITE_DATA",
-            bus.adr.eq(sink.addr),
-            bus.dat_w.eq(sink.data),
-            bus.sel.eq(sink.be),
-            bus.stb.eq(sink.valid),
+            bus.adr.eq(current.addr),
+            bus.dat_w.eq(current.data),
+            bus.sel.eq(current.be),
+            bus.stb.eq(current.valid),
             bus.we.eq(1),
             bus.cyc.eq(1),
             If(bus.stb & bus.ack,
-                sink.ready.eq(1),
-                If(sink.last,
+                current.ready.eq(1),
+                If(current.last,
                     NextState("IDLE")
                 )
             )
         )
         fsm.act("READ_DATA",
-            bus.adr.eq(sink.addr),
-            bus.sel.eq(sink.be),
-            bus.stb.eq(sink.valid),
+            bus.adr.eq(current.addr),
+            bus.sel.eq(current.be),
+            bus.stb.eq(current.valid & response_fifo.sink.ready),
             bus.cyc.eq(1),
             If(bus.stb & bus.ack,
-                data_update.eq(1),
-                NextState("SEND_DATA")
+                current.ready.eq(1),
+                response_fifo.sink.valid.eq(1),
+                If(current.last,
+                    NextState("IDLE")
+                )
             )
         )
-        fsm.act("SEND_DATA",
-            source.valid.eq(sink.valid),
-            source.last.eq(sink.last),
-            source.base_addr.eq(sink.base_addr),
-            source.addr.eq(sink.addr),
-            source.count.eq(sink.count),
-            source.be.eq(sink.be),
-            source.we.eq(1),
-            source.data.eq(data),
-            If(source.valid & source.ready,
-                sink.ready.eq(1),
-                If(source.last,
+
+
+# Read cache in front of an EtherboneWishboneSlave, for remote regions that
+# are polled (identifier, status, counters): a hit is acked locally instead
+# of paying a link round trip.
+#
+# Address windows (byte base and size) are configured by CSRs, each with
+# flags:
+# - bit 0 (cacheable): reads are served from the cache, misses fill it.
+# - bit 1 (prefetch): a miss fills the aligned block of prefetch words with
+#   a burst read, the slave keeps these reads in flight.
+# - bit 2 (read-only): the region does not change, its lines do not expire.
+# Accesses outside the windows, and all writes, go through to the slave. A
+# write invalidates the line of its address.
+#
+# Lines are single words (direct mapped) and expire ttl cycles after they
+# were filled (0: never). A sweep over the lines drops the expired ones so
+# that a line not accessed for 2**32 cycles is not seen as fresh again.
+# invalidate drops all the lines.
+class EtherboneWishboneCache(Module, AutoCSR):
+    def __init__(self, lines=64, windows=4, prefetch=4):
+        assert lines >= prefetch
+        self.bus = bus = wishbone.Interface()
+        self.slave = slave = wishbone.Interface()
+
+        self.ttl = CSRStorage(32)
+        self.invalidate = CSR()
+        self.hits = CSRStatus(32)
+        self.misses = CSRStatus(32)
+
+        # # #
+
+        index_bits = log2_int(lines)
+        prefetch_bits = log2_int(prefetch)
+
+        # windows
+        cacheable = Signal()
+        prefetchable = Signal()
+        read_only = Signal()
+        flags = Signal(3)
+        cases = []
+        for i in range(windows):
+            base = CSRStorage(32, name="window{}_base".format(i))
+            size = CSRStorage(32, name="window{}_size".format(i))
+            window_flags = CSRStorage(3, name="window{}_flags".format(i))
+            setattr(self, "window{}_base".format(i), base)
+            setattr(self, "window{}_size".format(i), size)
+            setattr(self, "window{}_flags".format(i), window_flags)
+            offset = Signal(32)
+            self.comb += offset.eq(Cat(Signal(2), bus.adr) - base.storage)
+            cases.append((offset < size.storage, window_flags.storage))
+        # first matching window
+        flags_mux = 0
+        for match, window_flags in reversed(cases):
+            flags_mux = Mux(match, window_flags, flags_mux)
+        self.comb += [
+            flags.eq(flags_mux),
+            cacheable.eq(flags[0]),
+            prefetchable.eq(flags[1]),
+            read_only.eq(flags[2])
+        ]
+
+        # lines
+        now = Signal(32)
+        self.sync += now.eq(now + 1)
+
+        line_layout = [
+            ("data",  32),
+            ("tag",   30 - index_bits),
+            ("stamp", 32),
+            ("keep",   1)
+        ]
+        mem = Memory(layout_len(line_layout), lines)
+        port = mem.get_port(write_capable=True, async_read=True)
+        sweep_port = mem.get_port(async_read=True)
+        self.specials += mem, port, sweep_port
+
+        line = Record(line_layout)
+        fill = Record(line_layout)
+        self.comb += [
+            line.raw_bits().eq(port.dat_r),
+            port.dat_w.eq(fill.raw_bits()),
+            fill.stamp.eq(now)
+        ]
+
+        valid = Array(Signal() for i in range(lines))
+        ttl = self.ttl.storage
+        fresh = Signal()
+        hit = Signal()
+        bus_read = Signal()
+        self.comb += [
+            bus_read.eq(bus.cyc & bus.stb & ~bus.we),
+            fresh.eq(line.keep | (ttl == 0) | (now - line.stamp < ttl)),
+            hit.eq(valid[bus.adr[:index_bits]] &
+                   (line.tag == bus.adr[index_bits:]) & fresh)
+        ]
+
+        # sweep of the expired lines
+        sweep_index = Signal(index_bits)
+        sweep_line = Record(line_layout)
+        expired = Signal()
+        self.comb += [
+            sweep_port.adr.eq(sweep_index),
+            sweep_line.raw_bits().eq(sweep_port.dat_r),
+            expired.eq(~sweep_line.keep & (ttl != 0) &
+                       (now - sweep_line.stamp >= ttl))
+        ]
+        self.sync += [
+            sweep_index.eq(sweep_index + 1),
+            If(expired, valid[sweep_index].eq(0))
+        ]
+
+        # accesses
+        fill_adr = Signal(30)
+        fill_keep = Signal()
+        fill_valid = Signal()
+        clear = Signal()
+        fill_last = Signal()
+        self.comb += fill_last.eq(fill_adr[:prefetch_bits] == prefetch - 1)
+        self.sync += [
+            If(self.invalidate.re,
+                [v.eq(0) for v in valid]
+            ).Else(
+                If(clear, valid[bus.adr[:index_bits]].eq(0)),
+                If(fill_valid, valid[port.adr].eq(1))
+            )
+        ]
+        self.comb += port.we.eq(fill_valid)
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            port.adr.eq(bus.adr[:index_bits]),
+            fill.tag.eq(bus.adr[index_bits:]),
+            fill.keep.eq(read_only),
+            fill.data.eq(slave.dat_r),
+            If(bus_read & cacheable & hit,
+                bus.ack.eq(1),
+                bus.dat_r.eq(line.data),
+                NextValue(self.hits.status, self.hits.status + 1)
+            ).Elif(bus_read & cacheable & prefetchable,
+                NextValue(fill_adr, Cat(Signal(prefetch_bits),
+                                        bus.adr[prefetch_bits:])),
+                NextValue(fill_keep, read_only),
+                NextValue(self.misses.status, self.misses.status + 1),
+                NextState("PREFETCH")
+            ).Else(
+                bus.connect(slave),
+                If(bus_read & cacheable,
+                    slave.cti.eq(0b000),
+                    If(slave.ack,
+                        fill_valid.eq(1),
+                        NextValue(self.misses.status, self.misses.status + 1)
+                    )
+                ),
+                If(bus.cyc & bus.stb & bus.we & slave.ack,
+                    clear.eq(1)
+                )
+            )
+        )
+        fsm.act("PREFETCH",
+            port.adr.eq(fill_adr[:index_bits]),
+            fill.tag.eq(fill_adr[index_bits:]),
+            fill.keep.eq(fill_keep),
+            fill.data.eq(slave.dat_r),
+            slave.cyc.eq(1),
+            slave.stb.eq(1),
+            slave.adr.eq(fill_adr),
+            slave.sel.eq(0b1111),
+            slave.cti.eq(Mux(fill_last, 0b111, 0b010)),
+            If(slave.ack,
+                fill_valid.eq(1),
+                # the bus master may be waiting for this word
+                If(bus_read & (bus.adr == fill_adr),
+                    bus.ack.eq(1),
+                    bus.dat_r.eq(slave.dat_r)
+                )
+            ),
+            If(slave.ack | slave.err,
+                NextValue(fill_adr, fill_adr + 1),
+                If(fill_last | slave.err,
                     NextState("IDLE")
-                ).Else(
-                    NextState("READ_DATA")
                 )
             )
         )
 
 
-class EtherboneWishboneSlave(Module):
-    def __init__(self):
-        self.bus = bus = wishbone.Interface()
+# Up to max_outstanding reads are kept in flight over the link, so that a
+# bus master doing incrementing burst reads (CTI=010) does not wait for a
+# link round trip on each word: each read request is tagged with a sequence
+# number in its return address, and the responses are checked against the
+# expected sequence and queued in order.
+#
+# Reads of a burst are issued ahead of the bus master, so that the data is
+# available when the bus master asks for it. The reads issued past the end
+# of the burst are dropped when their responses arrive: burst reads must only
+# target regions without read side effects (prefetchable). Classic cycles
+# only issue the current read.
+#
+# A read response that does not arrive within read_timeout cycles (lost or
+# corrupted on the link) abandons all the reads in flight and re-issues them
+# from the read the bus master is waiting for, up to max_retries times in a
+# row, then the read is terminated with a bus error. The late responses to
+# the abandoned reads are dropped thanks to spare sequence number bits.
+#
+# Writes are posted: they are acked as soon as they are buffered, and
+# writes to incrementing addresses with the same byte enables are coalesced
+# into one record of up to max_write_burst words. The record is moved to the
+# posted write FIFO (posted_depth words) on an address or byte enable
+# discontinuity, when full, after write_timeout cycles without a new write,
+# and before any read. Reads wait until the posted writes are sent, so that
+# they see the previous writes.
+#
+# The fill level of the posted write FIFO and the cycles bus writes (posted
+# FIFO full) and bus reads (posted writes draining) were stalled are
+# reported as CSRs, as well as the read timeouts and retries.
+#
+# With cache_lines, an EtherboneWishboneCache is inserted in front of the
+# bus.
+class EtherboneWishboneSlave(Module, AutoCSR):
+    def __init__(self, max_outstanding=4, max_write_burst=16, write_timeout=8,
+                 posted_depth=64, read_timeout=4096, max_retries=2,
+                 cache_lines=0, cache_windows=4, cache_prefetch=4):
+        assert posted_depth >= max_write_burst
+        if cache_lines:
+            self.submodules.cache = EtherboneWishboneCache(cache_lines,
+                                                           cache_windows,
+                                                           cache_prefetch)
+            self.bus = self.cache.bus
+            bus = self.cache.slave
+        else:
+            self.bus = bus = wishbone.Interface()
         self.sink = sink = stream.Endpoint(etherbone_mmap_description(32))
         self.source = source = stream.Endpoint(etherbone_mmap_description(32))
 
+        self.posted_level = CSRStatus(bits_for(posted_depth))
+        self.write_stalls = CSRStatus(32)
+        self.read_stalls = CSRStatus(32)
+        self.timeouts = CSRStatus(32)
+        self.retries = CSRStatus(32)
+
         # # #
 
-        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
-        fsm.act("IDLE",
+        seq_bits = bits_for(max_outstanding) + 4
+
+        writes_pending = Signal()
+        flush = Signal()
+        bus_read = Signal()
+        bus_write = Signal()
+        self.comb += [
+            bus_read.eq(bus.stb & bus.cyc & ~bus.we & ~writes_pending),
+            bus_write.eq(bus.stb & bus.cyc & bus.we)
+        ]
+
+        # sequence numbers of the next read to issue, to receive and to retire
+        # (acked or dropped)
+        issue_seq = Signal(seq_bits)
+        rx_seq = Signal(seq_bits)
+        retire_seq = Signal(seq_bits)
+        outstanding = Signal(seq_bits)
+        self.comb += outstanding.eq(issue_seq - retire_seq)
+
+        # responses
+        response_fifo = stream.SyncFIFO([("data", 32)], max_outstanding)
+        self.submodules += response_fifo
+        self.comb += [
             sink.ready.eq(1),
-            If(bus.stb & bus.cyc,
-                If(bus.we,
-                    NextState("SEND_WRITE")
+            response_fifo.sink.valid.eq(sink.valid & sink.we &
+                                        (sink.addr[:seq_bits] == rx_seq)),
+            response_fifo.sink.data.eq(sink.data)
+        ]
+
+        # reads
+        active = Signal()   # reads issued from issue_adr, acked from ack_adr
+        prefetch = Signal() # burst, issue ahead of the bus master
+        issue_adr = Signal(30)
+        issue_sel = Signal(4)
+        ack_adr = Signal(30)
+        stale = Signal(seq_bits)
+        hit = Signal()
+        new_read = Signal()
+        issue = Signal()
+        holding = Signal()  # read request presented on source, not accepted
+        retire = Signal()
+        timeout = Signal()
+        give_up = Signal()
+        self.comb += [
+            hit.eq(active & (bus.adr == ack_adr)),
+            # a new read waits for the request being presented to be accepted
+            new_read.eq(bus_read & ~hit & ~holding),
+            issue.eq(active & ~bus_write & ~writes_pending & ~(bus_read & ~hit) &
+                     ~timeout & (outstanding < max_outstanding) &
+                     (prefetch | (bus_read & hit & (issue_adr == ack_adr)))),
+            If(response_fifo.source.valid,
+                If(stale != 0,
+                    response_fifo.source.ready.eq(1)
+                ).Elif(bus_read & hit,
+                    response_fifo.source.ready.eq(1),
+                    bus.ack.eq(1),
+                    bus.dat_r.eq(response_fifo.source.data)
+                )
+            ),
+            retire.eq(response_fifo.source.valid & response_fifo.source.ready)
+        ]
+
+        # timeout of the oldest read waiting for its response
+        timer = Signal(max=read_timeout + 1)
+        retry_count = Signal(max=max_retries + 1)
+        self.comb += [
+            timeout.eq((timer == read_timeout) & ~response_fifo.sink.valid &
+                       ~retire & ~(bus_read & ~hit) & ~holding),
+            give_up.eq(retry_count == max_retries),
+            If(timeout & give_up & bus_read & hit,
+                bus.err.eq(1)
+            )
+        ]
+        self.sync += [
+            If((issue_seq == rx_seq) | response_fifo.sink.valid | timeout,
+                timer.eq(0)
+            ).Elif(timer != read_timeout,
+                timer.eq(timer + 1)
+            ),
+            If((bus_read & ~hit) | (bus.ack & ~bus.we),
+                retry_count.eq(0)
+            ).Elif(timeout & active,
+                If(give_up,
+                    retry_count.eq(0)
                 ).Else(
-                    NextState("SEND_READ")
+                    retry_count.eq(retry_count + 1)
                 )
             )
-        )
-        fsm.act("SEND_WRITE",
-            source.valid.eq(1),
-            source.last.eq(1),
-            source.base_addr[2:].eq(bus.adr),
-            source.count.eq(1),
-            source.be.eq(bus.sel),
-            source.we.eq(1),
-            source.data.eq(bus.dat_w),
-            If(source.valid & source.ready,
-                bus.ack.eq(1),
-                NextState("IDLE")
+        ]
+
+        self.sync += [
+            If(timeout,
+                # abandon the reads in flight, drop the received responses
+                rx_seq.eq(issue_seq),
+                retire_seq.eq(retire_seq + issue_seq - rx_seq)
+            ).Else(
+                If(response_fifo.sink.valid, rx_seq.eq(rx_seq + 1)),
+                If(retire, retire_seq.eq(retire_seq + 1))
+            ),
+            If(new_read,
+                # new read: drop the responses of the reads still in flight
+                active.eq(1),
+                prefetch.eq(bus.cti == 0b010),
+                issue_adr.eq(bus.adr),
+                issue_sel.eq(bus.sel),
+                ack_adr.eq(bus.adr),
+                stale.eq(outstanding - retire)
+            ).Else(
+                If(retire & (stale != 0), stale.eq(stale - 1)),
+                If(bus_write | ~bus.cyc, active.eq(0)),
+                If(bus_read & (bus.cti != 0b010), prefetch.eq(0)),
+                If(bus.ack & ~bus.we,
+                    ack_adr.eq(ack_adr + 1),
+                    If(bus.cti != 0b010, active.eq(0))
+                ),
+                If(source.valid & source.ready & ~source.we,
+                    issue_seq.eq(issue_seq + 1),
+                    issue_adr.eq(issue_adr + 1)
+                ),
+                If(timeout,
+                    stale.eq(rx_seq - retire_seq),
+                    issue_adr.eq(ack_adr),
+                    If(give_up, active.eq(0))
+                )
             )
-        )
-        fsm.act("SEND_READ",
-            source.valid.eq(1),
-            source.last.eq(1),
-            source.base_addr.eq(0),
-            source.count.eq(1),
-            source.be.eq(bus.sel),
-            source.we.eq(0),
-            source.data[2:].eq(bus.adr),
-            If(source.valid & source.ready,
-                NextState("WAIT_READ")
+        ]
+
+        # write coalescing
+        write_fifo = stream.SyncFIFO([("data", 32)], max_write_burst)
+        posted_fifo = stream.SyncFIFO(etherbone_mmap_description(32), posted_depth)
+        self.submodules += write_fifo, posted_fifo
+
+        write_base = Signal(30)
+        write_be = Signal(4)
+        write_count = Signal(max=max_write_burst + 1)
+        write_timer = Signal(max=write_timeout + 1)
+        write_accept = Signal()
+        coalescing = Signal()
+        self.comb += [
+            coalescing.eq(write_count != 0),
+            writes_pending.eq(coalescing | posted_fifo.source.valid),
+            write_accept.eq(bus_write & ~flush &
+                (~coalescing |
+                 ((bus.adr == write_base + write_count) &
+                  (bus.sel == write_be) &
+                  (write_count != max_write_burst)))),
+            If(write_accept,
+                bus.ack.eq(1)
+            ),
+            write_fifo.sink.valid.eq(write_accept),
+            write_fifo.sink.data.eq(bus.dat_w)
+        ]
+        self.sync += [
+            If(write_accept,
+                If(~coalescing,
+                    write_base.eq(bus.adr),
+                    write_be.eq(bus.sel)
+                ),
+                write_count.eq(write_count + 1),
+                write_timer.eq(0)
+            ).Elif(coalescing & ~flush,
+                write_timer.eq(write_timer + 1)
+            ),
+            If(flush,
+                If(posted_fifo.sink.valid & posted_fifo.sink.ready & posted_fifo.sink.last,
+                    flush.eq(0),
+                    write_count.eq(0)
+                )
+            ).Elif(coalescing &
+                   ((bus_write & ~write_accept) |
+                    (bus.stb & bus.cyc & ~bus.we) |
+                    (write_timer == write_timeout) |
+                    (write_count == max_write_burst)),
+                flush.eq(1)
             )
-        )
-        fsm.act("WAIT_READ",
-            sink.ready.eq(1),
-            If(sink.valid & sink.we,
-                bus.ack.eq(1),
-                bus.dat_r.eq(sink.data),
-                NextState("IDLE")
+        ]
+
+        self.comb += [
+            If(flush,
+                posted_fifo.sink.valid.eq(write_fifo.source.valid),
+                posted_fifo.sink.last.eq(write_fifo.level == 1),
+                posted_fifo.sink.count.eq(write_count),
+                posted_fifo.sink.be.eq(write_be),
+                posted_fifo.sink.we.eq(1),
+                posted_fifo.sink.base_addr[2:].eq(write_base),
+                posted_fifo.sink.data.eq(write_fifo.source.data),
+                write_fifo.source.ready.eq(posted_fifo.sink.ready)
             )
-        )
+        ]
+
+        # posted writes are sent first, reads are only issued once they are
+        # all sent. A read request is held until accepted (the reads issued
+        # ahead of the bus master use the byte enables of the burst).
+        self.comb += [
+            If(posted_fifo.source.valid & ~holding,
+                posted_fifo.source.connect(source)
+            ).Else(
+                source.valid.eq(issue | holding),
+                source.last.eq(1),
+                source.count.eq(1),
+                source.be.eq(issue_sel),
+                source.we.eq(0),
+                source.base_addr[2:].eq(issue_seq),
+                source.data[2:].eq(issue_adr)
+            )
+        ]
+        self.sync += holding.eq(source.valid & ~source.ready & ~source.we)
+
+        # status
+        write_stalls = self.write_stalls.status
+        read_stalls = self.read_stalls.status
+        timeouts = self.timeouts.status
+        retries = self.retries.status
+        self.comb += self.posted_level.status.eq(posted_fifo.level)
+        self.sync += [
+            If(timeout,
+                timeouts.eq(timeouts + 1),
+                If(active & ~give_up,
+                    retries.eq(retries + 1)
+                )
+            ),
+            If(bus_write & ~write_accept,
+                write_stalls.eq(write_stalls + 1)
+            ),
+            If(bus.stb & bus.cyc & ~bus.we & writes_pending,
+                read_stalls.eq(read_stalls + 1)
+            )
+        ]
 
 
 # etherbone
 
-class Etherbone(Module):
-    def __init__(self, mode="master"):
-        self.sink = sink = stream.Endpoint(user_description(32))
-        self.source = source = stream.Endpoint(user_description(32))
+# The record and Wishbone layers are 32-bit, a wider packet Core (dw) is
+# connected through width converters. Etherbone(dw=N) must be paired with
+# packet.Core(dw=N): the widths are not checked, a mismatched pair elaborates
+# silently and only returns zeros.
+class Etherbone(Module, AutoCSR):
+    def __init__(self, mode="master", rx_buffer_depth=256, tx_buffer_depth=256,
+                 cache_lines=0, dw=32, read_timeout=4096, max_retries=2):
+        self.sink = sink = stream.Endpoint(user_description(dw))
+        self.source = source = stream.Endpoint(user_description(dw))
 
         # # #
 
-        self.submodules.packet = EtherbonePacket(source, sink)
-        self.submodules.record = EtherboneRecord()
+        if dw == 32:
+            self.submodules.packet = EtherbonePacket(source, sink)
+        else:
+            self.submodules.tx_converter = UserConverter(32, dw)
+            self.submodules.rx_converter = UserConverter(dw, 32)
+            self.comb += [
+                self.tx_converter.source.connect(source),
+                sink.connect(self.rx_converter.sink)
+            ]
+            self.submodules.packet = EtherbonePacket(self.tx_converter.sink,
+                                                     self.rx_converter.source)
+        self.submodules.record = EtherboneRecord(rx_buffer_depth=rx_buffer_depth,
+                                                 tx_buffer_depth=tx_buffer_depth)
         if mode == "master":
             self.submodules.wishbone = EtherboneWishboneMaster()
         elif mode == "slave":
-            self.submodules.wishbone = EtherboneWishboneSlave()
+            self.submodules.wishbone = EtherboneWishboneSlave(
+                read_timeout=read_timeout, max_retries=max_retries,
+                cache_lines=cache_lines)
         else:
             raise ValueError
 
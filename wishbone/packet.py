@@ -170,51 +170,46 @@ class UserPort(SlavePort):
         SlavePort.__init__(self, dw, tag)
 
 
+# Packet description
+#   - preamble : 4 bytes
+#   - unused   : 3 bytes
+#   - dst      : 1 byte
+#   - length   : 4 bytes (payload, in bytes)
+#   - padding  : up to a multiple of the data width
+#   - payload
+packet_preamble = 0x5aa55aa5
+
+
 class Packetizer(Module):
-    def __init__(self):
-        self.sink = sink = stream.Endpoint(user_description(32))
-        self.source = source = stream.Endpoint(phy_description(32))
+    def __init__(self, dw=32):
+        self.sink = sink = stream.Endpoint(user_description(dw))
+        self.source = source = stream.Endpoint(phy_description(dw))
 
         # # #
 
-        # Packet description
-        #   - preamble : 4 bytes
-        #   - unused   : 3 bytes
-        #   - dst      : 1 byte
-        #   - length   : 4 bytes
-        #   - payload
-        header = [
-            # preamble
-            0x5aa55aa5,
-            # dst
-            sink.dst,
-            # length
-            sink.length
-        ]
+        header_words = ceil(packet_header_length*8/dw)
+        header = Signal(header_words*dw)
+        self.comb += header.eq(Cat(Constant(packet_preamble, 32),
+                                   sink.dst, Constant(0, 24),
+                                   sink.length))
 
-        header_unpack = stream.Unpack(len(header), phy_description(32))
-        self.submodules += header_unpack
+        counter = Signal(max=max(header_words, 2))
 
-        for i, byte in enumerate(header):
-            chunk = getattr(header_unpack.sink.payload, "chunk" + str(i))
-            self.comb += chunk.data.eq(byte)
-
-        fsm = FSM(reset_state="IDLE")
+        # the header is sent as soon as a packet is available, and right
+        # after the last word of the previous packet
+        fsm = FSM(reset_state="INSERT_HEADER")
         self.submodules += fsm
 
-        fsm.act("IDLE",
-            If(sink.valid,
-                NextState("INSERT_HEADER")
-            )
-        )
-
         fsm.act("INSERT_HEADER",
-            header_unpack.sink.valid.eq(1),
-            source.valid.eq(1),
-            source.data.eq(header_unpack.source.data),
-            header_unpack.source.ready.eq(source.ready),
-            If(header_unpack.sink.ready,
-                NextState("COPY")
+            source.valid.eq(sink.valid),
+            source.data.eq(Array(header[i*dw:(i+1)*dw]
+                                 for i in range(header_words))[counter]),
+            If(source.valid & source.ready,
+                NextValue(counter, counter + 1),
+                If(counter == header_words - 1,
+                    NextValue(counter, 0),
+                    NextState("COPY")
+                )
             )
         )
 
@@ -222,72 +217,64 @@ class Packetizer(Module):
             source.valid.eq(sink.valid),
             source.data.eq(sink.data),
             sink.ready.eq(source.ready),
-            If(source.ready & sink.last,
-                NextState("IDLE")
+            If(source.valid & source.ready & sink.last,
+                NextState("INSERT_HEADER")
             )
         )
 
 
 class Depacketizer(Module):
-    def __init__(self, clk_freq, timeout=10):
-        self.sink = sink = stream.Endpoint(phy_description(32))
-        self.source = source = stream.Endpoint(user_description(32))
+    def __init__(self, clk_freq, timeout=10, dw=32):
+        self.sink = sink = stream.Endpoint(phy_description(dw))
+        self.source = source = stream.Endpoint(user_description(dw))
 
         # # #
 
-        # Packet description
-        #   - preamble : 4 bytes
-        #   - unused   : 3 bytes
-        #   - dst      : 1 byte
-        #   - length   : 4 bytes
-        #   - payload
-        preamble = Signal(32)
-
-        header = [
-            # dst
-            source.dst,
-            # length
-            source.length
+        header_words = ceil(packet_header_length*8/dw)
+        header = Signal(header_words*dw)
+        shift = Signal()
+        if header_words == 1:
+            self.sync += If(shift, header.eq(sink.data))
+        else:
+            self.sync += If(shift, header.eq(Cat(header[dw:], sink.data)))
+        self.comb += [
+            source.dst.eq(header[32:40]),
+            source.length.eq(header[64:96])
         ]
 
-        header_pack = ResetInserter()(stream.Pack(phy_description(32), len(header)))
-        self.submodules += header_pack
-
-        for i, byte in enumerate(header):
-            chunk = getattr(header_pack.source.payload, "chunk" + str(i))
-            self.comb += byte.eq(chunk.data)
+        counter = Signal(max=max(header_words, 2))
 
         fsm = FSM(reset_state="IDLE")
         self.submodules += fsm
 
-        self.comb += preamble.eq(sink.data)
         fsm.act("IDLE",
             sink.ready.eq(1),
-            If((sink.data == 0x5aa55aa5) & sink.valid,
-                   NextState("RECEIVE_HEADER")
-            ),
-            header_pack.source.ready.eq(1)
+            NextValue(counter, 0),
+            If((sink.data[:32] == packet_preamble) & sink.valid,
+                shift.eq(1),
+                NextState("COPY" if header_words == 1 else "RECEIVE_HEADER")
+            )
         )
 
         self.submodules.timer = WaitTimer(clk_freq*timeout)
         self.comb += self.timer.wait.eq(~fsm.ongoing("IDLE"))
 
         fsm.act("RECEIVE_HEADER",
-            header_pack.sink.valid.eq(sink.valid),
-            header_pack.sink.payload.eq(sink.payload),
             If(self.timer.done,
                 NextState("IDLE")
-            ).Elif(header_pack.source.valid,
-                NextState("COPY")
-            ).Else(
-                sink.ready.eq(1)
+            ).Elif(sink.valid,
+                sink.ready.eq(1),
+                shift.eq(1),
+                NextValue(counter, counter + 1),
+                If(counter == header_words - 2,
+                    NextState("COPY")
+                )
             )
         )
 
-        self.comb += header_pack.reset.eq(self.timer.done)
-
         last = Signal()
         cnt = Signal(32)
+        words = Signal(32)
 
         fsm.act("COPY",
             source.valid.eq(sink.valid),
@@ -305,17 +292,74 @@ class Depacketizer(Module):
             ).Elif(source.valid & source.ready,
                 cnt.eq(cnt + 1)
             )
-        self.comb += last.eq(cnt == source.length[2:] - 1)
+        self.comb += [
+            words.eq((source.length + dw//8 - 1)[log2_int(dw//8):]),
+            last.eq(cnt == words - 1)
+        ]
+
+
+# Converts the data width of a packet user stream, e.g. to connect a 32-bit
+# user to a wider Core. dst and length are kept with each packet, the
+# padding of the last word of a packet (from length) is dropped when
+# converting to a narrower width.
+class UserConverter(Module):
+    def __init__(self, dw_from, dw_to):
+        self.sink = sink = stream.Endpoint(user_description(dw_from))
+        self.source = source = stream.Endpoint(user_description(dw_to))
+
+        # # #
+
+        converter = stream.Converter(dw_from, dw_to)
+        self.submodules += converter
+        self.comb += sink.connect(converter.sink, omit={"dst", "length"})
+
+        if dw_from < dw_to:
+            # params of the packet, latched on its first word
+            first = Signal(reset=1)
+            self.sync += \
+                If(sink.valid & sink.ready,
+                    first.eq(sink.last),
+                    If(first,
+                        source.dst.eq(sink.dst),
+                        source.length.eq(sink.length)
+                    )
+                )
+            self.comb += converter.source.connect(source)
+        else:
+            count = Signal(32)
+            words = Signal(32)
+            self.comb += [
+                words.eq((sink.length + dw_to//8 - 1)[log2_int(dw_to//8):]),
+                source.dst.eq(sink.dst),
+                source.length.eq(sink.length),
+                source.data.eq(converter.source.data),
+                If(count < words,
+                    source.valid.eq(converter.source.valid),
+                    source.last.eq(converter.source.last | (count == words - 1)),
+                    converter.source.ready.eq(source.ready)
+                ).Else(
+                    converter.source.ready.eq(1)
+                )
+            ]
+            self.sync += \
+                If(converter.source.valid & converter.source.ready,
+                    If(converter.source.last,
+                        count.eq(0)
+                    ).Else(
+                        count.eq(count + 1)
+                    )
+                )
 
 
 class Crossbar(Module):
-    def __init__(self):
+    def __init__(self, dw=32):
+        self.dw = dw
         self.users = OrderedDict()
-        self.master = MasterPort(32)
+        self.master = MasterPort(dw)
         self.dispatch_param = "dst"
 
     def get_port(self, dst):
-        port = UserPort(32, dst)
+        port = UserPort(self.dw, dst)
         if dst in self.users.keys():
             raise ValueError("Destination {0:#x} already assigned".format(dst))
         self.users[dst] = port
@@ -340,9 +384,9 @@ class Crossbar(Module):
 
 
 class Core(Module):
-    def __init__(self, clk_freq):
-        self.sink = sink = stream.Endpoint(phy_description(32))
-        self.source = source = stream.Endpoint(phy_description(32))
+    def __init__(self, clk_freq, dw=32):
+        self.sink = sink = stream.Endpoint(phy_description(dw))
+        self.source = source = stream.Endpoint(phy_description(dw))
 
         # # #
 
@@ -350,13 +394,13 @@ class Core(Module):
         tx_pipeline = [source]
 
         # depacketizer / packetizer
-        self.submodules.depacketizer = Depacketizer(clk_freq)
-        self.submodules.packetizer = Packetizer()
+        self.submodules.depacketizer = Depacketizer(clk_freq, dw=dw)
+        self.submodules.packetizer = Packetizer(dw)
         rx_pipeline += [self.depacketizer]
         tx_pipeline += [self.packetizer]
 
         # crossbar
-        self.submodules.crossbar = Crossbar()
+        self.submodules.crossbar = Crossbar(dw)
         rx_pipeline += [self.crossbar.master]
         tx_pipeline += [self.crossbar.master]
 
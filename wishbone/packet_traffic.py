@@ -0,0 +1,240 @@
+from migen import *
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.csr import *
+
+from wishbone.packet import user_description
+
+
+# Packet traffic generator/checker, to be connected to a packet.Core port.
+#
+# Packet payload:
+#   - sequence number : 4 bytes
+#   - timestamp       : 4 bytes (cycle counter at the start of the packet)
+#   - PRBS            : length - 8 bytes (xorshift32 seeded by the sequence
+#                       number, so that each packet can be checked alone)
+# length is in bytes, it is rounded up to a multiple of 4 (the Depacketizer
+# rounds the word count up) and clamped to 8..65532.
+# gap is the number of idle cycles between packets.
+#
+# Latencies are only meaningful when generator and checker run from the same
+# clock and reset (e.g. loopback, or both ends in the same FPGA).
+
+
+class _PRBSWord(Module):
+    def __init__(self):
+        self.seed = Signal(32)
+        self.load = Signal()
+        self.ce = Signal()
+        self.o = Signal(32)
+
+        # # #
+
+        a = Signal(32)
+        b = Signal(32)
+        c = Signal(32)
+        self.comb += [
+            a.eq(self.o ^ (self.o << 13)),
+            b.eq(a ^ (a >> 17)),
+            c.eq(b ^ (b << 5))
+        ]
+        self.sync += \
+            If(self.load,
+                # never seed with 0
+                self.o.eq(Cat(self.seed[:31], 1))
+            ).Elif(self.ce,
+                self.o.eq(c)
+            )
+
+
+class PacketTrafficGenerator(Module, AutoCSR):
+    def __init__(self):
+        self.source = source = stream.Endpoint(user_description(32))
+
+        self.enable = CSRStorage()
+        self.dst = CSRStorage(8)
+        self.length = CSRStorage(16, reset=1024)
+        self.gap = CSRStorage(32)
+        self.packets = CSRStatus(32)
+
+        # # #
+
+        timestamp = Signal(32)
+        self.sync += timestamp.eq(timestamp + 1)
+
+        seq = Signal(32)
+        start = Signal(32)
+        self.comb += self.packets.status.eq(seq)
+
+        prbs = _PRBSWord()
+        self.submodules += prbs
+
+        length = Signal(16)
+        words = Signal(14)
+        count = Signal(14)
+        gap = Signal(32)
+        self.comb += [
+            If(self.length.storage < 8,
+                length.eq(8)
+            ).Elif(self.length.storage > 65532,
+                length.eq(65532)
+            ).Else(
+                length.eq(Cat(C(0, 2),
+                    self.length.storage[2:] + (self.length.storage[:2] != 0)))
+            ),
+            words.eq(length[2:]),
+            source.dst.eq(self.dst.storage),
+            source.length.eq(length),
+            source.last.eq(count == words - 1),
+            If(count == 0,
+                source.data.eq(seq)
+            ).Elif(count == 1,
+                source.data.eq(start)
+            ).Else(
+                source.data.eq(prbs.o)
+            )
+        ]
+
+        fsm = FSM(reset_state="IDLE")
+        self.submodules += fsm
+
+        # without gap, the next packet starts right after the last word
+        self.comb += prbs.seed.eq(Mux(fsm.ongoing("SEND"), seq + 1, seq))
+
+        fsm.act("IDLE",
+            NextValue(count, 0),
+            If(self.enable.storage,
+                prbs.load.eq(1),
+                NextValue(start, timestamp),
+                NextState("SEND")
+            )
+        )
+        fsm.act("SEND",
+            source.valid.eq(1),
+            If(source.ready,
+                NextValue(count, count + 1),
+                prbs.ce.eq(count >= 2),
+                If(source.last,
+                    NextValue(seq, seq + 1),
+                    NextValue(gap, self.gap.storage - 1),
+                    If(self.gap.storage == 0,
+                        If(self.enable.storage,
+                            prbs.load.eq(1),
+                            NextValue(count, 0),
+                            NextValue(start, timestamp)
+                        ).Else(
+                            NextState("IDLE")
+                        )
+                    ).Else(
+                        NextState("GAP")
+                    )
+                )
+            )
+        )
+        # the last gap cycle starts the next packet as IDLE does
+        fsm.act("GAP",
+            NextValue(gap, gap - 1),
+            If(gap == 0,
+                NextValue(count, 0),
+                If(self.enable.storage,
+                    prbs.load.eq(1),
+                    NextValue(start, timestamp),
+                    NextState("SEND")
+                ).Else(
+                    NextState("IDLE")
+                )
+            )
+        )
+
+
+class PacketTrafficChecker(Module, AutoCSR):
+    def __init__(self):
+        self.sink = sink = stream.Endpoint(user_description(32))
+
+        self.reset = CSR()
+        self.packets = CSRStatus(32)
+        self.bytes = CSRStatus(64)
+        self.drops = CSRStatus(32)
+        self.reorders = CSRStatus(32)
+        self.errors = CSRStatus(32)
+        self.latency_min = CSRStatus(32, reset=2**32-1)
+        self.latency_max = CSRStatus(32)
+        self.latency_sum = CSRStatus(64)
+
+        # # #
+
+        timestamp = Signal(32)
+        self.sync += timestamp.eq(timestamp + 1)
+
+        packets = self.packets.status
+        nbytes = self.bytes.status
+        drops = self.drops.status
+        reorders = self.reorders.status
+        errors = self.errors.status
+        latency_min = self.latency_min.status
+        latency_max = self.latency_max.status
+        latency_sum = self.latency_sum.status
+
+        prbs = _PRBSWord()
+        self.submodules += prbs
+        self.comb += prbs.seed.eq(sink.data)
+
+        count = Signal(14)
+        first = Signal(reset=1)
+        seq = Signal(32)
+        expected = Signal(32)
+        latency = Signal(32)
+        self.comb += [
+            sink.ready.eq(1),
+            latency.eq(timestamp - sink.data)
+        ]
+
+        self.sync += [
+            If(sink.valid,
+                If(sink.last,
+                    count.eq(0)
+                ).Else(
+                    count.eq(count + 1)
+                ),
+                If(count == 0,
+                    seq.eq(sink.data)
+                ),
+                If(count == 1,
+                    If(latency < latency_min, latency_min.eq(latency)),
+                    If(latency > latency_max, latency_max.eq(latency)),
+                    latency_sum.eq(latency_sum + latency)
+                ),
+                If((count >= 2) & (sink.data != prbs.o),
+                    errors.eq(errors + 1)
+                ),
+                If(sink.last,
+                    packets.eq(packets + 1),
+                    nbytes.eq(nbytes + sink.length),
+                    first.eq(0),
+                    If(first | (seq == expected),
+                        expected.eq(seq + 1)
+                    ).Elif(seq > expected,
+                        drops.eq(drops + seq - expected),
+                        expected.eq(seq + 1)
+                    ).Else(
+                        reorders.eq(reorders + 1)
+                    )
+                )
+            ),
+            If(self.reset.re,
+                count.eq(0),
+                first.eq(1),
+                packets.eq(0),
+                nbytes.eq(0),
+                drops.eq(0),
+                reorders.eq(0),
+                errors.eq(0),
+                latency_min.eq(2**32-1),
+                latency_max.eq(0),
+                latency_sum.eq(0)
+            )
+        ]
+        self.comb += [
+            prbs.load.eq(sink.valid & (count == 0)),
+            prbs.ce.eq(sink.valid & (count >= 2))
+        ]
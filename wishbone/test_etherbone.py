@@ -12,12 +12,14 @@ from litex.soc.interconnect.wishbone import SRAM
 from litex.soc.interconnect.stream import Converter
 
 
+# Etherbone and packet.Core must have the same dw.
 class DUT(Module):
-    def __init__(self):
+    def __init__(self, dw=32, rx_buffer_depth=256, tx_buffer_depth=256):
         # wishbone slave
-        slave_core = packet.Core(int(100e6))
+        slave_core = packet.Core(int(100e6), dw)
         slave_port = slave_core.crossbar.get_port(0x01)
-        slave_etherbone = etherbone.Etherbone(mode="slave")
+        slave_etherbone = etherbone.Etherbone(mode="slave", cache_lines=16, dw=dw,
+            rx_buffer_depth=rx_buffer_depth, tx_buffer_depth=tx_buffer_depth)
         self.submodules += slave_core, slave_etherbone
         self.comb += [
             slave_port.source.connect(slave_etherbone.sink),
@@ -25,9 +27,10 @@ class DUT(Module):
         ]
 
         # wishbone master
-        master_core = packet.Core(int(100e6))
+        master_core = packet.Core(int(100e6), dw)
         master_port = master_core.crossbar.get_port(0x01)
-        master_etherbone = etherbone.Etherbone(mode="master")
+        master_etherbone = etherbone.Etherbone(mode="master", dw=dw,
+            rx_buffer_depth=rx_buffer_depth, tx_buffer_depth=tx_buffer_depth)
         master_sram = SRAM(1024, bus=master_etherbone.wishbone.bus)
         self.submodules += master_core, master_etherbone, master_sram
         self.comb += [
@@ -36,11 +39,11 @@ class DUT(Module):
         ]
 
         # connect core directly with converters in the loop
-        s2m_downconverter = Converter(32, 16)
-        s2m_upconverter = Converter(16, 32)
+        s2m_downconverter = Converter(dw, 16)
+        s2m_upconverter = Converter(16, dw)
         self.submodules += s2m_downconverter, s2m_upconverter
-        m2s_downconverter = Converter(32, 16)
-        m2s_upconverter = Converter(16, 32)
+        m2s_downconverter = Converter(dw, 16)
+        m2s_upconverter = Converter(16, dw)
         self.submodules += m2s_upconverter, m2s_downconverter
         self.comb += [
         	slave_core.source.connect(s2m_downconverter.sink),
@@ -54,13 +57,256 @@ class DUT(Module):
 
         # expose wishbone slave
         self.wishbone = slave_etherbone.wishbone.bus
+        self.cache = slave_etherbone.wishbone.cache
+        self.mem = master_sram.mem
+
+def burst_read(bus, adr, length):
+    datas = []
+    yield bus.cyc.eq(1)
+    yield bus.stb.eq(1)
+    yield bus.we.eq(0)
+    yield bus.sel.eq(0b1111)
+    for i in range(length):
+        yield bus.adr.eq(adr + i)
+        yield bus.cti.eq(0b010 if i < length - 1 else 0b111)
+        yield
+        while not (yield bus.ack):
+            yield
+        datas.append((yield bus.dat_r))
+    yield bus.cyc.eq(0)
+    yield bus.stb.eq(0)
+    yield bus.cti.eq(0)
+    yield
+    return datas
+
+# cache hits and misses, since stats if given
+def cache_stats(dut, stats=(0, 0)):
+    yield
+    hits = (yield dut.cache.hits.status)
+    misses = (yield dut.cache.misses.status)
+    return hits - stats[0], misses - stats[1]
 
 def main_generator(dut):
+    errors = 0
+
+    # classic cycles
     for i in range(8):
         yield from dut.wishbone.write(0x100 + i, i)
     for i in range(8):
         data = (yield from dut.wishbone.read(0x100 + i))
         print("0x{:08x}".format(data))
+        if data != i:
+            errors += 1
+
+    # burst reads (issued ahead of the bus master)
+    for i in range(16):
+        yield from dut.wishbone.write(0x110 + i, 0x1000 + i)
+    datas = (yield from burst_read(dut.wishbone, 0x110, 16))
+    print("burst: " + " ".join("0x{:08x}".format(data) for data in datas))
+    if datas != [0x1000 + i for i in range(16)]:
+        errors += 1
+
+    # cache: window 0 is cacheable, the second read is a hit and does not
+    # see a remote change until the lines are invalidated
+    yield dut.cache.window0_base.storage.eq(0x100*4)
+    yield dut.cache.window0_size.storage.eq(8*4)
+    yield dut.cache.window0_flags.storage.eq(0b001)
+    datas = []
+    datas.append((yield from dut.wishbone.read(0x102)))
+    yield dut.mem[0x102 % dut.mem.depth].eq(0x1234)
+    datas.append((yield from dut.wishbone.read(0x102)))
+    yield dut.cache.invalidate.re.eq(1)
+    yield
+    yield dut.cache.invalidate.re.eq(0)
+    datas.append((yield from dut.wishbone.read(0x102)))
+    yield
+    hits = (yield dut.cache.hits.status)
+    misses = (yield dut.cache.misses.status)
+    print("cache: " + " ".join("0x{:08x}".format(data) for data in datas) +
+          " hits: {} misses: {}".format(hits, misses))
+    if datas != [2, 2, 0x1234] or hits != 1 or misses != 2:
+        errors += 1
+
+    for i in range(4):
+        yield from dut.wishbone.write(0x120 + i, 0x2000 + i)
+    yield from dut.wishbone.write(0x138, 0x3000)
+
+    # prefetch: window 1 fills the aligned block of 4 words on a miss, the
+    # other words of the block are hits (and do not see a remote change)
+    yield dut.cache.window1_base.storage.eq(0x120*4)
+    yield dut.cache.window1_size.storage.eq(8*4)
+    yield dut.cache.window1_flags.storage.eq(0b011)
+    stats = (yield from cache_stats(dut))
+    datas = []
+    for adr in [0x121, 0x120, 0x122, 0x123]:
+        datas.append((yield from dut.wishbone.read(adr)))
+    yield dut.mem[0x122 % dut.mem.depth].eq(0x5678)
+    datas.append((yield from dut.wishbone.read(0x122)))
+    hits, misses = (yield from cache_stats(dut, stats))
+    print("prefetch: " + " ".join("0x{:08x}".format(data) for data in datas) +
+          " hits: {} misses: {}".format(hits, misses))
+    if datas != [0x2001, 0x2000, 0x2002, 0x2003, 0x2002] or hits != 4 or misses != 1:
+        errors += 1
+
+    # read-only: a write to window 2 goes to the remote and invalidates the
+    # line, the next read is a miss
+    yield dut.cache.window2_base.storage.eq(0x138*4)
+    yield dut.cache.window2_size.storage.eq(8*4)
+    yield dut.cache.window2_flags.storage.eq(0b101)
+    stats = (yield from cache_stats(dut))
+    datas = []
+    datas.append((yield from dut.wishbone.read(0x138)))
+    datas.append((yield from dut.wishbone.read(0x138)))
+    yield from dut.wishbone.write(0x138, 0x3001)
+    datas.append((yield from dut.wishbone.read(0x138)))
+    datas.append((yield dut.mem[0x138 % dut.mem.depth]))
+    hits, misses = (yield from cache_stats(dut, stats))
+    print("read-only: " + " ".join("0x{:08x}".format(data) for data in datas) +
+          " hits: {} misses: {}".format(hits, misses))
+    if datas != [0x3000, 0x3000, 0x3001, 0x3001] or hits != 1 or misses != 2:
+        errors += 1
+
+    # ttl: a line of window 0 expires and is read again from the remote,
+    # a read-only line does not expire
+    ttl = 512
+    yield dut.cache.ttl.storage.eq(ttl)
+    stats = (yield from cache_stats(dut))
+    datas = []
+    datas.append((yield from dut.wishbone.read(0x105)))
+    yield dut.mem[0x105 % dut.mem.depth].eq(0x4000)
+    datas.append((yield from dut.wishbone.read(0x105)))
+    for i in range(ttl):
+        yield
+    datas.append((yield from dut.wishbone.read(0x105)))
+    datas.append((yield from dut.wishbone.read(0x138)))
+    hits, misses = (yield from cache_stats(dut, stats))
+    print("ttl: " + " ".join("0x{:08x}".format(data) for data in datas) +
+          " hits: {} misses: {}".format(hits, misses))
+    if datas != [5, 5, 0x4000, 0x3001] or hits != 2 or misses != 2:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+
+# Host side of a master: frames of records are sent to the record layer and
+# the responses are collected, with the transmit side stalled so that the
+# response records queue up in the sender and are grouped.
+class RecordDUT(Module):
+    def __init__(self, rx_buffer_depth=256, tx_buffer_depth=256):
+        record = etherbone.EtherboneRecord(rx_buffer_depth=rx_buffer_depth,
+                                           tx_buffer_depth=tx_buffer_depth)
+        master = etherbone.EtherboneWishboneMaster()
+        sram = SRAM(1024, bus=master.bus, init=[0x1000 + i for i in range(256)])
+        self.submodules += record, master, sram
+        self.comb += [
+            record.receiver.source.connect(master.sink),
+            master.source.connect(record.sender.sink)
+        ]
+
+        self.sink = record.sink
+        self.source = record.source
+        self.mem = sram.mem
+        self.tx_buffer_depth = tx_buffer_depth
+
+def swap(word):
+    return int.from_bytes(word.to_bytes(4, "little"), "big")
+
+# record header and (big endian) payload words, writes first as on the wire
+def record(wdatas=[], waddr=0, raddrs=[], ret_addr=0):
+    words = [0xf << 8 | len(wdatas) << 16 | len(raddrs) << 24]
+    if wdatas:
+        words += [swap(waddr)] + [swap(data) for data in wdatas]
+    if raddrs:
+        words += [swap(ret_addr)] + [swap(addr) for addr in raddrs]
+    return words
+
+def send_frame(dut, words):
+    for i, word in enumerate(words):
+        yield dut.sink.valid.eq(1)
+        yield dut.sink.last.eq(i == len(words) - 1)
+        yield dut.sink.length.eq(4*len(words))
+        yield dut.sink.data.eq(word)
+        yield
+        while not (yield dut.sink.ready):
+            yield
+    yield dut.sink.valid.eq(0)
+
+def receive_frames(dut, state):
+    words = []
+    while True:
+        yield dut.source.ready.eq(state["ready"])
+        if (yield dut.source.valid) and (yield dut.source.ready):
+            if not words:
+                length = (yield dut.source.length)
+            words.append((yield dut.source.data))
+            if (yield dut.source.last):
+                state["frames"].append((length, words))
+                words = []
+        yield
+
+# (ret_addr, datas) of the write records of a frame
+def parse_records(words):
+    records = []
+    while words:
+        wcount = (words[0] >> 16) & 0xff
+        records.append((swap(words[1]), [swap(word) for word in words[2:2+wcount]]))
+        words = words[2+wcount:]
+    return records
+
+def record_generator(dut, state):
+    errors = 0
+
+    # one frame: a record with writes and reads (read after write in the
+    # same record), a read record, a write record and a read record
+    frame = []
+    frame += record([0xa0, 0xb0], 0x40*4, [0x40*4, 0x10*4], 0x1000)
+    frame += record(raddrs=[0x11*4], ret_addr=0x2000)
+    frame += record([0xc0], 0x42*4)
+    frame += record(raddrs=[0x42*4, 0x41*4], ret_addr=0x3000)
+    yield from send_frame(dut, frame)
+    for i in range(256):
+        yield
+    state["ready"] = 1
+    for i in range(256):
+        yield
+
+    records = []
+    grouped = False
+    for length, words in state["frames"]:
+        frame_records = parse_records(words)
+        print("frame: length: {} records: ".format(length) + " ".join(
+            "0x{:04x}: [{}]".format(ret_addr, ", ".join("0x{:x}".format(data) for data in datas))
+            for ret_addr, datas in frame_records))
+        if length != 4*len(words):
+            errors += 1
+        grouped |= len(frame_records) > 1
+        records += frame_records
+    if records != [(0x1000, [0xa0, 0x1010]), (0x2000, [0x1011]), (0x3000, [0xc0, 0xb0])]:
+        errors += 1
+    # a 1 word tx buffer only holds one record, nothing to group
+    if dut.tx_buffer_depth > 1 and not grouped:
+        errors += 1
+    mem = []
+    for i in range(3):
+        mem.append((yield dut.mem[0x40 + i]))
+    if mem != [0xa0, 0xb0, 0xc0]:
+        errors += 1
+
+    print("errors: {}".format(errors))
+
+# (rx_buffer_depth, tx_buffer_depth): default buffers and cut-through
+buffers = [(256, 256), (0, 1)]
+
+for rx_buffer_depth, tx_buffer_depth in buffers:
+    for dw in [32, 64]:
+        print("dw: {} rx buffer: {} tx buffer: {}".format(
+            dw, rx_buffer_depth, tx_buffer_depth))
+        dut = DUT(dw, rx_buffer_depth, tx_buffer_depth)
+        run_simulation(dut, main_generator(dut), vcd_name="sim.vcd")
 
-dut = DUT()
-run_simulation(dut, main_generator(dut), vcd_name="sim.vcd")
+for rx_buffer_depth, tx_buffer_depth in buffers:
+    print("records: rx buffer: {} tx buffer: {}".format(
+        rx_buffer_depth, tx_buffer_depth))
+    dut = RecordDUT(rx_buffer_depth, tx_buffer_depth)
+    state = {"ready": 0, "frames": []}
+    run_simulation(dut, [record_generator(dut, state), passive(receive_frames)(dut, state)])
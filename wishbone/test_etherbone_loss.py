@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+from migen import *
+
+import sys
+sys.path.append("../")
+
+from wishbone import packet
+from wishbone import etherbone
+
+from litex.soc.interconnect.wishbone import SRAM
+
+
+# Read responses of the master are dropped on the link: the frame number
+# drop_frame (counted from 0) is dropped, and all the frames are dropped
+# while drop is set.
+class DUT(Module):
+    def __init__(self, read_timeout=256, max_retries=2):
+        self.drop = Signal()
+        self.drop_frame = Signal(32, reset=2**32-1)
+        self.frames = Signal(32)
+
+        # wishbone slave
+        slave_core = packet.Core(int(100e6))
+        slave_port = slave_core.crossbar.get_port(0x01)
+        slave_etherbone = etherbone.Etherbone(mode="slave",
+            read_timeout=read_timeout, max_retries=max_retries)
+        self.submodules += slave_core, slave_etherbone
+        self.comb += [
+            slave_port.source.connect(slave_etherbone.sink),
+            slave_etherbone.source.connect(slave_port.sink)
+        ]
+
+        # wishbone master
+        master_core = packet.Core(int(100e6))
+        master_port = master_core.crossbar.get_port(0x01)
+        master_etherbone = etherbone.Etherbone(mode="master")
+        master_sram = SRAM(1024, bus=master_etherbone.wishbone.bus,
+            init=[0x1000 + i for i in range(256)])
+        self.submodules += master_core, master_etherbone, master_sram
+        self.comb += master_port.source.connect(master_etherbone.sink)
+
+        # drop frames from the master
+        first = Signal(reset=1)
+        dropping = Signal()
+        drop = Signal()
+        source = master_etherbone.source
+        self.comb += [
+            If(first,
+                drop.eq(self.drop | (self.frames == self.drop_frame))
+            ).Else(
+                drop.eq(dropping)
+            ),
+            If(drop,
+                source.ready.eq(1)
+            ).Else(
+                source.connect(master_port.sink)
+            )
+        ]
+        self.sync += \
+            If(source.valid & source.ready,
+                first.eq(source.last),
+                If(first, dropping.eq(drop)),
+                If(source.last, self.frames.eq(self.frames + 1))
+            )
+
+        # connect cores directly
+        self.comb += [
+            slave_core.source.connect(master_core.sink),
+            master_core.source.connect(slave_core.sink)
+        ]
+
+        # expose wishbone slave
+        self.wishbone = slave_etherbone.wishbone.bus
+        self.timeouts = slave_etherbone.wishbone.timeouts.status
+        self.retries = slave_etherbone.wishbone.retries.status
+
+
+def read(bus, adr, length=1):
+    # classic cycle (length 1) or incrementing burst, None on bus error
+    datas = []
+    yield bus.cyc.eq(1)
+    yield bus.stb.eq(1)
+    yield bus.we.eq(0)
+    yield bus.sel.eq(0b1111)
+    for i in range(length):
+        yield bus.adr.eq(adr + i)
+        if length == 1:
+            yield bus.cti.eq(0b000)
+        else:
+            yield bus.cti.eq(0b010 if i < length - 1 else 0b111)
+        yield
+        while not ((yield bus.ack) or (yield bus.err)):
+            yield
+        if (yield bus.err):
+            datas.append(None)
+        else:
+            datas.append((yield bus.dat_r))
+    yield bus.cyc.eq(0)
+    yield bus.stb.eq(0)
+    yield bus.cti.eq(0)
+    yield
+    return datas
+
+
+def check(dut, name, datas, expected, timeouts, retries):
+    errors = 0
+    if datas != expected:
+        errors += 1
+    if (yield dut.timeouts) != timeouts or (yield dut.retries) != retries:
+        errors += 1
+    print("{:8s} timeouts: {} retries: {} errors: {}".format(
+        name, (yield dut.timeouts), (yield dut.retries), errors))
+    return errors
+
+
+def main_generator(dut, max_retries=2):
+    errors = 0
+
+    # no loss
+    datas = (yield from read(dut.wishbone, 0x05))
+    errors += (yield from check(dut, "read", datas, [0x1005], 0, 0))
+    datas = (yield from read(dut.wishbone, 0x10, 16))
+    errors += (yield from check(dut, "burst", datas,
+        [0x1010 + i for i in range(16)], 0, 0))
+
+    # one response lost in a burst: one timeout, the reads are re-issued
+    yield dut.drop_frame.eq((yield dut.frames) + 2)
+    datas = (yield from read(dut.wishbone, 0x20, 16))
+    errors += (yield from check(dut, "burst", datas,
+        [0x1020 + i for i in range(16)], 1, 1))
+
+    # all the responses lost: bus error after max_retries
+    yield dut.drop.eq(1)
+    datas = (yield from read(dut.wishbone, 0x06))
+    errors += (yield from check(dut, "lost", datas, [None],
+        1 + max_retries + 1, 1 + max_retries))
+    yield dut.drop.eq(0)
+
+    # recovery
+    datas = (yield from read(dut.wishbone, 0x07))
+    errors += (yield from check(dut, "read", datas, [0x1007],
+        1 + max_retries + 1, 1 + max_retries))
+    datas = (yield from read(dut.wishbone, 0x30, 4))
+    errors += (yield from check(dut, "burst", datas,
+        [0x1030 + i for i in range(4)], 1 + max_retries + 1, 1 + max_retries))
+
+    print("errors: {}".format(errors))
+
+dut = DUT()
+run_simulation(dut, main_generator(dut))
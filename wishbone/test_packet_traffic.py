@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+from migen import *
+
+import sys
+sys.path.append("../")
+
+from wishbone import packet
+from wishbone.packet_traffic import PacketTrafficGenerator, PacketTrafficChecker
+
+from litex.soc.interconnect.stream import Converter
+
+
+class DUT(Module):
+    def __init__(self):
+        # generator
+        tx_core = packet.Core(int(100e6))
+        tx_port = tx_core.crossbar.get_port(0x02)
+        self.submodules.generator = PacketTrafficGenerator()
+        self.submodules += tx_core
+        self.comb += self.generator.source.connect(tx_port.sink)
+
+        # checker
+        rx_core = packet.Core(int(100e6))
+        rx_port = rx_core.crossbar.get_port(0x02)
+        self.submodules.checker = PacketTrafficChecker()
+        self.submodules += rx_core
+        self.comb += rx_port.source.connect(self.checker.sink)
+
+        # connect cores with converters in the loop
+        downconverter = Converter(32, 16)
+        upconverter = Converter(16, 32)
+        self.submodules += downconverter, upconverter
+        self.comb += [
+            tx_core.source.connect(downconverter.sink),
+            downconverter.source.connect(upconverter.sink),
+            upconverter.source.connect(rx_core.sink)
+        ]
+
+
+# Generator and checker not connected: the packets of the generator are
+# captured and replayed to the checker with impairments.
+class ImpairmentDUT(Module):
+    def __init__(self):
+        self.submodules.generator = PacketTrafficGenerator()
+        self.submodules.checker = PacketTrafficChecker()
+
+
+counters = ["packets", "bytes", "drops", "reorders", "errors",
+            "latency_min", "latency_max", "latency_sum"]
+
+def read_counters(checker):
+    values = {}
+    for name in counters:
+        values[name] = (yield getattr(checker, name).status)
+    return values
+
+def main_generator(dut):
+    errors = 0
+
+    # lengths that are not a multiple of 4 are rounded up
+    for length in [64, 10]:
+        yield dut.checker.reset.re.eq(1)
+        yield
+        yield dut.checker.reset.re.eq(0)
+        yield dut.generator.dst.storage.eq(0x02)
+        yield dut.generator.length.storage.eq(length)
+        yield dut.generator.gap.storage.eq(4)
+        yield dut.generator.enable.storage.eq(1)
+        sent = (yield dut.generator.packets.status)
+        for i in range(2000):
+            yield
+        yield dut.generator.enable.storage.eq(0)
+        for i in range(100):
+            yield
+        sent = (yield dut.generator.packets.status) - sent
+        values = (yield from read_counters(dut.checker))
+        print("length: {}".format(length))
+        for name in counters:
+            print("{}: {}".format(name, values[name]))
+        print("sent: {}".format(sent))
+        if (values["packets"] != sent or
+            values["bytes"] != sent*((length + 3)//4*4) or
+            values["drops"] or values["reorders"] or values["errors"]):
+            errors += 1
+
+    print("errors: {}".format(errors))
+
+
+def capture(source, npackets):
+    packets = []
+    words = []
+    yield source.ready.eq(1)
+    while len(packets) < npackets:
+        yield
+        if (yield source.valid):
+            words.append((yield source.data))
+            if (yield source.last):
+                packets.append(((yield source.length), words))
+                words = []
+    yield source.ready.eq(0)
+    return packets
+
+def replay(sink, packets):
+    for length, words in packets:
+        for i, word in enumerate(words):
+            yield sink.valid.eq(1)
+            yield sink.length.eq(length)
+            yield sink.data.eq(word)
+            yield sink.last.eq(i == len(words) - 1)
+            yield
+    yield sink.valid.eq(0)
+    yield
+
+def impairment_generator(dut):
+    errors = 0
+
+    yield dut.generator.length.storage.eq(16)
+    yield dut.generator.gap.storage.eq(0)
+    yield dut.generator.enable.storage.eq(1)
+    packets = (yield from capture(dut.generator.source, 8))
+    yield dut.generator.enable.storage.eq(0)
+
+    # drop packet 2, corrupt a PRBS word of packet 4 and swap packets 5
+    # and 6: packet 6 is seen as a drop of packet 5, packet 5 as a reorder
+    length, words = packets[4]
+    packets[4] = (length, words[:3] + [words[3] ^ 0x100])
+    packets = [packets[i] for i in [0, 1, 3, 4, 6, 5, 7]]
+    yield from replay(dut.checker.sink, packets)
+
+    values = (yield from read_counters(dut.checker))
+    expected = {"packets": 7, "bytes": 7*16, "drops": 2, "reorders": 1,
+                "errors": 1}
+    for name in counters:
+        print("{}: {}".format(name, values[name]))
+        if name in expected and values[name] != expected[name]:
+            errors += 1
+
+    print("errors: {}".format(errors))
+
+dut = DUT()
+run_simulation(dut, main_generator(dut), vcd_name="sim.vcd")
+
+dut = ImpairmentDUT()
+run_simulation(dut, impairment_generator(dut))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+from migen import *
+
+import sys
+sys.path.append("../")
+
+from wishbone import packet
+from wishbone.packet_traffic import PacketTrafficGenerator, PacketTrafficChecker
+
+
+class DUT(Module):
+    def __init__(self):
+        # generator
+        tx_core = packet.Core(int(100e6))
+        tx_port = tx_core.crossbar.get_port(0x02)
+        self.submodules.generator = PacketTrafficGenerator()
+        self.submodules += tx_core
+        self.comb += self.generator.source.connect(tx_port.sink)
+
+        # checker
+        rx_core = packet.Core(int(100e6))
+        rx_port = rx_core.crossbar.get_port(0x02)
+        self.submodules.checker = PacketTrafficChecker()
+        self.submodules += rx_core
+        self.comb += rx_port.source.connect(self.checker.sink)
+
+        # connect cores directly, one word per cycle
+        self.comb += tx_core.source.connect(rx_core.sink)
+
+        # link and payload utilization
+        self.link_words = Signal(32)
+        self.payload_words = Signal(32)
+        self.sync += [
+            If(tx_core.source.valid & tx_core.source.ready,
+                self.link_words.eq(self.link_words + 1)
+            ),
+            If(rx_port.source.valid & rx_port.source.ready,
+                self.payload_words.eq(self.payload_words + 1)
+            )
+        ]
+
+def main_generator(dut, cycles=2000):
+    yield dut.generator.dst.storage.eq(0x02)
+    yield dut.generator.gap.storage.eq(0)
+    for length in [8, 16, 32, 64, 256, 1024]:
+        yield dut.generator.length.storage.eq(length)
+        yield dut.checker.reset.re.eq(1)
+        yield
+        yield dut.checker.reset.re.eq(0)
+        yield dut.generator.enable.storage.eq(1)
+        for i in range(100):
+            yield
+        link_words = (yield dut.link_words)
+        payload_words = (yield dut.payload_words)
+        for i in range(cycles):
+            yield
+        link_words = (yield dut.link_words) - link_words
+        payload_words = (yield dut.payload_words) - payload_words
+        yield dut.generator.enable.storage.eq(0)
+        for i in range(length + 100):
+            yield
+        errors = (yield dut.checker.errors.status)
+        drops = (yield dut.checker.drops.status)
+        print("length: {:4d} link: {:5.1f}% payload: {:5.1f}% (max {:5.1f}%) errors: {} drops: {}".format(
+            length,
+            100*link_words/cycles,
+            100*payload_words/cycles,
+            100*length/(length + packet.packet_header_length),
+            errors, drops))
+
+dut = DUT()
+run_simulation(dut, main_generator(dut))